@@ -0,0 +1,112 @@
+import argparse
+import json
+import os
+import glob
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, unquote
+from loguru import logger
+
+from utils.forecast_store import ForecastStore
+
+# -------------------------------------
+# Variables
+# -------------------------------------
+
+# Local cache directory (the daily job writes the compiled store here)
+CACHE_DIR = os.environ.get('FORECAST_CACHE_DIR', '.forecast_cache')
+
+# -------------------------------------
+# Functions
+# -------------------------------------
+
+
+# Find the most recent compiled store in the local cache
+# -----------
+
+def find_latest_store(cache_dir: str):
+
+    paths = sorted(glob.glob(os.path.join(cache_dir, 'reports', 'shopify_demand_forecasting_store', '**', '*.bin'), recursive=True))
+
+    if len(paths) == 0:
+        raise FileNotFoundError(f'No forecast store found in {cache_dir}')
+
+    return paths[-1]
+
+
+# HTTP handler for forecast lookups
+# -----------
+
+class ForecastLookupHandler(BaseHTTPRequestHandler):
+    """
+    GET /sku/<sku>                              forecast of a sku
+    GET /skus?sku=<sku>&sku=<sku>               forecasts of a batch of skus
+    GET /product_type/<product_type>            forecasts of all skus of a product type
+    GET /stockout?start=<date>&end=<date>       forecasts of skus with a forecasted stockout date in the range
+    """
+
+    store = None
+
+    def _send_json(self, status: int, body):
+
+        payload = json.dumps(body).encode('utf-8')
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+    def do_GET(self):
+
+        url = urlparse(self.path)
+        parts = [unquote(part) for part in url.path.strip('/').split('/')]
+        params = parse_qs(url.query)
+
+        try:
+            if len(parts) == 2 and parts[0] == 'sku':
+                record = self.store.get_sku(parts[1])
+                if record is None:
+                    self._send_json(404, {'error': f'sku {parts[1]} not found'})
+                else:
+                    self._send_json(200, record)
+
+            elif parts == ['skus']:
+                self._send_json(200, self.store.get_skus(params.get('sku', [])))
+
+            elif len(parts) == 2 and parts[0] == 'product_type':
+                self._send_json(200, self.store.get_product_type(parts[1]))
+
+            elif parts == ['stockout']:
+                self._send_json(200, self.store.get_stockout_range(params['start'][0], params['end'][0]))
+
+            else:
+                self._send_json(404, {'error': f'unknown path {url.path}'})
+
+        except (KeyError, ValueError) as e:
+            self._send_json(400, {'error': f'invalid request: {e}'})
+
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+# ========================================================================
+# Execute Code
+# ========================================================================
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Forecast lookup API backed by the compiled forecast store')
+    parser.add_argument('--store', help='Path of the compiled store (defaults to the latest store in the local cache)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    args = parser.parse_args()
+
+    store_path = args.store or find_latest_store(CACHE_DIR)
+
+    ForecastLookupHandler.store = ForecastStore(store_path)
+
+    logger.info(f'Serving {ForecastLookupHandler.store.rows} sku forecasts from {store_path} on http://{args.host}:{args.port}')
+
+    ThreadingHTTPServer((args.host, args.port), ForecastLookupHandler).serve_forever()
@@ -0,0 +1,120 @@
+import argparse
+import os
+import sys
+import datetime
+from datetime import timedelta
+import pandas as pd
+from loguru import logger
+
+from utils.aws_utils import get_report_s3_key, send_sns_alert_email_in_background, get_s3_client
+from utils.forecast_utils import generate_hierarchical_rollups, build_inventory_report
+from utils.publish_utils import validate_forecast, publish_forecast, prefetch_published_reports
+from utils.shard_utils import read_shard_slices, merge_shard_slices, delete_shard_staging
+from utils.replenishment_utils import read_replenishment_params, plan_replenishment
+
+# -------------------------------------
+# Variables
+# -------------------------------------
+
+# Local cache directory (persisted between workflow runs w/ actions/cache)
+CACHE_DIR = os.environ.get('FORECAST_CACHE_DIR', '.forecast_cache')
+
+# Replenishment parameters & daily capacity per production line (csv - see shopify_demand_forecast.py)
+REPLENISHMENT_PARAMS_PATH = os.environ.get('REPLENISHMENT_PARAMS_PATH')
+REPLENISHMENT_CAPACITY_PATH = os.environ.get('REPLENISHMENT_CAPACITY_PATH')
+
+# -------------------------------------
+# Functions
+# -------------------------------------
+
+
+# Merge the staged shards of a run into the report, rollups, replenishment plan & accuracy accumulators
+# -----------
+
+def merge_shards(run_date, shard_count: int, bucket: str = None, local_dir: str = None):
+
+    # Every shard must have staged its slices (raises if not - nothing is published)
+    inventory_details_df = merge_shard_slices(read_shard_slices('inventory_details', run_date, shard_count, bucket=bucket, local_dir=local_dir), shard_count)
+    accuracy_df = merge_shard_slices(read_shard_slices('accuracy', run_date, shard_count, bucket=bucket, local_dir=local_dir), shard_count)
+
+    logger.info(f'Merged {shard_count} shards: {len(inventory_details_df)} skus, {len(accuracy_df)} accuracy accumulators')
+
+    rollup_df = generate_hierarchical_rollups(inventory_details_df)
+    inventory_report_df = build_inventory_report(inventory_details_df)
+
+    # Capacity is shared by the whole catalog, so orders are planned over the merged skus
+    replenishment_params_df, line_capacity_df = read_replenishment_params(params_path=REPLENISHMENT_PARAMS_PATH, capacity_path=REPLENISHMENT_CAPACITY_PATH)
+    replenishment_df = plan_replenishment(inventory_details_df, params_df=replenishment_params_df, capacity_df=line_capacity_df)
+
+    return inventory_report_df, rollup_df, replenishment_df, accuracy_df
+
+
+# ========================================================================
+# Execute Code
+# ========================================================================
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Merge, validate & publish the staged shards of a sharded forecast run')
+    parser.add_argument('--shard-count', type=int, default=int(os.environ.get('SHARD_COUNT', 1)), help='Number of shards of the run')
+    parser.add_argument('--run-date', default=(pd.to_datetime('today') - timedelta(hours=5)).strftime('%Y-%m-%d'), help='Date of the run (YYYY-MM-DD, defaults to today EST)')
+    parser.add_argument('--bucket', default=os.environ.get('S3_PRYMAL_ANALYTICS'), help='S3 bucket of the staging prefix & reports')
+    parser.add_argument('--staging-dir', help='Merge shards staged in a local directory & write the merged report there instead of publishing (for testing)')
+    parser.add_argument('--keep-staging', action='store_true', help='Keep the staged shards after publishing')
+    args = parser.parse_args()
+
+    if not args.staging_dir and not args.bucket:
+        parser.error('one of --bucket (or S3_PRYMAL_ANALYTICS) or --staging-dir is required')
+
+    run_date = pd.to_datetime(args.run_date)
+
+    inventory_report_df, rollup_df, replenishment_df, accuracy_df = merge_shards(run_date, args.shard_count, bucket=args.bucket, local_dir=args.staging_dir)
+
+    # Read the published reports the publish step diffs against while validating
+    published_reports = prefetch_published_reports(current_date=run_date, bucket=args.bucket, cache_dir=CACHE_DIR) if not args.staging_dir else None
+
+    valid_df, invalid_df = validate_forecast(inventory_report_df)
+
+    logger.info(f'{len(valid_df)} rows in valid_df')
+    logger.info(f'{len(invalid_df)} rows in invalid_df')
+
+    if len(valid_df) == 0 or len(invalid_df) > 0:
+
+        logger.error(f"Invalid records: {invalid_df['sku_name'].unique() if len(invalid_df) > 0 else []}")
+
+        if not args.staging_dir:
+            send_sns_alert_email_in_background(topic_arn='arn:aws:sns:us-east-1:925570149811:prymal_alerts',
+                                               email_subject='INVALID DATA - prymal_shopify_demand_forecast',
+                                               email_body='Invalid data was generated by this pipeline.  No data will be written to S3 for this pipeline run.  Please check logs for details')
+
+        sys.exit(1)
+
+    if args.staging_dir:
+
+        # Local merge - write the merged outputs next to the staged shards
+        for report_name, df in [('shopify_demand_forecasting', inventory_report_df), ('shopify_demand_forecasting_rollups', rollup_df), ('shopify_demand_forecasting_replenishment', replenishment_df), ('shopify_demand_forecasting_accuracy', accuracy_df)]:
+            local_path = os.path.join(args.staging_dir, get_report_s3_key(report_name, run_date))
+            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            df.to_csv(local_path, index=False)
+            logger.info(f'Wrote {len(df)} rows to {local_path}')
+
+    else:
+
+        s3_client = get_s3_client()
+
+        publish_forecast(s3_client=s3_client,
+                         inventory_report_df=inventory_report_df,
+                         valid_df=valid_df,
+                         rollup_df=rollup_df,
+                         accuracy_df=accuracy_df,
+                         current_date=run_date,
+                         bucket=args.bucket,
+                         cache_dir=CACHE_DIR,
+                         replenishment_df=replenishment_df,
+                         published_reports=published_reports)
+
+        # Staged shards are only removed once the run is published (a failed merge can be retried)
+        if not args.keep_staging:
+            delete_shard_staging(run_date=run_date, shard_count=args.shard_count, bucket=args.bucket)
+
+    logger.info(f'End time: {datetime.datetime.now()}')
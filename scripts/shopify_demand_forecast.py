@@ -16,641 +16,79 @@ import loguru
 from loguru import logger
 import re
 import io
+import hashlib
 
-# Import pydantic models for data validation 
-from models.pydantic_models import ShopifyDemandForecast
+# Import memo store for skipping unchanged skus
+from utils.memo_store import SkuMemoStore
 
-# -------------------------------------
-# Variables
-# -------------------------------------
-
-REGION = 'us-east-1'
-
-AWS_ACCESS_KEY_ID=os.environ['AWS_ACCESS_KEY']
-AWS_SECRET_ACCESS_KEY=os.environ['AWS_ACCESS_SECRET']
-
-start_time = datetime.datetime.now()
-logger.info(f'Start time: {start_time}')
-
-# -------------------------------------
-# Functions
-# -------------------------------------
-
-
-# FUNCTION TO EXECUTE ATHENA QUERY AND RETURN RESULTS
-# ----------
-
-def run_athena_query(query:str, database: str, region:str):
-
-        
-    # Initialize Athena client
-    athena_client = boto3.client('athena', 
-                                 region_name=region,
-                                 aws_access_key_id=AWS_ACCESS_KEY_ID,
-                                 aws_secret_access_key=AWS_SECRET_ACCESS_KEY)
-
-    # Execute the query
-    try:
-        response = athena_client.start_query_execution(
-            QueryString=query,
-            QueryExecutionContext={
-                'Database': database
-            },
-            ResultConfiguration={
-                'OutputLocation': 's3://prymal-ops/athena_query_results/'  # Specify your S3 bucket for query results
-            }
-        )
-
-        query_execution_id = response['QueryExecutionId']
-
-        # Wait for the query to complete
-        state = 'RUNNING'
-
-        logger.info("Running query...")
-
-
-        while (state in ['RUNNING', 'QUEUED']):
-            response = athena_client.get_query_execution(QueryExecutionId = query_execution_id)
-            if 'QueryExecution' in response and 'Status' in response['QueryExecution'] and 'State' in response['QueryExecution']['Status']:
-                # Get currentstate
-                state = response['QueryExecution']['Status']['State']
-
-                if state == 'FAILED':
-                    logger.error('Query Failed!')
-                elif state == 'SUCCEEDED':
-                    logger.info('Query Succeeded!')
-            
-
-        # OBTAIN DATA
-
-        # --------------
-
-
-
-        query_results = athena_client.get_query_results(QueryExecutionId=query_execution_id,
-                                                MaxResults= 1000)
-        
-
-
-        # Extract qury result column names into a list  
-
-        cols = query_results['ResultSet']['ResultSetMetadata']['ColumnInfo']
-        col_names = [col['Name'] for col in cols]
-
-
-
-        # Extract query result data rows
-        data_rows = query_results['ResultSet']['Rows'][1:]
-
-
-
-        # Convert data rows into a list of lists
-        query_results_data = [[r['VarCharValue'] if 'VarCharValue' in r else np.NaN for r in row['Data']] for row in data_rows]
-
-
-
-        # Paginate Results if necessary
-        while 'NextToken' in query_results:
-                query_results = athena_client.get_query_results(QueryExecutionId=query_execution_id,
-                                                NextToken=query_results['NextToken'],
-                                                MaxResults= 1000)
-
-
-
-                # Extract quuery result data rows
-                data_rows = query_results['ResultSet']['Rows'][1:]
-
-
-                # Convert data rows into a list of lists
-                query_results_data.extend([[r['VarCharValue'] if 'VarCharValue' in r else np.NaN for r in row['Data']] for row in data_rows])
-
-
-
-        results_df = pd.DataFrame(query_results_data, columns = col_names)
-        
-        return results_df
-
-
-    except ParamValidationError as e:
-        logger.error(f"Validation Error (potential SQL query issue): {e}")
-        # Handle invalid parameters in the request, such as an invalid SQL query
-
-    except WaiterError as e:
-        logger.error(f"Waiter Error: {e}")
-        # Handle errors related to waiting for query execution
-
-    except ClientError as e:
-        error_code = e.response['Error']['Code']
-        error_message = e.response['Error']['Message']
-        
-        if error_code == 'InvalidRequestException':
-            logger.error(f"Invalid Request Exception: {error_message}")
-            # Handle issues with the Athena request, such as invalid SQL syntax
-            
-        elif error_code == 'ResourceNotFoundException':
-            logger.error(f"Resource Not Found Exception: {error_message}")
-            # Handle cases where the database or query execution does not exist
-            
-        elif error_code == 'AccessDeniedException':
-            logger.error(f"Access Denied Exception: {error_message}")
-            # Handle cases where the IAM role does not have sufficient permissions
-            
-        else:
-            logger.error(f"Athena Error: {error_code} - {error_message}")
-            # Handle other Athena-related errors
-
-    except Exception as e:
-        logger.error(f"Other Exception: {str(e)}")
-        # Handle any other unexpected exceptions
-
-
-
-# Check S3 Path for Existing Data
-# -----------
-
-def check_path_for_objects(bucket: str, s3_prefix:str):
-
-  logger.info(f'Checking for existing data in {bucket}/{s3_prefix}')
-
-  # Create s3 client
-  s3_client = boto3.client('s3', 
-                          region_name = REGION,
-                          aws_access_key_id=AWS_ACCESS_KEY_ID,
-                          aws_secret_access_key=AWS_SECRET_ACCESS_KEY)
-
-  # List objects in s3_prefix
-  result = s3_client.list_objects_v2(Bucket=bucket, Prefix=s3_prefix )
-
-  # Instantiate objects_exist
-  objects_exist=False
-
-  # Set objects_exist to true if objects are in prefix
-  if 'Contents' in result:
-      objects_exist=True
-
-      logger.info('Data already exists!')
-
-  return objects_exist
-
-# Delete Existing Data from S3 Path
-# -----------
-
-def delete_s3_prefix_data(bucket:str, s3_prefix:str):
-
-
-  logger.info(f'Deleting existing data from {bucket}/{s3_prefix}')
-
-  # Create an S3 client
-  s3_client = boto3.client('s3', 
-                          region_name = REGION,
-                          aws_access_key_id=AWS_ACCESS_KEY_ID,
-                          aws_secret_access_key=AWS_SECRET_ACCESS_KEY)
-
-  # Use list_objects_v2 to list all objects within the specified prefix
-  objects_to_delete = s3_client.list_objects_v2(Bucket=bucket, Prefix=s3_prefix)
-
-  # Extract the list of object keys
-  keys_to_delete = [obj['Key'] for obj in objects_to_delete.get('Contents', [])]
-
-  # Check if there are objects to delete
-  if keys_to_delete:
-      # Delete the objects using 'delete_objects'
-      response = s3_client.delete_objects(
-          Bucket=bucket,
-          Delete={'Objects': [{'Key': key} for key in keys_to_delete]}
-      )
-      logger.info(f"Deleted {len(keys_to_delete)} objects")
-  else:
-      logger.info("No objects to delete")
-
-
-
-
-def generate_daily_run_rate(daily_qty_sold_df: pd.DataFrame, inventory_df: pd.DataFrame, sku_value:str):
-
-    logger.info(f'UPDATING FORECAST TABLE - {sku_value}')
-
-    # Create date lists of recent dates to include to report on recent sales 
-    # -----------
-
-    daily_list = []
-
-    for i in range(0,60):   # today through 60 days ago
-        day = pd.to_datetime(pd.to_datetime('today') - timedelta(i)).strftime('%Y-%m-%d')
-        daily_list.append(day)
-
-    weekly_list = []
-
-    for i in range(1,6):   # last week (last full week) through 6 weeks ago
-        week = pd.to_datetime(pd.to_datetime('today') - timedelta(i * 7)).strftime('%Y-%W')
-        weekly_list.append(week)
-
-    # DAILY QTY SOLD
-    # -----
-
-    # Calculate daily dataframe
-    daily_df = daily_qty_sold_df.loc[daily_qty_sold_df['sku']==sku_value].sort_values('order_date',ascending=False)
-    sku_name = daily_df['sku_name'].unique().tolist()[0]
-
-    # Subset inventory_df to get inventory details for the current SKU
-    current_sku_inventory = inventory_df.loc[inventory_df['sku']==sku_value].copy()
-
-    # Rename column to join with order data
-    current_sku_inventory.rename(columns={'partition_date':'order_date'},inplace=True)
-
-    # Subset / select specific columns
-    current_sku_inventory = current_sku_inventory[['order_date', 'sku','inventory_on_hand']]
-
-    # Calculate daily statistics for past 7, 14, 30 & 60 days (if no records, then set to 0)
-
-    if len(daily_df.loc[daily_df['order_date'].isin(daily_list[:7]),'qty_sold']) > 0:
-
-
-        date_df = pd.DataFrame(daily_list[:7],columns=['order_date'])
-        # Join Series of dates to asses with order date & inventory on hand data
-        daily_sales = date_df.merge(daily_df,on='order_date',how='left').fillna(0)
-        daily_df_subset = daily_sales.merge(current_sku_inventory[['order_date','inventory_on_hand']],on=['order_date'],how='left').fillna(0)
-        # Excude days when there was no inventory to sell 
-        daily_df_subset = daily_df_subset.loc[(daily_df_subset['inventory_on_hand']>0)&(daily_df_subset['qty_sold']>0)]
-
-        
+# Import AWS, extraction & forecast functions (shared with the forecast service)
+from utils.aws_utils import send_sns_alert_email_in_background, get_s3_client
+from utils.extract_utils import extract_orders, extract_inventory
+from utils.forecast_utils import FORECAST_VERSION, generate_run_rates, build_inventory_details, generate_hierarchical_rollups, build_inventory_report
 
-        # Calculate inventory demand ration (% of available days where inventory was available that a sale occured) (to weight percentiles)
-        days_ordered = len(daily_df.loc[daily_df['order_date'].isin(daily_list[:7]),'qty_sold'])
-        days_available = len(daily_df_subset)
-        # If inventory days_available = 0 and sales occured , then set inventory_demand_ratio to 1 to avoid divide by 0 error
-        if days_available == 0:
-            inventory_demand_ratio = 1
-        else:
-            inventory_demand_ratio = min(1,days_ordered / days_available)    # for cases where inventory was sold on more days than inventory was available, only allow a max of 1 for this ratio
+# Import validation & publishing of the report (shared with the shard merge step)
+from utils.publish_utils import validate_forecast, publish_forecast, prefetch_published_reports
 
-        
+# Import sku sharding (sharded runs stage their slice for merge_forecast_shards.py)
+from utils.shard_utils import filter_sku_shard, write_shard_slice, delete_shard_staging
 
-        if len(daily_df_subset) > 0:
-            last_7_median =  daily_df_subset['qty_sold'].median() * inventory_demand_ratio
-            last_7_p25 = np.percentile(daily_df_subset['qty_sold'],25) * inventory_demand_ratio
-            last_7_p75 = np.percentile(daily_df_subset['qty_sold'],75) * inventory_demand_ratio
+# Import stage checkpoints (reruns resume from the last completed stage)
+from utils.checkpoint_utils import StageCheckpoints, fingerprint_stage_inputs
 
-        
+# Import the data quality gate (runs on the extracts before forecasting)
+from utils.data_quality import run_data_quality_gate, get_quarantined_skus, DATA_QUALITY_CHECKS
 
-        else:
-            last_7_median = 0
-            last_7_p25 = 0
-            last_7_p75 = 0
+# Import forecast accuracy accumulators (forecasts vs actuals)
+from utils.forecast_accuracy import read_accuracy_inputs, update_accuracy_accumulators
 
-    else:
-        last_7_median = 0
-        last_7_p25 = 0
-        last_7_p75 = 0
+# Import replenishment planning (lead time, MOQ & line capacity aware orders)
+from utils.replenishment_utils import read_replenishment_params, plan_replenishment
 
+# -------------------------------------
+# Variables
+# -------------------------------------
 
-    if len(daily_df.loc[daily_df['order_date'].isin(daily_list[:14]),'qty_sold']) > 0:
-
-
-        date_df = pd.DataFrame(daily_list[:14],columns=['order_date'])
-        # Join Series of dates to asses with order date & inventory on hand data
-        daily_sales = date_df.merge(daily_df,on='order_date',how='left').fillna(0)
-        daily_df_subset = daily_sales.merge(current_sku_inventory[['order_date','inventory_on_hand']],on=['order_date'],how='left').fillna(0)
-        # Excude days when there was no inventory to sell 
-        daily_df_subset = daily_df_subset.loc[(daily_df_subset['inventory_on_hand']>0)&(daily_df_subset['qty_sold']>0)]
-
-
-        # Calculate inventory demand ration (% of available days where inventory was available that a sale occured) (to weight percentiles)
-        days_ordered = len(daily_df.loc[daily_df['order_date'].isin(daily_list[:14]),'qty_sold'])
-        days_available = len(daily_df_subset)
-        # If inventory days_available = 0 and sales occured , then set inventory_demand_ratio to 1 to avoid divide by 0 error
-        if days_available == 0:
-            inventory_demand_ratio = 1
-        else:
-            inventory_demand_ratio = min(1,days_ordered / days_available)    # for cases where inventory was sold on more days than inventory was available, only allow a max of 1 for this ratio
-
-        if len(daily_df_subset) > 0:
-            last_14_median =  daily_df_subset['qty_sold'].median() * inventory_demand_ratio
-            last_14_p25 = np.percentile(daily_df_subset['qty_sold'],25) * inventory_demand_ratio
-            last_14_p75 = np.percentile(daily_df_subset['qty_sold'],75) * inventory_demand_ratio
-
-        else:
-            last_14_median = 0
-            last_14_p25 = 0
-            last_14_p75 = 0
-
-    else:
-        last_14_median = 0
-        last_14_p25 = 0
-        last_14_p75 = 0
-
-    if len(daily_df.loc[daily_df['order_date'].isin(daily_list[:30]),'qty_sold']) > 0:
-
-        date_df = pd.DataFrame(daily_list[:30],columns=['order_date'])
-        # Join Series of dates to asses with order date & inventory on hand data
-        daily_sales = date_df.merge(daily_df,on='order_date',how='left').fillna(0)
-        daily_df_subset = daily_sales.merge(current_sku_inventory[['order_date','inventory_on_hand']],on=['order_date'],how='left').fillna(0)
-        # Excude days when there was no inventory to sell 
-        daily_df_subset = daily_df_subset.loc[(daily_df_subset['inventory_on_hand']>0)&(daily_df_subset['qty_sold']>0)]
-
-
-        # Calculate inventory demand ration (% of available days where inventory was available that a sale occured) (to weight percentiles)
-        days_ordered = len(daily_df.loc[daily_df['order_date'].isin(daily_list[:30]),'qty_sold'])
-        days_available = len(daily_df_subset)
-        # If inventory days_available = 0 and sales occured , then set inventory_demand_ratio to 1 to avoid divide by 0 error
-        if days_available == 0:
-            inventory_demand_ratio = 1
-        else:
-            inventory_demand_ratio = min(1,days_ordered / days_available)    # for cases where inventory was sold on more days than inventory was available, only allow a max of 1 for this ratio
-
-        if len(daily_df_subset) > 0:
-            last_30_median =  daily_df_subset['qty_sold'].median() * inventory_demand_ratio
-            last_30_p25 = np.percentile(daily_df_subset['qty_sold'],25) * inventory_demand_ratio
-            last_30_p75 = np.percentile(daily_df_subset['qty_sold'],75) * inventory_demand_ratio
-
-        else:
-            last_30_median = 0
-            last_30_p25 = 0
-            last_30_p75 = 0
-
-    else:
-        last_30_median = 0
-        last_30_p25 = 0
-        last_30_p75 = 0
-
-    if len(daily_df.loc[daily_df['order_date'].isin(daily_list[:60]),'qty_sold']) > 0:
-
-        date_df = pd.DataFrame(daily_list[:60],columns=['order_date'])
-        # Join Series of dates to asses with order date & inventory on hand data
-        daily_sales = date_df.merge(daily_df,on='order_date',how='left').fillna(0)
-        daily_df_subset = daily_sales.merge(current_sku_inventory[['order_date','inventory_on_hand']],on=['order_date'],how='left').fillna(0)
-        # Excude days when there was no inventory to sell 
-        daily_df_subset = daily_df_subset.loc[(daily_df_subset['inventory_on_hand']>0)&(daily_df_subset['qty_sold']>0)]
-
-        # Calculate inventory demand ration (% of available days where inventory was available that a sale occured) (to weight percentiles)
-        days_ordered = len(daily_sales.loc[daily_sales['qty_sold']>0])
-        days_available = len(daily_df_subset)
-        # If inventory days_available = 0 and sales occured , then set inventory_demand_ratio to 1 to avoid divide by 0 error
-        if days_available == 0:
-            inventory_demand_ratio = 1
-        else:
-            inventory_demand_ratio = min(1,days_ordered / days_available)    # for cases where inventory was sold on more days than inventory was available, only allow a max of 1 for this ratio
-
-            
-
-        if len(daily_df_subset) > 0:
-
-            last_60_median = daily_df_subset['qty_sold'].median()  * inventory_demand_ratio
-            last_60_p25 = np.percentile(daily_df_subset['qty_sold'],25) * inventory_demand_ratio
-            last_60_p75 =np.percentile(daily_df_subset['qty_sold'],75) * inventory_demand_ratio
-
-        else:
-            last_60_median = 0
-            last_60_p25 = 0
-            last_60_p75 = 0
-
-
-    else:
-        last_60_median = 0
-        last_60_p25 = 0
-        last_60_p75 = 0
-
-
-    # Group by order week and sum qty sold
-    weekly_df = daily_qty_sold_df.loc[daily_qty_sold_df['sku']==sku_value].groupby(['week','sku'],as_index=False).agg({'qty_sold':'sum',
-                                                                                                                       'order_date':'nunique'}).sort_values('week',ascending=False)
-
-    # Drop most recent week (in case not complete)
-    weekly_df = weekly_df[1:].copy()
-
-    # Add 'week' column to inventory on hand data
-    current_sku_inventory['week'] = pd.to_datetime(current_sku_inventory['order_date']).dt.strftime('%Y-%W')
-    # Calculate weekly inventory on hand df
-    current_sku_inventory_weekly = current_sku_inventory.groupby(['week','sku'],as_index=False).agg({'inventory_on_hand':'median',
-                                                                                                    'order_date':'nunique'})
-    current_sku_inventory_weekly.columns = ['week','sku','inventory_on_hand','days_in_stock']
-
-
-    # Calculate daily statistics for past 7, 14, 30 & 60 days
-    if len(weekly_df.loc[weekly_df['week'].isin(weekly_list[:2]),'qty_sold']) > 0:
-
-        date_df = pd.DataFrame(weekly_list[:2],columns=['week'])
-        # Join Series of dates to asses with order date & inventory on hand data
-        weekly_df_subset = date_df.merge(weekly_df,on='week',how='left').merge(current_sku_inventory_weekly,on=['week','sku'],how='left').fillna(0)
-        # Excude weeks when there was no inventory to sell 
-        weekly_df_subset = weekly_df_subset.loc[(weekly_df_subset['inventory_on_hand']>0)&(weekly_df_subset['qty_sold']>0)]
-
-        # Calculate inventory demand ration (% of available days where inventory was available that a sale occured) (to weight percentiles)
-        days_ordered = weekly_df.loc[weekly_df['week'].isin(weekly_list[:2]),'order_date'].sum()
-        days_available = weekly_df_subset['days_in_stock'].sum()
-        # If inventory days_available = 0 and sales occured , then set inventory_demand_ratio to 1 to avoid divide by 0 error
-        if days_available == 0:
-            inventory_demand_ratio = 1
-        else:
-            inventory_demand_ratio = min(1,days_ordered / days_available)    # for cases where inventory was sold on more days than inventory was available, only allow a max of 1 for this ratio
-
-
-
-        if len(weekly_df_subset) > 0:
-        
-            last_2_weekly_median = weekly_df_subset['qty_sold'].median() * inventory_demand_ratio
-            last_2_weekly_p25 =  np.percentile(weekly_df_subset['qty_sold'],25) * inventory_demand_ratio
-            last_2_weekly_p75 = np.percentile(weekly_df_subset['qty_sold'],75) * inventory_demand_ratio
-
-        else:
-            last_2_weekly_median = 0
-            last_2_weekly_p25 = 0
-            last_2_weekly_p75 = 0
-    else:
-        last_2_weekly_median = 0
-        last_2_weekly_p25 = 0
-        last_2_weekly_p75 = 0
-
-    if len(weekly_df.loc[weekly_df['week'].isin(weekly_list[:3]),'qty_sold']) > 0:
-
-        date_df = pd.DataFrame(weekly_list[:3],columns=['week'])
-        # Join Series of dates to asses with order date & inventory on hand data
-        weekly_df_subset = date_df.merge(weekly_df,on='week',how='left').merge(current_sku_inventory_weekly,on=['week','sku'],how='left').fillna(0)
-        # Excude weeks when there was no inventory to sell 
-        weekly_df_subset = weekly_df_subset.loc[(weekly_df_subset['inventory_on_hand']>0)&(weekly_df_subset['qty_sold']>0)]
-
-        # Calculate inventory demand ration (% of available days where inventory was available that a sale occured) (to weight percentiles)
-        days_ordered = weekly_df.loc[weekly_df['week'].isin(weekly_list[:3]),'order_date'].sum()
-        days_available = weekly_df_subset['days_in_stock'].sum()
-        # If inventory days_available = 0 and sales occured , then set inventory_demand_ratio to 1 to avoid divide by 0 error
-        if days_available == 0:
-            inventory_demand_ratio = 1
-        else:
-            inventory_demand_ratio = min(1,days_ordered / days_available)    # for cases where inventory was sold on more days than inventory was available, only allow a max of 1 for this ratio
-
-
-        if len(weekly_df_subset) > 0:
-        
-            last_3_weekly_median = weekly_df_subset['qty_sold'].median() * inventory_demand_ratio
-            last_3_weekly_p25 = np.percentile(weekly_df_subset['qty_sold'],25) * inventory_demand_ratio
-            last_3_weekly_p75 = np.percentile(weekly_df_subset['qty_sold'],75) * inventory_demand_ratio
-
-        else:
-            last_3_weekly_median = 0
-            last_3_weekly_p25 = 0
-            last_3_weekly_p75 = 0
-    else:
-        last_3_weekly_median = 0
-        last_3_weekly_p25 = 0
-        last_3_weekly_p75 = 0
-
-    if len(weekly_df.loc[weekly_df['week'].isin(weekly_list[:4]),'qty_sold']) > 0:
-
-        date_df = pd.DataFrame(weekly_list[:4],columns=['week'])
-        # Join Series of dates to asses with order date & inventory on hand data
-        weekly_df_subset = date_df.merge(weekly_df,on='week',how='left').merge(current_sku_inventory_weekly,on=['week','sku'],how='left').fillna(0)
-        # Excude weeks when there was no inventory to sell 
-        weekly_df_subset = weekly_df_subset.loc[(weekly_df_subset['inventory_on_hand']>0)&(weekly_df_subset['qty_sold']>0)]
-
-        # Calculate inventory demand ration (% of available days where inventory was available that a sale occured) (to weight percentiles)
-        days_ordered = weekly_df.loc[weekly_df['week'].isin(weekly_list[:4]),'order_date'].sum()
-        days_available = weekly_df_subset['days_in_stock'].sum()
-        # If inventory days_available = 0 and sales occured , then set inventory_demand_ratio to 1 to avoid divide by 0 error
-        if days_available == 0:
-            inventory_demand_ratio = 1
-        else:
-            inventory_demand_ratio = min(1,days_ordered / days_available)    # for cases where inventory was sold on more days than inventory was available, only allow a max of 1 for this ratio
-
-    
-        if len(weekly_df_subset) > 0:
-            last_4_weekly_median = weekly_df_subset['qty_sold'].median() * inventory_demand_ratio
-            last_4_weekly_p25 = np.percentile(weekly_df_subset['qty_sold'],25) * inventory_demand_ratio
-            last_4_weekly_p75 = np.percentile(weekly_df_subset['qty_sold'],75) * inventory_demand_ratio
- 
-        else:
-                last_4_weekly_median = 0
-                last_4_weekly_p25 = 0
-                last_4_weekly_p75 = 0
-    else:
-        last_4_weekly_median = 0
-        last_4_weekly_p25 = 0
-        last_4_weekly_p75 = 0
-
-    if len(weekly_df.loc[weekly_df['week'].isin(weekly_list[:5]),'qty_sold']) > 0:
-
-        date_df = pd.DataFrame(weekly_list[:5],columns=['week'])
-        # Join Series of dates to asses with order date & inventory on hand data
-        weekly_df_subset = date_df.merge(weekly_df,on='week',how='left').merge(current_sku_inventory_weekly,on=['week','sku'],how='left').fillna(0)
-        # Excude weeks when there was no inventory to sell 
-        weekly_df_subset = weekly_df_subset.loc[(weekly_df_subset['inventory_on_hand']>0)&(weekly_df_subset['qty_sold']>0)]
-
-        # Calculate inventory demand ration (% of available days where inventory was available that a sale occured) (to weight percentiles)
-        days_ordered = weekly_df.loc[weekly_df['week'].isin(weekly_list[:5]),'order_date'].sum()
-        days_available = weekly_df_subset['days_in_stock'].sum()
-        # If inventory days_available = 0 and sales occured , then set inventory_demand_ratio to 1 to avoid divide by 0 error
-        if days_available == 0:
-            inventory_demand_ratio = 1
-        else:
-            inventory_demand_ratio = min(1,days_ordered / days_available)    # for cases where inventory was sold on more days than inventory was available, only allow a max of 1 for this ratio
-
-        if len(weekly_df_subset) > 0:
-        
-            last_5_weekly_median = weekly_df_subset['qty_sold'].median() * inventory_demand_ratio
-            last_5_weekly_p25 = np.percentile(weekly_df_subset['qty_sold'],25) * inventory_demand_ratio
-            last_5_weekly_p75 = np.percentile(weekly_df_subset['qty_sold'],75) * inventory_demand_ratio
-        else:
-            last_5_weekly_median = 0
-            last_5_weekly_p25 = 0
-            last_5_weekly_p75 = 0
-    else:
-        last_5_weekly_median = 0
-        last_5_weekly_p25 = 0
-        last_5_weekly_p75 = 0
-
-
-
-    # Consolidate stats
-    recent_stats_df = pd.DataFrame([[last_7_p25, last_7_median, last_7_p75, last_2_weekly_p25,last_2_weekly_median,last_2_weekly_p75],
-                [last_14_p25, last_14_median, last_14_p75,last_3_weekly_p25,last_3_weekly_median,last_3_weekly_p75],
-                [last_30_p25, last_30_median, last_30_p75,last_4_weekly_p25,last_4_weekly_median,last_4_weekly_p75],
-                [last_60_p25, last_60_median, last_60_p75,last_5_weekly_p25,last_5_weekly_median,last_5_weekly_p75]],
-                columns=['percentile_25','median','percentile_75','percentile_25_weekly','median_weekly','percentile_75_weekly'])
-
-
-    # Calculate median of lower bound (median) and upper bound (75th percentile) , excluding days / weeks with 0 sold
-    lower_bound_daily = recent_stats_df.loc[recent_stats_df['median']>0,'median'].median()
-    upper_bound_daily = recent_stats_df.loc[recent_stats_df['percentile_75']>0,'percentile_75'].median()
-    lower_bound_weekly = recent_stats_df.loc[recent_stats_df['median_weekly']>0,'median_weekly'].median()
-    upper_bound_weekly = recent_stats_df.loc[recent_stats_df['percentile_75_weekly']>0,'percentile_75_weekly'].median()
-
-
-    lower_bound_final = statistics.median([lower_bound_daily, lower_bound_weekly/7])
-    upper_bound_final = statistics.median([upper_bound_daily, upper_bound_weekly/7])
-
-
-    # Extrapolate out 30, 60, 90 days
-    run_rate = ['forecast_daily',lower_bound_final,upper_bound_final]
-    
-    # Consolidate into dataframe
-    df = pd.DataFrame([run_rate],
-                columns=['forecast','lower_bound','upper_bound'])
-    
-    # Append product name & sku
-    df['sku'] = sku_value
-    df['sku_name'] = sku_name
-
-    # Last week's actuals
-    last_7_actual = daily_df.loc[pd.to_datetime(daily_df['order_date']) >= (pd.to_datetime('today') - timedelta(7))].groupby('sku',as_index=False)['qty_sold'].sum()
-    last_7_actual.columns = ['sku','last_7_actual']
-    # Fill na with 0 (if no units were sold in last 7 days)
-    last_7_actual['last_7_actual'] =  last_7_actual['last_7_actual'].fillna(0)
-
-    # Last 90 days actual 
-    last_90_actual = daily_df.loc[pd.to_datetime(daily_df['order_date']) >= (pd.to_datetime('today') - timedelta(90))].groupby('sku',as_index=False)['qty_sold'].sum()
-    last_90_actual.columns = ['sku','last_90_actual']
-    # Fill na with 0 (if no units were sold in last 7 days)
-    last_90_actual['last_90_actual'] =  last_90_actual['last_90_actual'].fillna(0)
-
-
-
-
-    # Merge
-    df = df.merge(last_7_actual, on='sku',how='left').merge(last_90_actual, on='sku',how='left').copy()
-
-
-    # Set partition date to yesterday (data as of yesterday)
-    df['partition_date'] = pd.to_datetime(pd.to_datetime('today') - timedelta(1)).strftime('%Y-%m-%d')
-
-
-    return df[['sku','sku_name','forecast','lower_bound','upper_bound','last_7_actual','last_90_actual','partition_date']]
-
+REGION = 'us-east-1'
 
+AWS_ACCESS_KEY_ID=os.environ.get('AWS_ACCESS_KEY')
+AWS_SECRET_ACCESS_KEY=os.environ.get('AWS_ACCESS_SECRET')
 
-def send_sns_alert_email(topic_arn: str, email_subject:str, email_body: str):
-    """
-    Function to invoke an SNS topic to send an email alert
+# Local cache directory (persisted between workflow runs w/ actions/cache)
+CACHE_DIR = os.environ.get('FORECAST_CACHE_DIR', '.forecast_cache')
 
-    Params:
-        topic_arn: ARN of the SNS topic to invoke
-        email_subject: subject of the email to send
-        email_body: body of the email to send 
+# Memoization of per-sku run rates (set FORCE_RECOMPUTE=true to recompute every sku)
+FORCE_RECOMPUTE = os.environ.get('FORCE_RECOMPUTE', 'false').lower() == 'true'
+MEMO_MAX_ENTRIES = int(os.environ.get('MEMO_MAX_ENTRIES', 20000))
+MEMO_TTL_DAYS = int(os.environ.get('MEMO_TTL_DAYS', 7))
 
+# Number of days to probe for the latest published accuracy accumulators (older accumulators are found by listing the published partitions)
+ACCURACY_LOOKBACK_DAYS = 7
 
-    """
+# Set bucket
+BUCKET = os.environ['S3_PRYMAL_ANALYTICS']
 
-    try:
+# Sku sharding (each of SHARD_COUNT runners forecasts the skus hashing to its SHARD_INDEX & stages them for the merge step)
+SHARD_INDEX = int(os.environ.get('SHARD_INDEX', 0))
+SHARD_COUNT = int(os.environ.get('SHARD_COUNT', 1))
 
-        # Initialize a boto3 client for SNS
-        sns_client = boto3.client('sns', 
-                                        region_name='us-east-1',
-                                        aws_access_key_id=AWS_ACCESS_KEY_ID,
-                                        aws_secret_access_key=AWS_SECRET_ACCESS_KEY)  
+# Local staging directory of sharded runs (for testing - staged to S3 if not set)
+SHARD_STAGING_DIR = os.environ.get('SHARD_STAGING_DIR')
 
-        
+# Replenishment parameters (lead time, safety stock, MOQ, pack size & production line per sku / product_type) & daily capacity per production line (csv)
+REPLENISHMENT_PARAMS_PATH = os.environ.get('REPLENISHMENT_PARAMS_PATH')
+REPLENISHMENT_CAPACITY_PATH = os.environ.get('REPLENISHMENT_CAPACITY_PATH')
 
-        logger.info(f'Sending SNS alert to {topic_arn}')
+# Data quality gate: 'quarantine' removes skus with bad rows, 'fail' stops the run instead
+DATA_QUALITY_MODE = os.environ.get('DATA_QUALITY_MODE', 'quarantine').lower()
 
-        # Publish a message to the SNS topic
-        response = sns_client.publish(
-            TopicArn=topic_arn,
-            Message=email_body,
-            Subject=email_subject
-        )
+# Resume reruns of the same day from stage checkpoints (set RESUME_FROM_CHECKPOINT=false to re-run every stage)
+RESUME_FROM_CHECKPOINT = os.environ.get('RESUME_FROM_CHECKPOINT', 'true').lower() == 'true'
 
-        logger.info(f'SNS Response: {response}')
+if not 0 <= SHARD_INDEX < SHARD_COUNT:
+    raise ValueError(f'SHARD_INDEX must be between 0 and {SHARD_COUNT - 1} (got {SHARD_INDEX})')
 
-    except ClientError as e:
-        logger.error(f'Error publishing to SNS topic ({topic_arn}): {e}')
+start_time = datetime.datetime.now()
+logger.info(f'Start time: {start_time}')
 
 # ========================================================================
 # Execute Code
@@ -666,56 +104,37 @@ REGION = 'us-east-1'
 
 lookback_cutoff_date = pd.to_datetime(pd.to_datetime('today') - timedelta(days=100)).strftime('%Y-%m-%d')    # Back to 6 weeks ago
 
+# Date of the report partition
+current_date = pd.to_datetime('today') - timedelta(hours=5)     # From UTC to EST
+
+
+# CONFIGURE BOTO  =======================================
+
+
+# Create s3 client (local directories if STORAGE_BACKEND=local)
+s3_client = get_s3_client()
+
+# Stage checkpoints of this run (forced recomputes re-run every stage)
+checkpoints = StageCheckpoints(run_date=current_date,
+                               cache_dir=CACHE_DIR,
+                               bucket=BUCKET,
+                               s3_client=s3_client,
+                               enabled=RESUME_FROM_CHECKPOINT and not FORCE_RECOMPUTE,
+                               shard_index=SHARD_INDEX,
+                               shard_count=SHARD_COUNT)
+
 #  ---------------------------------
 #  QUERY ORDER DATA (JOINED WITH NORMALIZED SKU DATA)
 #  ---------------------------------
 
-# Construct query to pull data by product
-# ----
-
-QUERY = f"""SELECT a.partition_date
-            , a.order_date
-            , a.sku
-            , a.sku_name
-            , b.product_category
-            , b.product_type
-            , SUM(a.qty_sold) as qty_sold 
-            FROM "prymal-analytics"."shopify_qty_sold_by_sku_daily" a
-            LEFT JOIN (SELECT * 
-                        FROM "prymal"."skus_shopify" 
-                        WHERE load_date = (SELECT MAX(load_date) 
-                                            FROM "prymal"."skus_shopify")
-                                            ) b            
-            ON a.sku = b.sku 
-            
-            WHERE a.partition_date >= DATE('{lookback_cutoff_date}')
-            GROUP BY a.partition_date
-            , a.order_date
-            , a.sku
-            , a.sku_name
-            , b.product_category
-            , b.product_type
-            ORDER BY a.order_date ASC
-
-            """
-
-# Query datalake to get quantiy sold per sku for the last 120 days
-# ----
-
-result_df = run_athena_query(query=QUERY, database=DATABASE, region=REGION)
-result_df.columns = ['partition_date','order_date','sku','sku_name','product_category','product_type','qty_sold']
-
-logger.info(result_df.head(3))
-logger.info(result_df.info())
-logger.info(f"Count of NULL RECORDS: {len(result_df.loc[result_df['order_date'].isna()])}")
-# Format datatypes & new columns
-result_df['order_date'] = pd.to_datetime(result_df['order_date']).dt.strftime('%Y-%m-%d')
-result_df['qty_sold'] = result_df['qty_sold'].astype(int)
-result_df['week'] = pd.to_datetime(result_df['order_date']).dt.strftime('%Y-%W')
-
-logger.info(f"MIN DATE: {result_df['order_date'].min()}")
-logger.info(f"MAX DATE: {result_df['order_date'].max()}")
+# Each stage's checkpoint is keyed by the fingerprints of the stages it depends on
+orders_fingerprint = fingerprint_stage_inputs('orders', lookback_cutoff_date, SHARD_INDEX, SHARD_COUNT)
+
+result_df = checkpoints.load('orders', orders_fingerprint)
 
+if result_df is None:
+    result_df = extract_orders(lookback_cutoff_date=lookback_cutoff_date, shard_index=SHARD_INDEX, shard_count=SHARD_COUNT)
+    checkpoints.save('orders', orders_fingerprint, result_df)
 
 # Create dataframe of skus sold in the time range
 skus_sold_df = result_df.loc[~result_df['sku_name'].isna(),['sku','sku_name']].drop_duplicates()
@@ -725,181 +144,144 @@ skus_sold_df = result_df.loc[~result_df['sku_name'].isna(),['sku','sku_name']].d
 #  QUERY INVENTORY ON HAND DATA
 #  ---------------------------------
 
-# Construct query to pull latest (as of yesterday) inventory details 
-# ----
+inventory_fingerprint = fingerprint_stage_inputs('inventory', lookback_cutoff_date, SHARD_INDEX, SHARD_COUNT)
 
+inventory_df = checkpoints.load('inventory', inventory_fingerprint)
 
-QUERY =f"""
+if inventory_df is None:
+    inventory_df = extract_inventory(lookback_cutoff_date=lookback_cutoff_date, shard_index=SHARD_INDEX, shard_count=SHARD_COUNT)
+    checkpoints.save('inventory', inventory_fingerprint, inventory_df)
 
-        SELECT partition_date
-        , CAST(sku AS VARCHAR) as sku
-        , MAX(total_fulfillable_quantity)
-        FROM "prymal"."shipbob_inventory"  
-        WHERE partition_date >= '{lookback_cutoff_date}'
-        GROUP BY partition_date
-        , CAST(sku AS VARCHAR)
 
-                    """
-
-# Query datalake to get current inventory details for skus sold in the last 120 days
-# ----
+#  ---------------------------------
+#  DATA QUALITY GATE (BAD ROWS FAIL THE RUN OR QUARANTINE THEIR SKUS BEFORE ANY FORECASTING)
+#  ---------------------------------
 
-inventory_df = run_athena_query(query=QUERY, database='prymal', region=REGION)
+try:
+    result_df, inventory_df, data_quality_df = run_data_quality_gate(daily_qty_sold_df=result_df, inventory_df=inventory_df, lookback_cutoff_date=lookback_cutoff_date, mode=DATA_QUALITY_MODE)
 
-inventory_df.columns = ['partition_date','sku','inventory_on_hand']
+except ValueError as e:
 
+    send_sns_alert_email_in_background(topic_arn='arn:aws:sns:us-east-1:925570149811:prymal_alerts',
+                                       email_subject='DATA QUALITY - prymal_shopify_demand_forecast',
+                                       email_body=f'The extracted data failed data quality checks ({e}).  No data will be written to S3 for this pipeline run.  Please check logs for details')
+    raise
 
-logger.info('inventory_df')
-logger.info(inventory_df.head(3))
+# Quarantined skus are left out of this run's forecast & report
+quarantined_skus = get_quarantined_skus(data_quality_df)
 
-# Format datatypes & new columns
-inventory_df['inventory_on_hand'] = inventory_df['inventory_on_hand'].astype(int)
+if len(quarantined_skus) > 0:
+    send_sns_alert_email_in_background(topic_arn='arn:aws:sns:us-east-1:925570149811:prymal_alerts',
+                                       email_subject='DATA QUALITY WARNING - prymal_shopify_demand_forecast',
+                                       email_body=f'{len(quarantined_skus)} skus failed data quality checks & were quarantined (left out of the forecast & report for this pipeline run): {quarantined_skus}.  Please check logs for details')
 
 
 #  ---------------------------------
-#  GENERATE DAILY RUN RATE FOR EACH SKU SOLD IN THE SELECTED TIME PERIOD ('lookback_cutoff_date')
+#  FORECAST ACCURACY (NEWLY MATURED DAY OF ACTUALS VS THE FORECAST PUBLISHED THAT DAY)
 #  ---------------------------------
 
-# Blank df to store results
-product_run_rate_df = pd.DataFrame()
+# Latest published accumulators & the forecasts published on the days matured since (normally only yesterday)
+previous_accuracy_df, matured_forecast_df, matured_date = read_accuracy_inputs(bucket=BUCKET, current_date=current_date, cache_dir=CACHE_DIR, lookback_days=ACCURACY_LOOKBACK_DAYS)
 
-# For each sku in products list, generate forecast using recent sales data
-for sku in result_df['sku'].unique():
+# Sharded runs only evaluate the skus of their shard
+previous_accuracy_df = filter_sku_shard(previous_accuracy_df, SHARD_INDEX, SHARD_COUNT)
 
-    # Generate daily run rates for the product
-    df = generate_daily_run_rate(daily_qty_sold_df=result_df, inventory_df=inventory_df,sku_value=sku)
+if matured_forecast_df is not None:
+    matured_forecast_df = filter_sku_shard(matured_forecast_df, SHARD_INDEX, SHARD_COUNT)
+    # Quarantined skus have no trusted actuals - their accumulators are carried forward unchanged
+    matured_forecast_df = matured_forecast_df.loc[~matured_forecast_df['sku'].astype(str).isin(quarantined_skus)]
+    accuracy_df = update_accuracy_accumulators(previous_accuracy_df=previous_accuracy_df, forecast_df=matured_forecast_df, daily_qty_sold_df=result_df, matured_date=matured_date)
+else:
+    accuracy_df = previous_accuracy_df
 
-    # Extract product details to carry forward
-    product_type = result_df.reset_index().loc[result_df['sku']==sku,'product_type'].values[0]
-    product_category = result_df.reset_index().loc[result_df['sku']==sku,'product_category'].values[0]
 
-    df['product_type'] = product_type
-    df['product_category'] = product_category
+#  ---------------------------------
+#  GENERATE DAILY RUN RATE FOR EACH SKU SOLD IN THE SELECTED TIME PERIOD ('lookback_cutoff_date')
+#  ---------------------------------
 
-    # Append to run rate dataframe
-    product_run_rate_df = pd.concat([product_run_rate_df,df])
+# The gate's mode & check actions change which rows & skus reach the forecast (the orders & inventory checkpoints are taken before the gate)
+data_quality_fingerprint = fingerprint_stage_inputs('data_quality', DATA_QUALITY_MODE, sorted(DATA_QUALITY_CHECKS.items()))
 
-# Reset index
-product_run_rate_df.reset_index(inplace=True,drop=True)
+run_rates_fingerprint = fingerprint_stage_inputs('run_rates', orders_fingerprint, inventory_fingerprint, data_quality_fingerprint, FORECAST_VERSION)
 
-#  Replace nlls with 0
-product_run_rate_df['last_7_actual'] =  product_run_rate_df['last_7_actual'].fillna(0)
+product_run_rate_df = checkpoints.load('run_rates', run_rates_fingerprint)
 
-# Merge run rate df with yesterday's partition of inventory df 
-inventory_details_df = product_run_rate_df.merge(inventory_df,
-                how='left',
-                on=['partition_date', 'sku'])
+if product_run_rate_df is None:
 
+    # Load memo store of per-sku run rates
+    memo_store = SkuMemoStore(path=os.path.join(CACHE_DIR, 'sku_run_rate_memo.json'),
+                              version=FORECAST_VERSION,
+                              max_entries=MEMO_MAX_ENTRIES,
+                              ttl_days=MEMO_TTL_DAYS,
+                              force_recompute=FORCE_RECOMPUTE)
 
-# Fill NaN inventory_on_hand records with 0
-inventory_details_df['inventory_on_hand'].fillna(0,inplace=True)
+    # Generate run rates for each sku (reusing memoized run rates of skus whose inputs have not changed)
+    product_run_rate_df = generate_run_rates(daily_qty_sold_df=result_df, inventory_df=inventory_df, memo_store=memo_store)
 
-# # Calculate days of stock on hand given the inventory on hand and daily run rate
-# inventory_details_df['days_of_stock_onhand'] = round(inventory_details_df['inventory_on_hand'] / inventory_details_df['upper_bound'],0).astype(int)
+    # Persist memo store for the next run
+    memo_store.save()
 
+    checkpoints.save('run_rates', run_rates_fingerprint, product_run_rate_df)
+
+# Merge run rate df with yesterday's partition of inventory df & calculate production needs
+inventory_details_df = build_inventory_details(product_run_rate_df=product_run_rate_df, inventory_df=inventory_df)
 
 logger.info(inventory_details_df['inventory_on_hand'].head())
 
 
 # ------------------
-# SUBSET BY PRODUCT TYPE
+# SHARDED RUN: STAGE THIS SHARD'S SLICE (REPORT, ROLLUPS & PUBLISHING ARE DONE BY merge_forecast_shards.py)
 # ------------------
 
+if SHARD_COUNT > 1:
 
-# Classic Flavor - 320 g 
-# ---
-
-# Subset df to only include Classic Flavor 320 g
-classic_320g_df = inventory_details_df.loc[inventory_details_df['product_type']=='Classic Creamer - Large Bag'].copy()
+    # Replace any slice staged by a previous attempt of this shard
+    delete_shard_staging(run_date=current_date, shard_count=SHARD_COUNT, bucket=BUCKET, local_dir=SHARD_STAGING_DIR, shard_index=SHARD_INDEX)
 
-# Limited Edition Flavor - 320 g 
-# ---
+    write_shard_slice(s3_client=s3_client, df=inventory_details_df, slice_name='inventory_details', run_date=current_date, shard_index=SHARD_INDEX, shard_count=SHARD_COUNT, bucket=BUCKET, local_dir=SHARD_STAGING_DIR)
+    write_shard_slice(s3_client=s3_client, df=accuracy_df, slice_name='accuracy', run_date=current_date, shard_index=SHARD_INDEX, shard_count=SHARD_COUNT, bucket=BUCKET, local_dir=SHARD_STAGING_DIR)
 
-lmtd_320g_df = inventory_details_df.loc[(inventory_details_df['product_type']=='Limited Edition Creamer - Large Bag')&(inventory_details_df['upper_bound']>0)].sort_values('inventory_on_hand',ascending=False)
+    # Shard completed - checkpoints are no longer needed
+    checkpoints.clear()
 
-# Coffee Beans (whole, ground, kcup)
-# ---
+    logger.info(f'Shard {SHARD_INDEX + 1}/{SHARD_COUNT} staged - end time: {datetime.datetime.now()}')
 
-coffee_df = inventory_details_df.loc[(inventory_details_df['product_category']=='Coffee Beans')&(inventory_details_df['upper_bound']>0)]
+    sys.exit(0)
 
-# Classic Flavor - Bulk Bag
-# ---
 
-bulk_bag_df = inventory_details_df.loc[(inventory_details_df['product_type']=='Classic Creamer - Bulk Bag')&(inventory_details_df['upper_bound']>0)].sort_values('inventory_on_hand',ascending=False).head(20)
+# ------------------
+# HIERARCHICAL ROLLUPS (SKU > PRODUCT TYPE > PRODUCT CATEGORY > TOTAL)
+# ------------------
 
+rollup_df = generate_hierarchical_rollups(inventory_details_df)
 
-# Sachets
-# ---
+logger.info(f'{len(rollup_df)} rows in rollup_df')
+logger.info(rollup_df.loc[rollup_df['rollup_level']!='sku'].head())
 
-sachet_df = inventory_details_df.loc[inventory_details_df['product_type'].str.contains('Sachet')].sort_values('inventory_on_hand',ascending=False).copy()
 
+# ------------------
+# REPLENISHMENT PLAN (REORDER POINTS, ORDER DATES & QUANTITIES ACROSS THE CATALOG)
+# ------------------
 
-# Variety Pack - Kickstart 
-# ---
+replenishment_params_df, line_capacity_df = read_replenishment_params(params_path=REPLENISHMENT_PARAMS_PATH, capacity_path=REPLENISHMENT_CAPACITY_PATH)
 
-vp_kickstart_df = inventory_details_df.loc[inventory_details_df['product_type']=='Variety Pack - Kickstart'].copy()
+replenishment_df = plan_replenishment(inventory_details_df, params_df=replenishment_params_df, capacity_df=line_capacity_df)
 
 
 # ------------------
 #  CONSOLIDATE INTO REPORT
 # ------------------
 
-# Concat df of all product types which will be included in the report
-inventory_report_df = pd.concat([classic_320g_df,bulk_bag_df, sachet_df,coffee_df,vp_kickstart_df])
-
-# reset index
-inventory_report_df.reset_index(inplace=True,drop=True)
-
-# Fill NA with 0
-logger.info(f'NAN count: {inventory_report_df.isna().sum()}')
-inventory_report_df[['lower_bound','upper_bound','last_7_actual','last_90_actual']] = inventory_report_df[['lower_bound','upper_bound','last_7_actual','last_90_actual']].fillna(0).copy()
-logger.info(f'NAN count: {inventory_report_df.isna().sum()}')
-
-# Extend upper bound of forecast for 90, 120, 150 days to determine upcoming quarter inventory needs
-inventory_report_df['forecast_90_days'] = round(inventory_report_df['upper_bound'] * 90,0)
-inventory_report_df['forecast_120_days'] = round(inventory_report_df['upper_bound'] * 120,0)
-inventory_report_df['forecast_150_days'] = round(inventory_report_df['upper_bound'] * 150,0)
-
-
-
-# Subtract inventory on hand from forecasted qty to determine production needs
-inventory_report_df['production_next_90_days'] = inventory_report_df['forecast_90_days'] - inventory_report_df['inventory_on_hand']
-inventory_report_df['production_next_120_days'] = inventory_report_df['forecast_120_days'] - inventory_report_df['inventory_on_hand']
-inventory_report_df['production_next_150_days'] = inventory_report_df['forecast_150_days'] - inventory_report_df['inventory_on_hand']
-
-
-# Replace negative with 0 for any instances where there is sufficient inventory for the quarter
-inventory_report_df.loc[inventory_report_df['production_next_90_days']<0,'production_next_90_days'] = 0
-inventory_report_df.loc[inventory_report_df['production_next_120_days']<0,'production_next_120_days'] = 0
-inventory_report_df.loc[inventory_report_df['production_next_150_days']<0,'production_next_150_days'] = 0
-
-# Calculate forecasted stockout date
-for r in range(len(inventory_report_df)):
-
-    # Extract total inventory on hand
-    inventory_on_hand = inventory_report_df.loc[r,'inventory_on_hand']
-
-    # Extract value to be used as daily run rate
-    daily_run_rate = inventory_report_df.loc[r,'upper_bound']
-
-    # If daily run rate was 0 (forecasting zero demand) then manually set days_of_stock_on_hand to 0
-    if daily_run_rate == 0:
-
-        inventory_report_df.loc[r,'days_of_stock_on_hand'] = 0
-    
-    # Check if there is existing inventory on hand (since it is the denominator) - if so, calculate days of stock on hand 
-    elif daily_run_rate > 0 and inventory_on_hand > 0:
-
-        inventory_report_df.loc[r,'days_of_stock_on_hand'] = (inventory_on_hand / daily_run_rate).astype(int)
+report_fingerprint = fingerprint_stage_inputs('report', run_rates_fingerprint)
 
-    # Else set days of stock on hand to 0
-    else:
+inventory_report_df = checkpoints.load('report', report_fingerprint)
 
-        inventory_report_df.loc[r,'days_of_stock_on_hand'] = 0
+if inventory_report_df is None:
 
+    # Subset product types included in the report & calculate forecasted stockout dates
+    inventory_report_df = build_inventory_report(inventory_details_df)
 
-# Calculate forecasted stockout date
-inventory_report_df['forecasted_stockout_date'] = inventory_report_df['days_of_stock_on_hand'].apply(lambda x: pd.to_datetime(pd.to_datetime('today') + timedelta(max(x,0))).strftime('%Y-%m-%d'))
+    checkpoints.save('report', report_fingerprint, inventory_report_df)
 
 logger.info(inventory_report_df.head())
 
@@ -908,23 +290,21 @@ logger.info(inventory_report_df.head())
 
 # VALIDATE DATA =======================================
 
-valid_data = []
-invalid_data = []
+# Read the published reports the publish step diffs against while validating
+published_reports = prefetch_published_reports(current_date=current_date, bucket=BUCKET, cache_dir=CACHE_DIR)
 
-# Iterate through each row, convert to dict, validate against Pydantic model
-for idx, row in inventory_report_df.iterrows():
-    try:
-        # Validate row with Pydantic Model
-        validated_data = ShopifyDemandForecast(**row.to_dict())
-        valid_data.append(validated_data.__dict__)
-    except Exception as e:  
-        logger.error(f"Data validation failed: {e}")
-        logger.error(row.to_dict())
-        invalid_data.append(row.to_dict())
+validated_fingerprint = fingerprint_stage_inputs('validated', report_fingerprint)
 
-    # Convert back to df
-    valid_df = pd.DataFrame(valid_data)
-    invalid_df = pd.DataFrame(invalid_data)
+valid_df = checkpoints.load('validated', validated_fingerprint)
+
+if valid_df is not None:
+    invalid_df = pd.DataFrame()
+else:
+    valid_df, invalid_df = validate_forecast(inventory_report_df)
+
+    # Only fully valid reports are checkpointed (an invalid report is never published)
+    if len(valid_df) > 0 and len(invalid_df) == 0:
+        checkpoints.save('validated', validated_fingerprint, valid_df)
 
 
 # #=======  LOCAL MODE: write to csv locally 
@@ -945,19 +325,6 @@ for idx, row in inventory_report_df.iterrows():
 # # =======================================================
 
 
-# CONFIGURE BOTO  =======================================
-
-
-# Create s3 client
-s3_client = boto3.client('s3', 
-                          region_name = REGION,
-                          aws_access_key_id=AWS_ACCESS_KEY_ID,
-                          aws_secret_access_key=AWS_SECRET_ACCESS_KEY
-                          )
-
-# Set bucket
-BUCKET = os.environ['S3_PRYMAL_ANALYTICS']
-
 # WRITE TO S3 =======================================
 
 current_time = datetime.datetime.now()
@@ -970,52 +337,30 @@ logger.info(f'{len(invalid_df)} rows in invalid_df')
 # If there are valid records, write to s3
 if len(valid_df) > 0 and len(invalid_df) == 0:
 
-    current_date = pd.to_datetime('today') - timedelta(hours=5)     # From UTC to EST
-
-    partition_y = pd.to_datetime(current_date).strftime('%Y') 
-    partition_m = pd.to_datetime(current_date).strftime('%m') 
-    partition_d = pd.to_datetime(current_date).strftime('%d') 
-
-
-    # Configure S3 Prefix
-    S3_PREFIX_PATH = f"reports/shopify_demand_forecasting/year={partition_y}/month={partition_m}/day={partition_d}/shopify_demand_forecasting_{partition_y}{partition_m}{partition_d}.csv"
-
-    # Check if data already exists for this partition
-    data_already_exists = check_path_for_objects(bucket=BUCKET, s3_prefix=S3_PREFIX_PATH)
-
-    # If data already exists, delete it .. (idempotent check)
-    if data_already_exists == True:
-        # Delete data 
-        delete_s3_prefix_data(bucket=BUCKET, s3_prefix=S3_PREFIX_PATH)
-
-
-    logger.info(f'Writing to {S3_PREFIX_PATH}')
-
-
-    with io.StringIO() as csv_buffer:
-        inventory_report_df.to_csv(csv_buffer, index=False)
-
-        response = s3_client.put_object(
-            Bucket=BUCKET, 
-            Key=S3_PREFIX_PATH, 
-            Body=csv_buffer.getvalue()
-        )
-
-        status = response['ResponseMetadata']['HTTPStatusCode']
-
-        if status == 200:
-            logger.info(f"Successful S3 put_object response for PUT ({S3_PREFIX_PATH}). Status - {status}")
-        else:
-            logger.error(f"Unsuccessful S3 put_object response for PUT ({S3_PREFIX_PATH}. Status - {status}")
+    # Write changeset, rollups, replenishment plan, accuracy, lookup store & archive concurrently, then the report
+    publish_forecast(s3_client=s3_client,
+                     inventory_report_df=inventory_report_df,
+                     valid_df=valid_df,
+                     rollup_df=rollup_df,
+                     accuracy_df=accuracy_df,
+                     current_date=current_date,
+                     bucket=BUCKET,
+                     cache_dir=CACHE_DIR,
+                     replenishment_df=replenishment_df,
+                     published_reports=published_reports)
+
+    # Run published - checkpoints are no longer needed
+    checkpoints.clear()
 
 # Else, if there are invalid records, send an alert
 else:
 
-    logger.error(f"Invalid records: {invalid_data['sku_name'].unique()}")
+    logger.error(f"Invalid records: {invalid_df['sku_name'].unique() if len(invalid_df) > 0 else []}")
 
     # Configure SNS email alert
     topic_arn = 'arn:aws:sns:us-east-1:925570149811:prymal_alerts'  
     email_subject = 'INVALID DATA - prymal_shopify_demand_forecast'
     email_body = f"""Invalid data was generated by this pipeline.  No data will be written to S3 for this pipeline run.  Please check logs for details"""
 
-    send_sns_alert_email(topic_arn, email_subject, email_body)
+    # Alert is sent in the background (the run exits once it is sent)
+    send_sns_alert_email_in_background(topic_arn, email_subject, email_body)
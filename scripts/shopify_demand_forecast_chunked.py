@@ -0,0 +1,261 @@
+import argparse
+import gc
+import os
+import sys
+import datetime
+from datetime import timedelta
+import pandas as pd
+from loguru import logger
+
+from utils.aws_utils import get_report_s3_key, send_sns_alert_email_in_background, get_s3_client
+from utils.extract_utils import count_orders, extract_orders, extract_inventory
+from utils.forecast_utils import FORECAST_VERSION, generate_run_rates, build_inventory_details, generate_hierarchical_rollups, build_inventory_report
+from utils.data_quality import run_data_quality_gate, get_quarantined_skus
+from utils.forecast_accuracy import read_accuracy_inputs, update_accuracy_accumulators
+from utils.memo_store import SkuMemoStore
+from utils.publish_utils import validate_forecast, publish_forecast
+from utils.shard_utils import filter_sku_shard
+from utils.chunk_utils import MultipartCsvUpload, ChunkResultSpill, plan_chunk_count, split_chunk, estimate_chunk_mb, current_rss_mb, peak_rss_mb, ROW_SIZE_SAMPLE_SHARDS
+from utils.replenishment_utils import read_replenishment_params, plan_replenishment
+
+# -------------------------------------
+# Variables
+# -------------------------------------
+
+# Local cache directory (persisted between workflow runs w/ actions/cache)
+CACHE_DIR = os.environ.get('FORECAST_CACHE_DIR', '.forecast_cache')
+
+# Memoization of per-sku run rates (shared with shopify_demand_forecast.py)
+FORCE_RECOMPUTE = os.environ.get('FORCE_RECOMPUTE', 'false').lower() == 'true'
+MEMO_MAX_ENTRIES = int(os.environ.get('MEMO_MAX_ENTRIES', 20000))
+MEMO_TTL_DAYS = int(os.environ.get('MEMO_TTL_DAYS', 7))
+
+# Number of days to probe for the latest published accuracy accumulators (older accumulators are found by listing the published partitions)
+ACCURACY_LOOKBACK_DAYS = 7
+
+# Data quality gate: 'quarantine' removes skus with bad rows, 'fail' stops the run instead
+DATA_QUALITY_MODE = os.environ.get('DATA_QUALITY_MODE', 'quarantine').lower()
+
+# Replenishment parameters & daily capacity per production line (csv - see shopify_demand_forecast.py)
+REPLENISHMENT_PARAMS_PATH = os.environ.get('REPLENISHMENT_PARAMS_PATH')
+REPLENISHMENT_CAPACITY_PATH = os.environ.get('REPLENISHMENT_CAPACITY_PATH')
+
+# Rows of the report written to the multipart upload at a time
+REPORT_UPLOAD_ROWS = 50000
+
+# -------------------------------------
+# Functions
+# -------------------------------------
+
+
+# Forecast one chunk of skus
+# -----------
+
+def forecast_chunk(chunk_index: int, chunk_count: int, daily_qty_sold_df: pd.DataFrame, inventory_df: pd.DataFrame, lookback_cutoff_date: str, previous_accuracy_df: pd.DataFrame, matured_forecast_df: pd.DataFrame, matured_date: str, memo_store: SkuMemoStore):
+
+    # Check the chunk's extracts before forecasting (raises in 'fail' mode - the upload is aborted)
+    # (chunks no sku hashes to have nothing to check - their missing inventory partitions are not an error)
+    if len(daily_qty_sold_df) > 0 or len(inventory_df) > 0:
+        daily_qty_sold_df, inventory_df, data_quality_df = run_data_quality_gate(daily_qty_sold_df=daily_qty_sold_df, inventory_df=inventory_df, lookback_cutoff_date=lookback_cutoff_date, mode=DATA_QUALITY_MODE)
+        quarantined_skus = get_quarantined_skus(data_quality_df)
+    else:
+        quarantined_skus = []
+
+    # Accuracy accumulators of the chunk's skus
+    chunk_accuracy_df = filter_sku_shard(previous_accuracy_df, chunk_index, chunk_count)
+
+    if matured_forecast_df is not None:
+        # Quarantined skus have no trusted actuals - their accumulators are carried forward unchanged
+        chunk_forecast_df = filter_sku_shard(matured_forecast_df, chunk_index, chunk_count)
+        chunk_accuracy_df = update_accuracy_accumulators(previous_accuracy_df=chunk_accuracy_df,
+                                                         forecast_df=chunk_forecast_df.loc[~chunk_forecast_df['sku'].astype(str).isin(quarantined_skus)],
+                                                         daily_qty_sold_df=daily_qty_sold_df,
+                                                         matured_date=matured_date)
+
+    if len(daily_qty_sold_df) == 0:
+        logger.warning(f'No orders in chunk {chunk_index}/{chunk_count}')
+        return None, chunk_accuracy_df, quarantined_skus
+
+    product_run_rate_df = generate_run_rates(daily_qty_sold_df=daily_qty_sold_df, inventory_df=inventory_df, memo_store=memo_store)
+    inventory_details_df = build_inventory_details(product_run_rate_df=product_run_rate_df, inventory_df=inventory_df)
+
+    return inventory_details_df, chunk_accuracy_df, quarantined_skus
+
+
+# Build the report from the spilled details of every chunk
+# -----------
+
+def build_chunked_report(results: ChunkResultSpill):
+
+    # The report is built once over the whole catalog (sections & the top skus of a section are not per chunk),
+    # from the per-sku details - one row per sku, the order & inventory rows are never held for more than one chunk
+    inventory_details_df = results.read('details')
+
+    if len(inventory_details_df) == 0:
+        return inventory_details_df, pd.DataFrame()
+
+    return inventory_details_df, build_inventory_report(inventory_details_df)
+
+
+# Stream the report to the multipart upload
+# -----------
+
+def stream_report(report_upload: MultipartCsvUpload, inventory_report_df: pd.DataFrame):
+
+    for start in range(0, len(inventory_report_df), REPORT_UPLOAD_ROWS):
+        report_upload.write(inventory_report_df.iloc[start:start + REPORT_UPLOAD_ROWS])
+
+
+# ========================================================================
+# Execute Code
+# ========================================================================
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Memory bounded Shopify demand forecast - skus are extracted, forecasted & uploaded in chunks sized from a memory budget')
+    parser.add_argument('--memory-budget-mb', type=float, default=float(os.environ.get('MEMORY_BUDGET_MB', 4096)), help='Peak RSS budget in MB')
+    parser.add_argument('--bucket', default=os.environ.get('S3_PRYMAL_ANALYTICS'), help='S3 bucket of the reports')
+    args = parser.parse_args()
+
+    start_time = datetime.datetime.now()
+    logger.info(f'Start time: {start_time}')
+
+    lookback_cutoff_date = pd.to_datetime(pd.to_datetime('today') - timedelta(days=100)).strftime('%Y-%m-%d')
+    current_date = pd.to_datetime('today') - timedelta(hours=5)     # From UTC to EST
+
+    s3_client = get_s3_client()
+
+    # Plan chunks (row size measured on a sample of the orders)
+    # ----
+
+    sample_df = extract_orders(lookback_cutoff_date=lookback_cutoff_date, shard_index=0, shard_count=ROW_SIZE_SAMPLE_SHARDS)
+    chunk_count = plan_chunk_count(order_rows=count_orders(lookback_cutoff_date=lookback_cutoff_date), memory_budget_mb=args.memory_budget_mb, sample_df=sample_df)
+    del sample_df
+
+    previous_accuracy_df, matured_forecast_df, matured_date = read_accuracy_inputs(bucket=args.bucket, current_date=current_date, cache_dir=CACHE_DIR, lookback_days=ACCURACY_LOOKBACK_DAYS)
+
+    memo_store = SkuMemoStore(path=os.path.join(CACHE_DIR, 'sku_run_rate_memo.json'),
+                              version=FORECAST_VERSION,
+                              max_entries=MEMO_MAX_ENTRIES,
+                              ttl_days=MEMO_TTL_DAYS,
+                              force_recompute=FORCE_RECOMPUTE)
+
+    # Forecast chunk by chunk (per-sku results are spilled to disk, not kept in memory across chunks)
+    # ----
+
+    results = ChunkResultSpill(spill_dir=os.path.join(CACHE_DIR, 'chunk_spill'))
+
+    # Chunks to forecast as (chunk_index, chunk_count) sku hash partitions - chunks which do not fit are split in two
+    pending_chunks = [(chunk_index, chunk_count) for chunk_index in range(chunk_count)]
+    chunks_done, quarantined_skus = 0, []
+
+    try:
+        while len(pending_chunks) > 0:
+
+            chunk_index, chunk_count = pending_chunks.pop(0)
+
+            # Extract only the skus of the chunk (chunks are hash partitions of the sku, pushed into both queries)
+            daily_qty_sold_df = extract_orders(lookback_cutoff_date=lookback_cutoff_date, shard_index=chunk_index, shard_count=chunk_count)
+            inventory_df = extract_inventory(lookback_cutoff_date=lookback_cutoff_date, shard_index=chunk_index, shard_count=chunk_count)
+
+            # Re-split the chunk before forecasting it if it would not fit in the memory budget
+            projected_mb = current_rss_mb() + estimate_chunk_mb(daily_qty_sold_df, inventory_df)
+
+            if projected_mb > args.memory_budget_mb:
+
+                if daily_qty_sold_df['sku'].nunique() <= 1:
+                    raise ValueError(f'Chunk {chunk_index}/{chunk_count} (one sku) needs ~{projected_mb:.0f} MB - over the memory budget of {args.memory_budget_mb:.0f} MB')
+
+                logger.warning(f'Chunk {chunk_index}/{chunk_count} needs ~{projected_mb:.0f} MB (budget {args.memory_budget_mb:.0f} MB) - splitting it in two')
+                pending_chunks = split_chunk(chunk_index, chunk_count) + pending_chunks
+
+                del daily_qty_sold_df, inventory_df
+                gc.collect()
+                continue
+
+            inventory_details_df, chunk_accuracy_df, chunk_quarantined_skus = forecast_chunk(chunk_index, chunk_count, daily_qty_sold_df, inventory_df, lookback_cutoff_date, previous_accuracy_df, matured_forecast_df, matured_date, memo_store)
+
+            results.write('details', inventory_details_df)
+            results.write('accuracy', chunk_accuracy_df)
+            quarantined_skus += chunk_quarantined_skus
+
+            # Release the chunk's frames before the next chunk
+            del daily_qty_sold_df, inventory_df, inventory_details_df, chunk_accuracy_df
+            gc.collect()
+
+            chunks_done += 1
+
+            # The budget is enforced - a chunk which went over it (estimate too low) fails the run
+            if peak_rss_mb() > args.memory_budget_mb:
+                raise ValueError(f'Peak RSS of {peak_rss_mb():.0f} MB exceeded the memory budget of {args.memory_budget_mb:.0f} MB (chunk {chunk_index}/{chunk_count})')
+
+            logger.info(f'Chunk {chunk_index}/{chunk_count} done ({chunks_done} chunks, {len(pending_chunks)} pending) - RSS: {current_rss_mb():.0f} MB, peak RSS: {peak_rss_mb():.0f} MB')
+
+    except Exception:
+        results.clear()
+        raise
+
+    memo_store.save()
+
+    # Quarantined skus are left out of this run's forecast & report
+    if len(quarantined_skus) > 0:
+        send_sns_alert_email_in_background(topic_arn='arn:aws:sns:us-east-1:925570149811:prymal_alerts',
+                                           email_subject='DATA QUALITY WARNING - prymal_shopify_demand_forecast',
+                                           email_body=f'{len(quarantined_skus)} skus failed data quality checks & were quarantined (left out of the forecast & report for this pipeline run): {quarantined_skus}.  Please check logs for details')
+
+    # Report of every chunk's skus & accuracy accumulators
+    inventory_details_df, inventory_report_df = build_chunked_report(results)
+    accuracy_df = results.read('accuracy')
+    results.clear()
+
+    valid_df, invalid_df = validate_forecast(inventory_report_df)
+    invalid_rows = len(invalid_df)
+
+    logger.info(f'{len(valid_df)} rows in valid_df')
+    logger.info(f'{invalid_rows} rows in invalid_df')
+
+    # Publish (the streamed report is completed once every other artifact is written)
+    # ----
+
+    if len(valid_df) > 0 and invalid_rows == 0:
+
+        report_upload = MultipartCsvUpload(s3_client=s3_client, bucket=args.bucket, s3_key=get_report_s3_key('shopify_demand_forecasting', current_date))
+
+        try:
+            stream_report(report_upload, inventory_report_df)
+        except Exception:
+            report_upload.abort()
+            raise
+
+        # Orders are planned over the skus of every chunk (line capacity is shared by the whole catalog)
+        replenishment_params_df, line_capacity_df = read_replenishment_params(params_path=REPLENISHMENT_PARAMS_PATH, capacity_path=REPLENISHMENT_CAPACITY_PATH)
+
+        publish_forecast(s3_client=s3_client,
+                         inventory_report_df=inventory_report_df,
+                         valid_df=valid_df,
+                         rollup_df=generate_hierarchical_rollups(inventory_details_df),
+                         accuracy_df=accuracy_df,
+                         current_date=current_date,
+                         bucket=args.bucket,
+                         cache_dir=CACHE_DIR,
+                         report_upload=report_upload,
+                         replenishment_df=plan_replenishment(inventory_details_df, params_df=replenishment_params_df, capacity_df=line_capacity_df))
+
+    else:
+
+        if invalid_rows > 0:
+            logger.error(f"Invalid records: {invalid_df['sku_name'].unique()}")
+
+        send_sns_alert_email_in_background(topic_arn='arn:aws:sns:us-east-1:925570149811:prymal_alerts',
+                                           email_subject='INVALID DATA - prymal_shopify_demand_forecast',
+                                           email_body='Invalid data was generated by this pipeline.  No data will be written to S3 for this pipeline run.  Please check logs for details')
+
+    # Report peak memory against the budget
+    # ----
+
+    logger.info(f'Peak RSS: {peak_rss_mb():.0f} MB of a {args.memory_budget_mb:.0f} MB budget ({chunks_done} chunks)')
+
+    logger.info(f'End time: {datetime.datetime.now()}')
+
+    if invalid_rows > 0 or len(valid_df) == 0:
+        sys.exit(1)
@@ -0,0 +1,94 @@
+import argparse
+import os
+import datetime
+from datetime import timedelta
+import pandas as pd
+from loguru import logger
+
+from utils.aws_utils import put_df_to_s3, get_s3_client
+from utils.extract_utils import extract_orders, extract_inventory, format_orders, format_inventory
+from utils.forecast_utils import FORECAST_VERSION, generate_run_rates, build_inventory_details
+from utils.memo_store import SkuMemoStore
+from utils.data_quality import run_data_quality_gate
+from utils.scenario_utils import read_scenarios, evaluate_scenarios, format_scenario_report, get_scenario_s3_key
+
+# -------------------------------------
+# Variables
+# -------------------------------------
+
+# Local cache directory (scenario reports are written here when no bucket is configured)
+CACHE_DIR = os.environ.get('FORECAST_CACHE_DIR', '.forecast_cache')
+
+# Memoization of per-sku run rates (shared with shopify_demand_forecast.py)
+MEMO_MAX_ENTRIES = int(os.environ.get('MEMO_MAX_ENTRIES', 20000))
+MEMO_TTL_DAYS = int(os.environ.get('MEMO_TTL_DAYS', 7))
+
+# ========================================================================
+# Execute Code
+# ========================================================================
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Evaluate a table of what-if scenarios against one load of order & inventory data')
+    parser.add_argument('--scenarios', required=True, help='CSV of scenarios (scenario, product_type, sku, demand_multiplier, inventory_adjustment_days, inventory_adjustment_units, horizons)')
+    parser.add_argument('--orders-csv', help='Load order history from a local CSV instead of Athena')
+    parser.add_argument('--inventory-csv', help='Load inventory history from a local CSV instead of Athena')
+    parser.add_argument('--bucket', default=os.environ.get('S3_PRYMAL_ANALYTICS'), help='S3 bucket for scenario reports (local cache if not set)')
+    args = parser.parse_args()
+
+    start_time = datetime.datetime.now()
+
+    scenarios_df, horizons = read_scenarios(args.scenarios)
+
+    # Load data & generate run rates once (shared by every scenario)
+    # ----
+
+    lookback_cutoff_date = pd.to_datetime(pd.to_datetime('today') - timedelta(days=100)).strftime('%Y-%m-%d')
+    current_date = pd.to_datetime('today') - timedelta(hours=5)     # From UTC to EST
+
+    if args.orders_csv:
+        daily_qty_sold_df = format_orders(pd.read_csv(args.orders_csv, dtype={'sku': str}))
+    else:
+        daily_qty_sold_df = extract_orders(lookback_cutoff_date=lookback_cutoff_date)
+
+    if args.inventory_csv:
+        inventory_df = format_inventory(pd.read_csv(args.inventory_csv, dtype={'sku': str}))
+    else:
+        inventory_df = extract_inventory(lookback_cutoff_date=lookback_cutoff_date)
+
+    daily_qty_sold_df, inventory_df, data_quality_df = run_data_quality_gate(daily_qty_sold_df=daily_qty_sold_df, inventory_df=inventory_df, lookback_cutoff_date=lookback_cutoff_date)
+
+    memo_store = SkuMemoStore(path=os.path.join(CACHE_DIR, 'sku_run_rate_memo.json'),
+                              version=FORECAST_VERSION,
+                              max_entries=MEMO_MAX_ENTRIES,
+                              ttl_days=MEMO_TTL_DAYS)
+
+    product_run_rate_df = generate_run_rates(daily_qty_sold_df=daily_qty_sold_df, inventory_df=inventory_df, memo_store=memo_store)
+    memo_store.save()
+
+    inventory_details_df = build_inventory_details(product_run_rate_df=product_run_rate_df, inventory_df=inventory_df)
+
+    base_time = datetime.datetime.now()
+
+    # Evaluate every scenario as one batch & write one report per scenario
+    # ----
+
+    scenario_df = evaluate_scenarios(inventory_details_df=inventory_details_df, scenarios_df=scenarios_df, horizons=horizons)
+
+    if args.bucket:
+        s3_client = get_s3_client()
+
+    for scenario, scenario_report_df in scenario_df.groupby('scenario', sort=False):
+
+        s3_key = get_scenario_s3_key(scenario, current_date)
+        report_df = format_scenario_report(scenario_report_df, horizons[scenario])
+
+        # Reruns of the same day replace the scenario's report
+        if args.bucket:
+            put_df_to_s3(s3_client=s3_client, df=report_df, bucket=args.bucket, s3_key=s3_key)
+        else:
+            local_path = os.path.join(CACHE_DIR, s3_key)
+            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            report_df.to_csv(local_path, index=False)
+
+    logger.info(f'{len(horizons)} scenario reports written - load & run rates: {base_time - start_time}, scenarios: {datetime.datetime.now() - base_time}')
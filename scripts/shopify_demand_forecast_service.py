@@ -0,0 +1,222 @@
+import asyncio
+import argparse
+import json
+import os
+import threading
+import datetime
+from datetime import timedelta
+import pandas as pd
+from loguru import logger
+
+from utils.aws_utils import check_path_for_objects, delete_s3_prefix_data, put_df_to_s3, get_report_s3_key, cache_report_csv, get_s3_client
+from utils.extract_utils import extract_orders, extract_inventory, format_orders, format_inventory
+from utils.service_state import SkuForecastState
+
+# -------------------------------------
+# Variables
+# -------------------------------------
+
+# Local cache directory (snapshots are written here when no bucket is configured)
+CACHE_DIR = os.environ.get('FORECAST_CACHE_DIR', '.forecast_cache')
+
+# Report name of the intraday snapshots (reports/<name>/year=/month=/day=/)
+SNAPSHOT_REPORT_NAME = 'shopify_demand_forecasting_intraday'
+
+# Snapshots are written from worker threads - one at a time
+_snapshot_lock = threading.Lock()
+
+# -------------------------------------
+# Functions
+# -------------------------------------
+
+
+# Tail a JSON lines file of order / inventory events
+# -----------
+
+async def tail_event_file(path: str, queue: asyncio.Queue, poll_interval: float, from_start: bool):
+
+    logger.info(f'Tailing events from {path}')
+
+    with open(path, 'r') as f:
+
+        # Only process new events unless replaying the whole file
+        if not from_start:
+            f.seek(0, os.SEEK_END)
+
+        # Text of a line not yet terminated by a newline (a line may be written in several flushes)
+        buffer = ''
+
+        while True:
+            text = f.readline()
+
+            if not text:
+                await asyncio.sleep(poll_interval)
+                continue
+
+            buffer += text
+
+            # Only parse complete lines
+            if not buffer.endswith('\n'):
+                continue
+
+            line, buffer = buffer, ''
+
+            if line.strip():
+                try:
+                    await queue.put(json.loads(line))
+                except ValueError as e:
+                    logger.error(f'Invalid event ({e}): {line}')
+
+
+# Replay historical shopify_qty_sold_by_sku_daily rows as order events
+# -----------
+
+async def replay_orders_csv(path: str, queue: asyncio.Queue):
+
+    replay_df = pd.read_csv(path, dtype={'sku': str}).sort_values('order_date')
+
+    logger.info(f'Replaying {len(replay_df)} order rows from {path}')
+
+    for record in replay_df.to_dict('records'):
+        event = {key: value for key, value in record.items() if pd.notna(value)}
+        event['type'] = 'order'
+        await queue.put(event)
+
+    # Signal end of replay
+    await queue.put(None)
+
+
+# Apply events to the forecast state as they arrive
+# -----------
+
+async def consume_events(queue: asyncio.Queue, state: SkuForecastState):
+
+    while True:
+        event = await queue.get()
+
+        if event is None:
+            logger.info('End of event stream')
+            return
+
+        try:
+            state.apply_event(event)
+        except (KeyError, ValueError, TypeError) as e:
+            logger.error(f'Unable to apply event ({e}): {event}')
+
+
+# Write a snapshot of the forecast state (to S3 if a bucket is configured, else to the local cache)
+# -----------
+
+def write_snapshot(state: SkuForecastState, bucket: str):
+
+    with _snapshot_lock:
+
+        snapshot_df = state.snapshot()
+
+        current_date = pd.to_datetime('today') - timedelta(hours=5)     # From UTC to EST
+        s3_key = get_report_s3_key(SNAPSHOT_REPORT_NAME, current_date)
+
+        if bucket:
+
+            # Create s3 client
+            s3_client = get_s3_client()
+
+            # Latest snapshot of the day replaces the previous one (idempotent check)
+            if check_path_for_objects(bucket=bucket, s3_prefix=s3_key) == True:
+                delete_s3_prefix_data(bucket=bucket, s3_prefix=s3_key)
+
+            put_df_to_s3(s3_client=s3_client, df=snapshot_df, bucket=bucket, s3_key=s3_key)
+
+        else:
+            cache_report_csv(df=snapshot_df, s3_key=s3_key, cache_dir=CACHE_DIR)
+
+        logger.info(f'Snapshot of {len(snapshot_df)} skus written ({s3_key}) - event latency: {state.latency_summary()}')
+
+
+# Periodically refresh run rates of affected skus & write snapshots
+# -----------
+
+async def refresh_periodically(state: SkuForecastState, refresh_interval: float, snapshot_interval: float, bucket: str):
+
+    last_snapshot = datetime.datetime.now()
+
+    while True:
+        await asyncio.sleep(refresh_interval)
+
+        # Refresh & snapshot IO run in worker threads so events keep being applied meanwhile
+        await asyncio.to_thread(state.refresh_run_rates)
+
+        if (datetime.datetime.now() - last_snapshot).total_seconds() >= snapshot_interval:
+            await asyncio.to_thread(write_snapshot, state, bucket)
+            last_snapshot = datetime.datetime.now()
+
+
+async def run_service(args):
+
+    # Bootstrap forecast state (from local csvs or the datalake)
+    # ----
+
+    if args.replay:
+        # Replay starts from inventory only - order history is rebuilt from the replayed events
+        daily_qty_sold_df = pd.DataFrame(columns=['partition_date','order_date','sku','sku_name','product_category','product_type','qty_sold','week'])
+    elif args.orders_csv:
+        daily_qty_sold_df = format_orders(pd.read_csv(args.orders_csv, dtype={'sku': str}))
+    else:
+        lookback_cutoff_date = pd.to_datetime(pd.to_datetime('today') - timedelta(days=100)).strftime('%Y-%m-%d')
+        daily_qty_sold_df = extract_orders(lookback_cutoff_date=lookback_cutoff_date)
+
+    if args.inventory_csv:
+        inventory_df = format_inventory(pd.read_csv(args.inventory_csv, dtype={'sku': str}))
+    else:
+        lookback_cutoff_date = pd.to_datetime(pd.to_datetime('today') - timedelta(days=100)).strftime('%Y-%m-%d')
+        inventory_df = extract_inventory(lookback_cutoff_date=lookback_cutoff_date)
+
+    state = SkuForecastState(daily_qty_sold_df=daily_qty_sold_df, inventory_df=inventory_df)
+
+    # Run event ingestion alongside periodic refresh / snapshots
+    # ----
+
+    queue = asyncio.Queue(maxsize=10000)
+
+    if args.replay:
+        producer = asyncio.create_task(replay_orders_csv(args.replay, queue))
+    else:
+        producer = asyncio.create_task(tail_event_file(args.events, queue, args.poll_interval, args.from_start))
+
+    refresher = asyncio.create_task(refresh_periodically(state, args.refresh_interval, args.snapshot_interval, args.bucket))
+
+    await consume_events(queue, state)
+
+    # End of stream (replay) - final refresh & snapshot
+    refresher.cancel()
+    producer.cancel()
+
+    # (waits for a refresh / snapshot still running in a worker thread)
+    await asyncio.to_thread(state.refresh_run_rates)
+    await asyncio.to_thread(write_snapshot, state, args.bucket)
+
+    return state
+
+
+# ========================================================================
+# Execute Code
+# ========================================================================
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Incremental Shopify demand forecast service fed by order & inventory events')
+    parser.add_argument('--events', help='JSON lines file of order / inventory events to tail')
+    parser.add_argument('--from-start', action='store_true', help='Process events already in the events file')
+    parser.add_argument('--replay', help='CSV of historical shopify_qty_sold_by_sku_daily rows to replay as order events')
+    parser.add_argument('--orders-csv', help='Bootstrap order history from a local CSV instead of Athena')
+    parser.add_argument('--inventory-csv', help='Bootstrap inventory history from a local CSV instead of Athena')
+    parser.add_argument('--bucket', default=os.environ.get('S3_PRYMAL_ANALYTICS'), help='S3 bucket for snapshots (local cache if not set)')
+    parser.add_argument('--refresh-interval', type=float, default=5, help='Seconds between run rate refreshes of affected skus')
+    parser.add_argument('--snapshot-interval', type=float, default=900, help='Seconds between snapshots')
+    parser.add_argument('--poll-interval', type=float, default=0.05, help='Seconds between polls of the events file')
+    args = parser.parse_args()
+
+    if not args.events and not args.replay:
+        parser.error('one of --events or --replay is required')
+
+    asyncio.run(run_service(args))
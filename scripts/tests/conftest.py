@@ -0,0 +1,21 @@
+import os
+import sys
+import pytest
+
+# Scripts import their helpers as `utils.*` (run from the scripts directory)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import aws_utils
+from utils.local_backend import LocalS3Client
+
+
+@pytest.fixture
+def local_s3(tmp_path, monkeypatch):
+    """
+    Point the shared S3 client at a local backend under tmp_path (returns the client)
+    """
+
+    s3_client = LocalS3Client(root=str(tmp_path / 'storage'))
+    monkeypatch.setattr(aws_utils, '_s3_client', s3_client)
+
+    return s3_client
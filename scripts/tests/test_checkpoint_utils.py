@@ -0,0 +1,64 @@
+import pandas as pd
+
+from utils.aws_utils import delete_s3_prefix_data, list_s3_keys
+from utils.checkpoint_utils import StageCheckpoints, fingerprint_stage_inputs
+from utils.data_quality import DATA_QUALITY_CHECKS
+
+
+STAGE_DF = pd.DataFrame({'sku': ['1000', '2000'], 'upper_bound': [1.5, 2.0]})
+
+
+def _checkpoints(local_s3, cache_dir, **kwargs):
+    return StageCheckpoints('2026-10-19', cache_dir=str(cache_dir), bucket='analytics', s3_client=local_s3, **kwargs)
+
+
+def test_retry_on_a_fresh_runner_resumes_from_s3(local_s3, tmp_path):
+
+    fingerprint = fingerprint_stage_inputs('2026-10-19', 90)
+    _checkpoints(local_s3, tmp_path / 'runner_1').save('run_rates', fingerprint, STAGE_DF)
+
+    checkpoints = _checkpoints(local_s3, tmp_path / 'runner_2')
+
+    pd.testing.assert_frame_equal(checkpoints.load('run_rates', fingerprint), STAGE_DF)
+    assert checkpoints.load('run_rates', fingerprint_stage_inputs('2026-10-19', 120)) is None
+    assert _checkpoints(local_s3, tmp_path / 'runner_2', enabled=False).load('run_rates', fingerprint) is None
+
+
+def test_checkpoints_are_scoped_to_the_shard(local_s3, tmp_path):
+
+    fingerprint = fingerprint_stage_inputs('2026-10-19')
+    _checkpoints(local_s3, tmp_path / 'runner_1', shard_index=0, shard_count=2).save('run_rates', fingerprint, STAGE_DF)
+
+    assert _checkpoints(local_s3, tmp_path / 'runner_2', shard_index=1, shard_count=2).load('run_rates', fingerprint) is None
+    assert _checkpoints(local_s3, tmp_path / 'runner_2').load('run_rates', fingerprint) is None
+
+
+def test_checkpoint_deleted_after_listing_is_a_miss(local_s3, tmp_path):
+
+    fingerprint = fingerprint_stage_inputs('2026-10-19')
+    writer = _checkpoints(local_s3, tmp_path / 'runner_1')
+    writer.save('run_rates', fingerprint, STAGE_DF)
+
+    checkpoints = _checkpoints(local_s3, tmp_path / 'runner_2')
+    delete_s3_prefix_data(bucket='analytics', s3_prefix=writer.run_prefix)
+
+    assert checkpoints.load('run_rates', fingerprint) is None
+
+
+def test_disabled_checkpoints_are_not_mirrored_to_s3(local_s3, tmp_path):
+
+    fingerprint = fingerprint_stage_inputs('2026-10-19')
+    writer = _checkpoints(local_s3, tmp_path / 'runner_1', enabled=False)
+    writer.save('run_rates', fingerprint, STAGE_DF)
+
+    assert list_s3_keys(bucket='analytics', s3_prefix=writer.run_prefix) == []
+    assert _checkpoints(local_s3, tmp_path / 'runner_2').load('run_rates', fingerprint) is None
+
+
+def test_data_quality_config_changes_the_fingerprint():
+
+    quarantine = fingerprint_stage_inputs('data_quality', 'quarantine', sorted(DATA_QUALITY_CHECKS.items()))
+    fail = fingerprint_stage_inputs('data_quality', 'fail', sorted(DATA_QUALITY_CHECKS.items()))
+    dropped_nulls = fingerprint_stage_inputs('data_quality', 'quarantine', sorted({**DATA_QUALITY_CHECKS, 'null_qty': 'drop'}.items()))
+
+    assert len({quarantine, fail, dropped_nulls}) == 3
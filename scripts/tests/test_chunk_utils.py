@@ -0,0 +1,68 @@
+import pytest
+import pandas as pd
+
+from utils import chunk_utils
+from utils.chunk_utils import ChunkResultSpill, MultipartCsvUpload, estimate_chunk_mb, plan_chunk_count, split_chunk
+from utils.aws_utils import get_object_from_s3
+from utils.shard_utils import get_sku_shard
+
+
+SAMPLE_DF = pd.DataFrame({'order_date': ['2026-10-18'] * 1000, 'sku': [str(sku) for sku in range(1000)], 'qty_sold': 1})
+
+
+def test_chunk_count_scales_with_measured_row_size(monkeypatch):
+
+    monkeypatch.setattr(chunk_utils, 'current_rss_mb', lambda: 100)
+
+    row_mb = estimate_chunk_mb(SAMPLE_DF) / len(SAMPLE_DF)
+    # Room for ~1000 order rows per chunk
+    budget_mb = 100 + 1001 * row_mb / chunk_utils.CHUNK_BUDGET_FRACTION
+
+    assert plan_chunk_count(1000, budget_mb, SAMPLE_DF) == 1
+    assert plan_chunk_count(10000, budget_mb, SAMPLE_DF) == 10
+    assert plan_chunk_count(10000, budget_mb, SAMPLE_DF.head(0)) == 1
+
+    with pytest.raises(ValueError):
+        plan_chunk_count(1000, 50, SAMPLE_DF)
+
+
+def test_split_chunk_partitions_the_chunk_skus():
+
+    skus = SAMPLE_DF['sku']
+
+    assert split_chunk(2, 3) == [(2, 6), (5, 6)]
+
+    split_skus = [set(skus[get_sku_shard(skus, count) == index]) for index, count in split_chunk(2, 3)]
+
+    assert split_skus[0] | split_skus[1] == set(skus[get_sku_shard(skus, 3) == 2])
+    assert not split_skus[0] & split_skus[1]
+
+    with pytest.raises(ValueError):
+        split_chunk(0, chunk_utils.MAX_CHUNK_COUNT)
+
+
+def test_spilled_chunks_are_read_back_in_order(tmp_path):
+
+    spill = ChunkResultSpill(str(tmp_path / 'spill'))
+    spill.write('report', SAMPLE_DF.head(2))
+    spill.write('report', SAMPLE_DF.head(0))
+    spill.write('report', SAMPLE_DF.tail(3))
+
+    pd.testing.assert_frame_equal(spill.read('report'), pd.concat([SAMPLE_DF.head(2), SAMPLE_DF.tail(3)], ignore_index=True))
+    assert len(spill.read('accuracy')) == 0
+
+    spill.clear()
+    assert len(spill.read('report')) == 0
+
+
+def test_multipart_upload_writes_one_csv(local_s3):
+
+    upload = MultipartCsvUpload(local_s3, 'analytics', 'reports/report.csv')
+    upload.write(SAMPLE_DF.head(2))
+    upload.write(SAMPLE_DF.tail(1))
+    upload.complete()
+
+    assert get_object_from_s3(bucket='analytics', s3_key='reports/report.csv').decode('utf-8').splitlines() == ['order_date,sku,qty_sold',
+                                                                                                                 '2026-10-18,0,1',
+                                                                                                                 '2026-10-18,1,1',
+                                                                                                                 '2026-10-18,999,1']
@@ -0,0 +1,45 @@
+import pandas as pd
+
+import shopify_demand_forecast_chunked
+from shopify_demand_forecast_chunked import build_chunked_report, stream_report
+from utils.aws_utils import get_object_from_s3
+from utils.chunk_utils import ChunkResultSpill, MultipartCsvUpload
+from utils.forecast_utils import build_inventory_report
+from utils.shard_utils import filter_sku_shard
+
+
+def _catalog():
+
+    # More bulk bag skus than the report keeps (top 20 by inventory on hand across the catalog)
+    product_types = ['Classic Creamer - Bulk Bag'] * 30 + ['Classic Creamer - Large Bag'] * 10 + ['Creamer Sachet'] * 10 + ['Other'] * 5
+
+    return pd.DataFrame({'sku': [str(1000 + i) for i in range(len(product_types))],
+                         'sku_name': [f'sku {i}' for i in range(len(product_types))],
+                         'product_type': product_types,
+                         'product_category': 'Creamer',
+                         'upper_bound': 2.0,
+                         'inventory_on_hand': [(i * 37) % 100 for i in range(len(product_types))]})
+
+
+def test_chunked_report_matches_the_full_catalog_report(local_s3, tmp_path, monkeypatch):
+
+    monkeypatch.setattr(shopify_demand_forecast_chunked, 'REPORT_UPLOAD_ROWS', 7)
+
+    catalog_df = _catalog()
+
+    results = ChunkResultSpill(str(tmp_path / 'spill'))
+    for chunk_index in range(4):
+        results.write('details', filter_sku_shard(catalog_df, chunk_index, 4))
+
+    inventory_details_df, inventory_report_df = build_chunked_report(results)
+
+    report_upload = MultipartCsvUpload(local_s3, 'analytics', 'reports/report.csv')
+    stream_report(report_upload, inventory_report_df)
+    report_upload.complete()
+
+    expected_df = build_inventory_report(catalog_df)
+
+    assert len(inventory_details_df) == len(catalog_df)
+    assert (expected_df['product_type'] == 'Classic Creamer - Bulk Bag').sum() == 20
+    pd.testing.assert_frame_equal(inventory_report_df, expected_df)
+    assert get_object_from_s3(bucket='analytics', s3_key='reports/report.csv').decode('utf-8') == expected_df.to_csv(index=False)
@@ -0,0 +1,110 @@
+import pytest
+import numpy as np
+import pandas as pd
+from datetime import timedelta
+
+from utils.data_quality import get_quarantined_skus, run_data_quality_gate
+
+
+DATES = pd.date_range(pd.to_datetime('today').normalize() - timedelta(3), periods=3).strftime('%Y-%m-%d').tolist()
+
+
+def _extracts(skus=('1000', '2000')):
+
+    orders_df = pd.DataFrame([[date, sku, 'x', 1] for date in DATES for sku in skus], columns=['order_date','sku','sku_name','qty_sold'])
+    inventory_df = pd.DataFrame([[date, sku, 10] for date in DATES for sku in skus], columns=['partition_date','sku','inventory_on_hand'])
+
+    return orders_df, inventory_df
+
+
+def _gate(orders_df, inventory_df, mode='quarantine'):
+
+    orders_df, inventory_df, issues_df = run_data_quality_gate(orders_df, inventory_df, DATES[0], mode=mode)
+
+    return orders_df, inventory_df, issues_df.set_index('check')
+
+
+def test_clean_extracts_pass():
+
+    orders_df, inventory_df, issues_df = _gate(*_extracts())
+
+    assert len(issues_df) == 0
+    assert len(orders_df) == 6 and len(inventory_df) == 6
+
+
+def test_null_keys_are_dropped():
+
+    orders_df, inventory_df = _extracts()
+    orders_df.loc[0, 'sku'] = None
+
+    orders_df, _, issues_df = _gate(orders_df, inventory_df)
+
+    assert issues_df.loc['null_key', 'rows'] == 1
+    assert len(orders_df) == 5
+
+
+def test_sku_type_mismatch_is_normalized():
+
+    orders_df, inventory_df = _extracts()
+    orders_df['sku'] = orders_df['sku'].astype(float)
+
+    orders_df, _, issues_df = _gate(orders_df, inventory_df)
+
+    assert issues_df.loc[['sku_type_mismatch'], 'rows'].sum() == 6
+    assert sorted(orders_df['sku'].unique()) == ['1000', '2000']
+    assert 'no_inventory' not in issues_df.index
+
+
+@pytest.mark.parametrize('check, table, col, value', [('null_qty', 'orders', 'qty_sold', np.nan),
+                                                      ('negative_qty', 'orders', 'qty_sold', -1),
+                                                      ('null_inventory', 'inventory', 'inventory_on_hand', np.nan),
+                                                      ('negative_inventory', 'inventory', 'inventory_on_hand', -1)])
+def test_bad_values_quarantine_the_sku(check, table, col, value):
+
+    extracts = dict(zip(['orders', 'inventory'], _extracts()))
+    extracts[table].loc[extracts[table]['sku']=='2000', col] = value
+
+    orders_df, inventory_df, issues_df = _gate(extracts['orders'], extracts['inventory'])
+
+    assert issues_df.loc[check, 'sku'] == '2000'
+    assert get_quarantined_skus(issues_df.reset_index()) == ['2000']
+    assert orders_df['sku'].unique().tolist() == ['1000']
+    assert inventory_df['sku'].unique().tolist() == ['1000']
+
+    with pytest.raises(ValueError, match=check):
+        _gate(extracts['orders'], extracts['inventory'], mode='fail')
+
+
+def test_duplicate_order_rows_are_summed():
+
+    orders_df, inventory_df = _extracts()
+    orders_df = pd.concat([orders_df, orders_df.head(1).assign(sku_name='renamed', qty_sold=4)], ignore_index=True)
+
+    orders_df, _, issues_df = _gate(orders_df, inventory_df)
+
+    assert issues_df.loc['duplicate_key', 'rows'] == 2
+    assert len(orders_df) == 6
+    assert orders_df.loc[(orders_df['order_date']==DATES[0]) & (orders_df['sku']=='1000'), ['sku_name','qty_sold']].values.tolist() == [['x', 5]]
+
+
+def test_missing_latest_inventory_fails_the_run():
+
+    orders_df, inventory_df = _extracts()
+
+    with pytest.raises(ValueError, match='missing_latest_inventory'):
+        _gate(orders_df, inventory_df.loc[inventory_df['partition_date']!=DATES[-1]])
+
+
+def test_warnings_keep_every_row():
+
+    orders_df, inventory_df = _extracts()
+    orders_df = pd.concat([orders_df.loc[orders_df['order_date']!=DATES[1]], orders_df.head(1).assign(sku='3000')], ignore_index=True)
+    inventory_df = inventory_df.loc[inventory_df['partition_date']!=DATES[1]]
+
+    orders_df, _, issues_df = _gate(orders_df, inventory_df)
+
+    assert issues_df.loc['missing_inventory_partition', 'rows'] == 1
+    assert issues_df.loc['order_date_gap', 'rows'] == 1
+    assert issues_df.loc['no_inventory', 'sku'] == '3000'
+    assert (issues_df['action'] == 'warn').all()
+    assert len(orders_df) == 5
@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+
+from utils.aws_utils import get_report_s3_key, put_object_to_s3
+from utils.forecast_accuracy import read_accuracy_inputs, update_accuracy_accumulators
+
+
+FORECAST_DF = pd.DataFrame({'sku': [1000, 2000], 'lower_bound': [1.0, 0.0], 'upper_bound': [3.0, 2.0]})
+
+DAILY_QTY_SOLD_DF = pd.DataFrame({'order_date': ['2026-10-17', '2026-10-18', '2026-10-18'],
+                                  'sku': ['1000', '1000', '3000'],
+                                  'qty_sold': [9, 5, 4]})
+
+
+def write_report(s3_client, df, report_name, report_date):
+    put_object_to_s3(s3_client=s3_client, body=df.to_csv(index=False), bucket='analytics', s3_key=get_report_s3_key(report_name, report_date))
+
+
+def test_matured_day_is_folded_into_the_accumulators():
+
+    previous_df = pd.DataFrame({'sku': [1000], 'last_matured_date': ['2026-10-17'],
+                                'days_evaluated': [1], 'sum_actual': [9], 'sum_forecast': [3], 'sum_error': [-6],
+                                'sum_abs_error': [6], 'sum_squared_error': [36], 'days_covered': [0]})
+
+    accuracy_df = update_accuracy_accumulators(previous_df, FORECAST_DF, DAILY_QTY_SOLD_DF, '2026-10-18').set_index('sku')
+
+    # sku 1000: forecast 3, actual 5 / sku 2000: no orders (actual 0) / sku 3000: sold but not forecasted (not evaluated)
+    assert accuracy_df.loc['1000', ['days_evaluated','sum_actual','sum_error','sum_squared_error','days_covered']].tolist() == [2, 14, -8, 40, 0]
+    assert accuracy_df.loc['1000', 'mae'] == 4
+    assert accuracy_df.loc['1000', 'rmse'] == pytest.approx(20 ** 0.5)
+    assert accuracy_df.loc['2000', ['days_evaluated','sum_actual','sum_error','days_covered']].tolist() == [1, 0, 2, 1]
+    assert pd.isna(accuracy_df.loc['2000', 'wape'])
+    assert '3000' not in accuracy_df.index
+    assert (accuracy_df['last_matured_date'] == '2026-10-18').all()
+
+
+def test_rerun_does_not_fold_the_same_day_twice():
+
+    accuracy_df = update_accuracy_accumulators(pd.DataFrame(), FORECAST_DF, DAILY_QTY_SOLD_DF, '2026-10-18')
+    rerun_df = update_accuracy_accumulators(accuracy_df, FORECAST_DF, DAILY_QTY_SOLD_DF, '2026-10-18')
+
+    pd.testing.assert_frame_equal(rerun_df, accuracy_df)
+
+
+def test_accumulators_are_carried_forward_over_a_gap(local_s3, tmp_path):
+
+    # Accumulators last published on 2026-10-08 (matured through 2026-10-07), then the pipeline was down until 2026-10-19
+    previous_df = update_accuracy_accumulators(pd.DataFrame(), FORECAST_DF, DAILY_QTY_SOLD_DF, '2026-10-07')
+    write_report(local_s3, previous_df, 'shopify_demand_forecasting_accuracy', '2026-10-08')
+
+    # Forecasts were only published on two of the missed days
+    write_report(local_s3, FORECAST_DF, 'shopify_demand_forecasting', '2026-10-08')
+    write_report(local_s3, FORECAST_DF, 'shopify_demand_forecasting', '2026-10-17')
+
+    previous_accuracy_df, matured_forecast_df, matured_date = read_accuracy_inputs(bucket='analytics', current_date=pd.to_datetime('2026-10-19'), cache_dir=str(tmp_path / 'cache'))
+
+    assert matured_date == '2026-10-18'
+    assert previous_accuracy_df['days_evaluated'].tolist() == [1, 1]
+    assert matured_forecast_df['matured_date'].unique().tolist() == ['2026-10-08', '2026-10-17']
+
+    accuracy_df = update_accuracy_accumulators(previous_accuracy_df, matured_forecast_df, DAILY_QTY_SOLD_DF, matured_date).set_index('sku')
+
+    # sku 1000: 2026-10-07 (no orders), 2026-10-08 (no orders) & 2026-10-17 (9 sold, forecast 3)
+    assert accuracy_df.loc['1000', ['days_evaluated','sum_actual','sum_error','days_covered']].tolist() == [3, 9, 0, 0]
+    assert accuracy_df.loc['2000', ['days_evaluated','sum_actual','sum_error','days_covered']].tolist() == [3, 0, 6, 3]
+    assert (accuracy_df['last_matured_date'] == '2026-10-17').all()
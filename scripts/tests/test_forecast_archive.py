@@ -0,0 +1,99 @@
+import os
+import json
+import time
+import pandas as pd
+
+from utils import forecast_archive
+from utils.aws_utils import list_s3_keys
+from utils.forecast_archive import ARCHIVE_PREFIX, ForecastArchive, archive_forecast_run, prune_archive_cache
+
+
+def _run(upper_bounds):
+    return pd.DataFrame({'sku': list(upper_bounds), 'upper_bound': list(upper_bounds.values())})
+
+
+def test_month_rollover_compacts_the_previous_month(local_s3, tmp_path):
+
+    cache_dir = str(tmp_path / 'cache')
+
+    archive_forecast_run(local_s3, _run({'2000': 1.0, '1000': 5.0}), '2026-09-29', 'analytics', cache_dir)
+    archive_forecast_run(local_s3, _run({'2000': 2.0, '1000': 6.0}), '2026-09-30', 'analytics', cache_dir)
+    archive_forecast_run(local_s3, _run({'2000': 2.5, '1000': 6.0}), '2026-09-30', 'analytics', cache_dir)     # rerun replaces the day
+    archive_forecast_run(local_s3, _run({'2000': 3.0, '1000': 7.0}), '2026-10-01', 'analytics', cache_dir)
+
+    keys = sorted(list_s3_keys(bucket='analytics', s3_prefix=f'{ARCHIVE_PREFIX}/'))
+
+    assert keys == [f'{ARCHIVE_PREFIX}/month=2026-09/compacted.arrow',
+                    f'{ARCHIVE_PREFIX}/month=2026-09/index.json',
+                    f'{ARCHIVE_PREFIX}/month=2026-10/run_date=2026-10-01.arrow']
+
+    # Compacted rows are sorted by sku & run_date, so each sku is one row range
+    with open(tmp_path / 'cache' / ARCHIVE_PREFIX / 'month=2026-09' / 'index.json', 'r') as f:
+        index = json.load(f)
+
+    assert index['rows'] == 4
+    assert index['skus'] == {'1000': [0, 2], '2000': [2, 4]}
+
+
+def test_sku_history_spans_compacted_and_daily_segments(local_s3, tmp_path):
+
+    cache_dir = str(tmp_path / 'cache')
+
+    for run_date, upper_bound in [('2026-09-29', 1.0), ('2026-09-30', 2.0), ('2026-10-01', 3.0), ('2026-10-02', 4.0)]:
+        archive_forecast_run(local_s3, _run({'1000': upper_bound, '2000': 0.0}), run_date, 'analytics', cache_dir)
+
+    # Read through a fresh cache (segments & index downloaded on first use)
+    history_df = ForecastArchive(bucket='analytics', cache_dir=str(tmp_path / 'reader_cache')).sku_history(1000, '2026-09', '2026-10')
+
+    assert history_df['run_date'].astype(str).tolist() == ['2026-09-29', '2026-09-30', '2026-10-01', '2026-10-02']
+    assert history_df['upper_bound'].tolist() == [1.0, 2.0, 3.0, 4.0]
+    assert (history_df['sku'] == '1000').all()
+
+
+def test_cold_sku_lookup_only_fetches_the_batches_of_the_sku(local_s3, tmp_path, monkeypatch):
+
+    monkeypatch.setattr(forecast_archive, 'COMPACTED_BATCH_ROWS', 4)
+
+    cache_dir = str(tmp_path / 'cache')
+    skus = [str(sku) for sku in range(1000, 1010)]
+
+    for day in range(1, 4):
+        archive_forecast_run(local_s3, _run({sku: float(day) for sku in skus}), f'2026-09-0{day}', 'analytics', cache_dir)
+    archive_forecast_run(local_s3, _run({sku: 0.0 for sku in skus}), '2026-10-01', 'analytics', cache_dir)
+
+    # 30 rows in batches of 4 - sku 1002 is rows [6, 9), across the 2nd & 3rd batches
+    requests = []
+    get_object = local_s3.get_object
+
+    def record(**kwargs):
+        requests.append((kwargs['Key'].split('/')[-1], kwargs.get('Range')))
+        return get_object(**kwargs)
+
+    monkeypatch.setattr(local_s3, 'get_object', record)
+
+    reader_cache = tmp_path / 'reader_cache'
+    history_df = ForecastArchive(bucket='analytics', cache_dir=str(reader_cache)).sku_history('1002', '2026-09', '2026-09')
+
+    assert history_df['upper_bound'].tolist() == [1.0, 2.0, 3.0]
+    assert (history_df['sku'] == '1002').all()
+
+    with open(os.path.join(cache_dir, ARCHIVE_PREFIX, 'month=2026-09', 'index.json'), 'r') as f:
+        batches = json.load(f)['batches']
+
+    assert requests == [('index.json', None), ('compacted.arrow', f'bytes={batches[1][0]}-{batches[2][0] + batches[2][1] - 1}')]
+    assert not os.path.exists(reader_cache / ARCHIVE_PREFIX / 'month=2026-09' / 'compacted.arrow')
+
+
+def test_archive_cache_is_pruned_by_age(tmp_path):
+
+    month_dir = tmp_path / ARCHIVE_PREFIX / 'month=2026-08'
+    os.makedirs(month_dir)
+
+    for name, age_days in [('compacted.arrow', 20), ('index.json', 1)]:
+        (month_dir / name).write_bytes(b'')
+        mtime = time.time() - age_days * 86400
+        os.utime(month_dir / name, (mtime, mtime))
+
+    prune_archive_cache(str(tmp_path), retention_days=14)
+
+    assert os.listdir(month_dir) == ['index.json']
@@ -0,0 +1,64 @@
+import pytest
+import pandas as pd
+
+from utils.forecast_diff import generate_forecast_changeset
+from utils.publish_utils import _report_unchanged
+
+
+def _report(rows):
+
+    report_df = pd.DataFrame(rows, columns=['sku','upper_bound','days_of_stock_on_hand','forecasted_stockout_date'])
+
+    for col in ['sku_name','product_type','product_category']:
+        report_df[col] = 'x'
+    for col in ['lower_bound','inventory_on_hand','forecast_90_days','forecast_120_days','forecast_150_days',
+                'production_next_90_days','production_next_120_days','production_next_150_days']:
+        report_df[col] = 0
+
+    return report_df
+
+
+def test_changeset_flags_new_dropped_and_changed_skus():
+
+    previous_df = _report([['1000', 1.0, 10, '2026-10-29'],
+                           ['2000', 2.0, 10, '2026-10-29'],
+                           ['3000', 3.0, 10, '2026-10-29']])
+    current_df = _report([['1000', 1.0, 10, '2026-10-30'],      # stockout date moves with the run date only - unchanged
+                          ['2000', 2.5, 10, '2026-10-30'],
+                          ['4000', 4.0, 10, '2026-10-30']])
+
+    changeset_df = generate_forecast_changeset(current_df, previous_df)
+
+    assert dict(zip(changeset_df['sku'], changeset_df['change_type'])) == {'2000': 'changed', '3000': 'dropped', '4000': 'new'}
+    assert changeset_df.set_index('sku').loc['2000', 'upper_bound_delta'] == 0.5
+    assert changeset_df.set_index('sku').loc['3000', 'upper_bound_delta'] == -3.0
+
+
+def test_changeset_matches_skus_across_csv_round_trips():
+
+    previous_df = _report([[1000, 1.0, 10, '2026-10-29']])
+    current_df = _report([['1000', 1.0, 10, '2026-10-29']])
+
+    assert len(generate_forecast_changeset(current_df, previous_df)) == 0
+
+
+def test_changeset_rejects_duplicate_skus():
+
+    current_df = _report([['1000', 1.0, 10, '2026-10-29'],
+                          ['1000', 2.0, 10, '2026-10-29']])
+
+    with pytest.raises(ValueError):
+        generate_forecast_changeset(current_df, _report([]))
+
+
+def test_report_unchanged_ignores_row_order_only():
+
+    published_df = _report([['1000', 1.0, 10, '2026-10-29'],
+                            [2000, 2.0, 10, '2026-10-29']])
+    report_df = published_df.iloc[::-1].astype({'sku': str})
+
+    assert _report_unchanged(report_df, published_df)
+
+    report_df = report_df.assign(inventory_on_hand=[0, 5])
+
+    assert not _report_unchanged(report_df, published_df)
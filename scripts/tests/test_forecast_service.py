@@ -0,0 +1,99 @@
+import asyncio
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+
+from shopify_demand_forecast_service import tail_event_file, replay_orders_csv, consume_events
+from utils.extract_utils import format_orders
+from utils.forecast_utils import generate_run_rates, build_inventory_details
+from utils.service_state import SkuForecastState
+
+
+def test_tail_waits_for_complete_lines(tmp_path):
+
+    path = tmp_path / 'events.jsonl'
+    path.write_text('')
+
+    async def run():
+
+        queue = asyncio.Queue()
+        task = asyncio.create_task(tail_event_file(str(path), queue, poll_interval=0.01, from_start=True))
+
+        # One event written in two flushes
+        with open(path, 'a') as f:
+            f.write('{"type": "order", "sku": ')
+            f.flush()
+            await asyncio.sleep(0.05)
+            f.write('"1000", "qty": 2}\n')
+            f.flush()
+
+        await asyncio.sleep(0.05)
+        task.cancel()
+
+        return [queue.get_nowait() for _ in range(queue.qsize())]
+
+    assert asyncio.run(run()) == [{'type': 'order', 'sku': '1000', 'qty': 2}]
+
+
+def _history(days: int = 60):
+
+    dates = pd.date_range(pd.to_datetime('today').normalize() - timedelta(days), periods=days).strftime('%Y-%m-%d')
+    rng = np.random.default_rng(7)
+
+    orders_df = pd.DataFrame([{'partition_date': date, 'order_date': date, 'sku': sku, 'sku_name': f'sku {sku}',
+                               'product_category': 'Creamer', 'product_type': 'Classic Creamer - Large Bag', 'qty_sold': int(rng.integers(1, 20))}
+                              for date in dates for sku in ['1000', '2000', '3000'] if rng.random() < 0.7])
+    inventory_df = pd.DataFrame([{'partition_date': date, 'sku': sku, 'inventory_on_hand': 500 - i}
+                                 for i, date in enumerate(dates) for sku in ['1000', '2000', '3000', '4000']])
+
+    return orders_df, inventory_df
+
+
+def test_replayed_orders_match_the_daily_run_rates(tmp_path):
+
+    orders_df, inventory_df = _history()
+
+    replay_path = tmp_path / 'orders.csv'
+    orders_df.to_csv(replay_path, index=False)
+
+    # Replay bootstraps from inventory only (as run_service does with --replay)
+    state = SkuForecastState(daily_qty_sold_df=pd.DataFrame(columns=['partition_date','order_date','sku','sku_name','product_category','product_type','qty_sold','week']),
+                             inventory_df=inventory_df)
+
+    async def replay():
+        queue = asyncio.Queue()
+        await asyncio.gather(replay_orders_csv(str(replay_path), queue), consume_events(queue, state))
+
+    asyncio.run(replay())
+    state.refresh_run_rates()
+
+    expected_df = build_inventory_details(product_run_rate_df=generate_run_rates(daily_qty_sold_df=format_orders(orders_df.copy()), inventory_df=inventory_df),
+                                          inventory_df=inventory_df)
+    expected_df['sku'] = expected_df['sku'].astype(str)
+
+    cols = ['lower_bound','upper_bound','last_7_actual','last_90_actual','inventory_on_hand','production_next_90_days','production_next_150_days']
+    snapshot_df = state.snapshot().set_index('sku').loc[expected_df['sku'], cols].reset_index()
+
+    pd.testing.assert_frame_equal(snapshot_df.astype({col: float for col in cols}), expected_df[['sku'] + cols].reset_index(drop=True).astype({col: float for col in cols}))
+
+
+def test_inventory_event_updates_production_needs():
+
+    orders_df, inventory_df = _history()
+    state = SkuForecastState(daily_qty_sold_df=format_orders(orders_df.copy()), inventory_df=inventory_df)
+
+    before = state.snapshot().set_index('sku').loc['1000']
+    state.apply_event({'type': 'inventory', 'sku': '1000', 'inventory_on_hand': 0})
+    after = state.snapshot().set_index('sku').loc['1000']
+
+    assert after['inventory_on_hand'] == 0
+    assert after['production_next_90_days'] == after['forecast_90_days'] == before['forecast_90_days']
+    assert after['production_next_90_days'] > before['production_next_90_days']
+    assert after['days_of_stock_on_hand'] == 0
+
+    # A sku without orders keeps its (zero) run rate & its inventory history
+    state.apply_event({'type': 'inventory', 'sku': '4000', 'inventory_on_hand': 7})
+    state.refresh_run_rates()
+
+    assert state.snapshot().set_index('sku').loc['4000', ['inventory_on_hand','production_next_90_days']].tolist() == [7, 0]
+    assert state.inventory['4000']['inventory_on_hand'].iloc[-1] == 7
@@ -0,0 +1,75 @@
+import json
+import threading
+import urllib.request
+from http.server import ThreadingHTTPServer
+import pytest
+import pandas as pd
+
+from utils.forecast_store import ForecastStore, compile_forecast_store, NUMERIC_COLS
+from forecast_lookup_api import ForecastLookupHandler
+
+
+@pytest.fixture
+def store(tmp_path):
+
+    valid_df = pd.DataFrame({'sku': [3000, 1000, 2000],
+                             'sku_name': ['Mango', 'Vanilla', 'Café Mocha'],
+                             'forecast': ['90 days'] * 3,
+                             'product_type': ['Syrup', 'Creamer', 'Syrup'],
+                             'product_category': ['Drinks'] * 3,
+                             'forecasted_stockout_date': ['2026-11-05', '2026-10-25', '2026-12-01']})
+
+    for col in NUMERIC_COLS:
+        if col != 'sku':
+            valid_df[col] = [1, 2, 3]
+    valid_df['upper_bound'] = [1.25, 0.5, 2.0]
+
+    path = tmp_path / 'store.bin'
+    path.write_bytes(compile_forecast_store(valid_df))
+
+    store = ForecastStore(str(path))
+    yield store
+    store.close()
+
+
+def test_store_round_trip(store):
+
+    record = store.get_sku('2000')
+
+    assert record['sku'] == 2000
+    assert record['sku_name'] == 'Café Mocha'
+    assert record['upper_bound'] == 2.0
+    assert record['forecasted_stockout_date'] == '2026-12-01'
+    assert store.get_sku(4000) is None
+
+
+def test_store_lookups(store):
+
+    assert [record['sku'] for record in store.get_skus([3000, 4000, 1000])] == [3000, 1000]
+    assert sorted(record['sku'] for record in store.get_product_type('Syrup')) == [2000, 3000]
+    assert store.get_product_type('Unknown') == []
+    assert [record['sku'] for record in store.get_stockout_range('2026-10-25', '2026-11-05')] == [1000, 3000]
+
+
+def test_lookup_api(store):
+
+    ForecastLookupHandler.store = store
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ForecastLookupHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def get(path):
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{server.server_port}{path}') as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    try:
+        assert get('/sku/1000')[1]['sku_name'] == 'Vanilla'
+        assert get('/sku/4000')[0] == 404
+        assert [record['sku'] for record in get('/skus?sku=1000&sku=3000')[1]] == [1000, 3000]
+        assert len(get('/product_type/Syrup')[1]) == 2
+        assert get('/stockout?start=2026-11-01')[0] == 400
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,62 @@
+import os
+import pandas as pd
+
+from utils.aws_utils import check_path_for_objects, delete_s3_prefix_data, get_object_from_s3, list_s3_keys, put_object_to_s3
+from utils.forecast_utils import build_inventory_report
+from utils.local_backend import run_local_query
+from utils.shard_utils import filter_sku_shard, merge_shard_slices
+
+
+def test_local_s3_objects(local_s3):
+
+    put_object_to_s3(s3_client=local_s3, body='a,b\n1,2\n', bucket='analytics', s3_key='reports/day=18/report.csv')
+    put_object_to_s3(s3_client=local_s3, body=b'\x00\x01', bucket='analytics', s3_key='reports/day=19/report.bin')
+
+    assert sorted(list_s3_keys(bucket='analytics', s3_prefix='reports/')) == ['reports/day=18/report.csv', 'reports/day=19/report.bin']
+    assert get_object_from_s3(bucket='analytics', s3_key='reports/day=19/report.bin') == b'\x00\x01'
+
+    delete_s3_prefix_data(bucket='analytics', s3_prefix='reports/day=18/')
+
+    assert not check_path_for_objects(bucket='analytics', s3_prefix='reports/day=18/')
+    assert list_s3_keys(bucket='analytics', s3_prefix='reports/') == ['reports/day=19/report.bin']
+
+
+def test_local_query_adds_partition_columns(tmp_path):
+
+    for partition_date, rows in [('2026-10-17', [['00123', 2]]), ('2026-10-18', [['00123', 3], ['456', 1]])]:
+        table_dir = tmp_path / 'athena' / 'prymal' / 'orders' / f'partition_date={partition_date}'
+        os.makedirs(table_dir)
+        pd.DataFrame(rows, columns=['sku', 'qty_sold']).to_csv(table_dir / 'orders.csv', index=False)
+
+    results_df = run_local_query('SELECT partition_date, sku, SUM(qty_sold) AS qty_sold FROM "prymal"."orders" '
+                                 'GROUP BY partition_date, sku ORDER BY partition_date, sku', database='prymal', root=str(tmp_path))
+
+    # Results are strings (like Athena) & text skus keep their leading zeros
+    assert results_df.values.tolist() == [['2026-10-17', '00123', '2'], ['2026-10-18', '00123', '3'], ['2026-10-18', '456', '1']]
+
+
+def test_inventory_report_order_is_independent_of_input_order():
+
+    inventory_details_df = pd.DataFrame({'sku': ['3000', '1000', '2000', '4000'],
+                                         'product_type': ['Classic Creamer - Large Bag'] * 3 + ['Sachet'],
+                                         'product_category': 'Creamer',
+                                         'upper_bound': [1.0, 2.0, 3.0, 1.0],
+                                         'inventory_on_hand': [10, 20, 30, 40]})
+
+    report_df = build_inventory_report(inventory_details_df)
+
+    pd.testing.assert_frame_equal(build_inventory_report(inventory_details_df.iloc[::-1]), report_df)
+    assert report_df['sku'].tolist() == ['1000', '2000', '3000', '4000']
+
+
+def test_inventory_report_of_merged_shards_matches_the_single_node_report():
+
+    inventory_details_df = pd.DataFrame({'sku': [str(sku) for sku in range(1000, 1030)],
+                                         'product_type': ['Classic Creamer - Bulk Bag'] * 25 + ['Classic Creamer - Large Bag'] * 5,
+                                         'product_category': 'Creamer',
+                                         'upper_bound': 1.0,
+                                         'inventory_on_hand': [(i * 7) % 30 for i in range(30)]})
+
+    shards = [filter_sku_shard(inventory_details_df, shard_index, 3) for shard_index in range(3)]
+
+    pd.testing.assert_frame_equal(build_inventory_report(merge_shard_slices(shards, 3)), build_inventory_report(inventory_details_df))
@@ -0,0 +1,71 @@
+import json
+import datetime
+import pandas as pd
+
+from utils.memo_store import SkuMemoStore
+
+
+def _output():
+    return pd.DataFrame({'sku': ['1000'],
+                         'lower_bound': [0.1 + 0.2],
+                         'upper_bound': [1 / 3],
+                         'last_7_actual': [12]})
+
+
+def test_hit_matches_recomputed_output(tmp_path):
+
+    path = str(tmp_path / 'memo.json')
+
+    store = SkuMemoStore(path, version='2')
+    store.put('1000', 'abc', _output())
+    store.save()
+
+    reloaded = SkuMemoStore(path, version='2')
+
+    pd.testing.assert_frame_equal(reloaded.get('1000', 'abc'), _output())
+    assert reloaded.hits == 1
+
+
+def test_fingerprint_or_version_change_is_a_miss(tmp_path):
+
+    path = str(tmp_path / 'memo.json')
+
+    store = SkuMemoStore(path, version='2')
+    store.put('1000', 'abc', _output())
+    store.save()
+
+    assert SkuMemoStore(path, version='2').get('1000', 'changed') is None
+    assert SkuMemoStore(path, version='3').get('1000', 'abc') is None
+    assert SkuMemoStore(path, version='2', force_recompute=True).get('1000', 'abc') is None
+
+
+def test_expired_entries_are_evicted(tmp_path):
+
+    path = str(tmp_path / 'memo.json')
+
+    store = SkuMemoStore(path, version='2', ttl_days=7)
+    store.put('1000', 'abc', _output())
+    store.put('2000', 'def', _output())
+    store.entries['1000']['created_at'] = (datetime.datetime.now() - datetime.timedelta(days=8)).isoformat()
+    store.save()
+
+    reloaded = SkuMemoStore(path, version='2', ttl_days=7)
+
+    assert list(reloaded.entries) == ['2000']
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+
+    path = str(tmp_path / 'memo.json')
+
+    store = SkuMemoStore(path, version='2', max_entries=2)
+    for i, sku in enumerate(['1000', '2000', '3000']):
+        store.put(sku, 'abc', _output())
+        store.entries[sku]['last_used_at'] = f'2026-01-0{i + 1}T00:00:00'
+
+    # Using the oldest entry keeps it in the store
+    store.get('1000', 'abc')
+    store.save()
+
+    with open(path, 'r') as f:
+        assert sorted(json.load(f)['entries']) == ['1000', '3000']
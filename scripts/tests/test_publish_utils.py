@@ -0,0 +1,90 @@
+import datetime
+import pytest
+import pandas as pd
+
+from utils import publish_utils
+from utils.aws_utils import get_report_s3_key, list_s3_keys
+from utils.publish_utils import publish_forecast, validate_forecast
+
+
+CURRENT_DATE = datetime.date(2026, 10, 19)
+
+REPORT_DF = pd.DataFrame({'sku': [1000, 2000],
+                          'sku_name': ['Vanilla', 'Mango'],
+                          'forecast': ['90 days', '90 days'],
+                          'lower_bound': [0.5, 1.0],
+                          'upper_bound': [1.5, 2.0],
+                          'last_7_actual': [7, 14],
+                          'last_90_actual': [90, 180],
+                          'product_type': ['Classic Creamer - Large Bag'] * 2,
+                          'product_category': ['Creamer'] * 2,
+                          'inventory_on_hand': [30, 40],
+                          'forecast_90_days': [135, 180],
+                          'production_next_90_days': [105, 140],
+                          'forecast_120_days': [180, 240],
+                          'production_next_120_days': [150, 200],
+                          'forecast_150_days': [225, 300],
+                          'production_next_150_days': [195, 260],
+                          'days_of_stock_on_hand': [20, 20],
+                          'forecasted_stockout_date': ['2026-11-08', '2026-11-08']})
+
+
+def _publish(local_s3, cache_dir, **kwargs):
+
+    valid_df, _ = validate_forecast(REPORT_DF)
+
+    publish_forecast(local_s3, REPORT_DF, valid_df, rollup_df=pd.DataFrame({'level': ['total'], 'upper_bound': [3.5]}),
+                     accuracy_df=pd.DataFrame(), current_date=CURRENT_DATE, bucket='analytics', cache_dir=str(cache_dir), **kwargs)
+
+
+def _replaced_keys(monkeypatch):
+
+    replaced = []
+    replace_s3_object = publish_utils._replace_s3_object
+
+    def record(s3_client, bucket, s3_key, **kwargs):
+        replaced.append(s3_key)
+        return replace_s3_object(s3_client, bucket, s3_key, **kwargs)
+
+    monkeypatch.setattr(publish_utils, '_replace_s3_object', record)
+
+    return replaced
+
+
+def test_report_is_written_after_every_artifact(local_s3, tmp_path, monkeypatch):
+
+    replaced = _replaced_keys(monkeypatch)
+
+    _publish(local_s3, tmp_path / 'cache', replenishment_df=pd.DataFrame({'sku': ['1000'], 'order_qty': [100]}))
+
+    assert replaced[-1] == get_report_s3_key('shopify_demand_forecasting', CURRENT_DATE)
+    assert sorted(key.split('/')[1] for key in list_s3_keys(bucket='analytics', s3_prefix='reports/')) == ['shopify_demand_forecasting',
+                                                                                                          'shopify_demand_forecasting_changes',
+                                                                                                          'shopify_demand_forecasting_replenishment',
+                                                                                                          'shopify_demand_forecasting_rollups',
+                                                                                                          'shopify_demand_forecasting_store']
+
+
+def test_failed_upload_does_not_publish_the_report(local_s3, tmp_path, monkeypatch):
+
+    def fail_archive(**kwargs):
+        raise RuntimeError('archive unavailable')
+
+    monkeypatch.setattr(publish_utils, 'archive_forecast_run', fail_archive)
+
+    with pytest.raises(RuntimeError, match='archive unavailable'):
+        _publish(local_s3, tmp_path / 'cache')
+
+    assert list_s3_keys(bucket='analytics', s3_prefix=get_report_s3_key('shopify_demand_forecasting', CURRENT_DATE)) == []
+
+
+def test_unchanged_rerun_skips_republishing_the_report(local_s3, tmp_path, monkeypatch):
+
+    _publish(local_s3, tmp_path / 'cache')
+
+    replaced = _replaced_keys(monkeypatch)
+
+    # Rerun on a fresh runner (published report read back from s3)
+    _publish(local_s3, tmp_path / 'rerun_cache')
+
+    assert get_report_s3_key('shopify_demand_forecasting', CURRENT_DATE) not in replaced
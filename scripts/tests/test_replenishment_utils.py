@@ -0,0 +1,109 @@
+import pytest
+import pandas as pd
+from datetime import timedelta
+
+from utils.replenishment_utils import plan_replenishment, read_replenishment_params
+
+
+def _inventory_details(inventory_on_hand: dict, upper_bound: float):
+    return pd.DataFrame({'sku': list(inventory_on_hand),
+                         'sku_name': 'x',
+                         'product_type': 'Syrup',
+                         'product_category': 'Drinks',
+                         'upper_bound': upper_bound,
+                         'inventory_on_hand': list(inventory_on_hand.values())})
+
+
+def _params(tmp_path, params: dict, daily_capacity: float = None):
+
+    params_path = tmp_path / 'params.csv'
+    pd.DataFrame([params]).to_csv(params_path, index=False)
+
+    capacity_path = None
+    if daily_capacity:
+        capacity_path = tmp_path / 'capacity.csv'
+        pd.DataFrame({'production_line': ['default'], 'daily_capacity': [daily_capacity]}).to_csv(capacity_path, index=False)
+
+    return read_replenishment_params(str(params_path), str(capacity_path) if capacity_path else None)
+
+
+def _days_from_today(days: int):
+    return (pd.to_datetime('today').normalize() + timedelta(days=days)).strftime('%Y-%m-%d')
+
+
+def test_orders_are_rounded_up_to_the_pack_size_and_moq(tmp_path):
+
+    params_df, capacity_df = _params(tmp_path, {'lead_time_days': 5, 'safety_stock_days': 2, 'coverage_days': 30, 'moq': 0, 'pack_size': 12})
+    replenishment_df = plan_replenishment(_inventory_details({'1000': 0}, 10.0), params_df, capacity_df).iloc[0]
+
+    # Order up to (5 + 30 days) x 10 + 20 safety stock = 370 -> 372 (31 packs)
+    assert replenishment_df['reorder_point'] == 70
+    assert replenishment_df['order_qty'] == 372
+
+    params_df, capacity_df = _params(tmp_path, {'lead_time_days': 5, 'safety_stock_days': 2, 'coverage_days': 30, 'moq': 500, 'pack_size': 12})
+    replenishment_df = plan_replenishment(_inventory_details({'1000': 0}, 10.0), params_df, capacity_df).iloc[0]
+
+    # MOQ of 500 -> 504 (42 packs)
+    assert replenishment_df['order_qty'] == 504
+
+
+def test_orders_are_placed_at_the_reorder_point_and_arrive_after_the_lead_time(tmp_path):
+
+    params_df, capacity_df = _params(tmp_path, {'lead_time_days': 5, 'safety_stock_days': 2, 'coverage_days': 30})
+    replenishment_df = plan_replenishment(_inventory_details({'1000': 200, '2000': 50}, 10.0), params_df, capacity_df).set_index('sku')
+
+    # sku 1000 reaches the reorder point (70) in 13 days, sku 2000 is already below it
+    assert str(replenishment_df.loc['1000', 'order_date']) == _days_from_today(13)
+    assert str(replenishment_df.loc['1000', 'planned_arrival_date']) == _days_from_today(18)
+    assert replenishment_df.loc['1000', 'order_qty'] == 300
+    assert bool(replenishment_df.loc['2000', 'reorder_now'])
+    assert replenishment_df['capacity_delay_days'].tolist() == [0, 0]
+
+
+def test_line_capacity_is_used_from_each_order_date(tmp_path):
+
+    params_df, capacity_df = _params(tmp_path, {'lead_time_days': 10, 'coverage_days': 30}, daily_capacity=250)
+    replenishment_df = plan_replenishment(_inventory_details({'1000': 0, '2000': 3000}, 100.0), params_df, capacity_df).set_index('sku')
+
+    # sku 1000: 4000 units ordered today take 16 days (needed in 10)
+    # sku 2000: 3000 units ordered in 20 days take 12 days (needed in 10) - the idle line before day 20 does not help
+    assert replenishment_df['order_qty'].tolist() == [4000, 3000]
+    assert replenishment_df['capacity_delay_days'].tolist() == [6, 2]
+    assert str(replenishment_df.loc['2000', 'planned_arrival_date']) == _days_from_today(32)
+
+
+def test_sku_rows_only_override_the_parameters_they_set(tmp_path):
+
+    params_path = tmp_path / 'params.csv'
+    pd.DataFrame({'product_type': ['Syrup', None, None],
+                  'sku': [None, '1000', None],
+                  'lead_time_days': [10, None, 3],
+                  'safety_stock_days': [2, None, None],
+                  'moq': [None, 500, None],
+                  'production_line': ['syrup_line', None, None]}).to_csv(params_path, index=False)
+
+    capacity_path = tmp_path / 'capacity.csv'
+    pd.DataFrame({'production_line': ['syrup_line'], 'daily_capacity': [1000]}).to_csv(capacity_path, index=False)
+
+    params_df, capacity_df = read_replenishment_params(str(params_path), str(capacity_path))
+
+    inventory_details_df = _inventory_details({'1000': 0, '2000': 0}, 10.0)
+    inventory_details_df.loc[1, 'product_type'] = 'Creamer'
+
+    replenishment_df = plan_replenishment(inventory_details_df, params_df, capacity_df).set_index('sku')
+
+    # sku 1000: moq from its sku row, everything else from its product_type row
+    assert replenishment_df.loc['1000', ['lead_time_days','safety_stock_days','moq','production_line','reorder_point','order_qty']].tolist() == [10, 2, 500, 'syrup_line', 120, 1020]
+
+    # sku 2000: unscoped lead time, defaults for the rest
+    assert replenishment_df.loc['2000', ['lead_time_days','safety_stock_days','moq','production_line']].tolist() == [3, 0, 0, 'default']
+
+
+def test_invalid_parameters_are_rejected(tmp_path):
+
+    params_path = tmp_path / 'params.csv'
+
+    for params in [{'sku': ['1000', None], 'pack_size': [0, None]}, {'sku': ['1000', None], 'moq': [None, -1]}]:
+        pd.DataFrame(params).to_csv(params_path, index=False)
+        with pytest.raises(ValueError):
+            read_replenishment_params(str(params_path))
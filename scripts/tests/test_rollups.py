@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+from merge_forecast_shards import merge_shards
+from utils.forecast_utils import ROLLUP_LEVELS, ROLLUP_MEASURES, generate_hierarchical_rollups
+from utils.shard_utils import filter_sku_shard, write_shard_slice
+
+
+def _inventory_details():
+
+    rng = np.random.default_rng(3)
+    n_skus = 40
+
+    inventory_details_df = pd.DataFrame({'sku': [str(1000 + i) for i in range(n_skus)],
+                                         'sku_name': [f'sku {i}' for i in range(n_skus)],
+                                         'product_category': np.where(np.arange(n_skus) < 25, 'Creamer', 'Coffee Beans'),
+                                         'product_type': [['Classic Creamer - Large Bag', 'Creamer Sachet', 'Whole Bean', None][i % 4] for i in range(n_skus)]})
+
+    for col in ROLLUP_MEASURES:
+        inventory_details_df[col] = rng.integers(0, 500, n_skus).astype(float) if col.endswith('_bound') else rng.integers(0, 500, n_skus)
+
+    inventory_details_df['lower_bound'] = inventory_details_df['lower_bound'] / 8
+
+    return inventory_details_df
+
+
+def test_each_level_sums_to_the_level_below():
+
+    rollup_df = generate_hierarchical_rollups(_inventory_details())
+    levels = {level: rollup_df.loc[rollup_df['rollup_level']==level] for level in ROLLUP_LEVELS}
+
+    assert len(levels['sku']) == 40
+    assert levels['sku']['product_type'].isna().sum() == 0
+
+    for level, below in [('product_type', 'sku'), ('product_category', 'product_type'), ('total', 'product_category')]:
+
+        group_cols = ROLLUP_LEVELS[level]
+        measure_cols = ROLLUP_MEASURES + ['sku_count']
+
+        if len(group_cols) > 0:
+            expected_df = levels[below].groupby(group_cols)[measure_cols].sum()
+            level_df = levels[level].set_index(group_cols)[measure_cols]
+        else:
+            expected_df = levels[below][measure_cols].sum().to_frame().T
+            level_df = levels[level][measure_cols].reset_index(drop=True)
+
+        pd.testing.assert_frame_equal(level_df.astype(float), expected_df.astype(float), check_names=False)
+
+
+def test_merged_rollups_match_the_single_node_rollups(tmp_path):
+
+    inventory_details_df = _inventory_details()
+
+    for shard_index in range(3):
+        write_shard_slice(None, filter_sku_shard(inventory_details_df, shard_index, 3), 'inventory_details', '2026-10-19', shard_index, 3, local_dir=str(tmp_path))
+        write_shard_slice(None, pd.DataFrame(columns=['sku']), 'accuracy', '2026-10-19', shard_index, 3, local_dir=str(tmp_path))
+
+    _, merged_rollup_df, _, _ = merge_shards('2026-10-19', 3, local_dir=str(tmp_path))
+    rollup_df = generate_hierarchical_rollups(inventory_details_df)
+
+    assert list(merged_rollup_df.columns) == list(rollup_df.columns)
+    pd.testing.assert_frame_equal(merged_rollup_df, rollup_df)
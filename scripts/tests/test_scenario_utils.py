@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+from utils.scenario_utils import evaluate_scenarios, read_scenarios, resolve_scoped_params
+
+
+def test_sku_rows_override_product_type_rows_override_unscoped_rows():
+
+    df = pd.DataFrame({'sku': ['1000', '2000', '3000'], 'product_type': ['Syrup', 'Syrup', 'Creamer']}, index=[5, 6, 7])
+
+    params_table = pd.DataFrame({'sku': ['1000', np.nan, np.nan],
+                                 'product_type': [np.nan, 'Syrup', np.nan],
+                                 'demand_multiplier': [2.0, 1.5, 1.1],
+                                 'lead_time_days': [np.nan, 14.0, np.nan]})
+
+    params_df = resolve_scoped_params(df, params_table, {'demand_multiplier': 1.0, 'lead_time_days': 7.0})
+
+    assert params_df.index.tolist() == [5, 6, 7]
+    assert params_df['demand_multiplier'].tolist() == [2.0, 1.5, 1.1]
+    assert params_df['lead_time_days'].tolist() == [14.0, 14.0, 7.0]
+
+
+def test_partially_scoped_rows_fall_through_to_broader_scopes(tmp_path):
+
+    scenarios_path = tmp_path / 'scenarios.csv'
+    pd.DataFrame({'scenario': ['promo', 'promo', 'promo', 'base'],
+                  'product_type': [np.nan, 'Syrup', np.nan, np.nan],
+                  'sku': [np.nan, np.nan, '1000', np.nan],
+                  'demand_multiplier': [1.2, np.nan, np.nan, np.nan],
+                  'inventory_adjustment_days': [np.nan, 2, np.nan, np.nan],
+                  'inventory_adjustment_units': [np.nan, np.nan, 5, np.nan],
+                  'horizons': ['90', np.nan, np.nan, np.nan]}).to_csv(scenarios_path, index=False)
+
+    scenarios_df, horizons = read_scenarios(str(scenarios_path))
+
+    inventory_details_df = pd.DataFrame({'sku': [1000, 2000],
+                                         'sku_name': 'x',
+                                         'forecast': '90 days',
+                                         'lower_bound': [5.0, 5.0],
+                                         'upper_bound': [10.0, 10.0],
+                                         'last_7_actual': 70,
+                                         'last_90_actual': 900,
+                                         'partition_date': '2026-10-18',
+                                         'product_type': ['Syrup', 'Creamer'],
+                                         'product_category': 'Drinks',
+                                         'inventory_on_hand': [100, 100]})
+
+    scenario_df = evaluate_scenarios(inventory_details_df, scenarios_df, horizons).set_index(['scenario','sku'])
+
+    # sku 1000: unscoped multiplier (1.2) + product_type adjustment days (2 x 12) + sku adjustment units (5)
+    assert scenario_df.loc[('promo', '1000'), 'upper_bound'] == 12.0
+    assert scenario_df.loc[('promo', '1000'), 'inventory_on_hand'] == 129
+    assert scenario_df.loc[('promo', '2000'), ['upper_bound','inventory_on_hand']].tolist() == [12.0, 100]
+    assert scenario_df.loc[('base', '2000'), ['upper_bound','inventory_on_hand','production_next_90_days']].tolist() == [10.0, 100, 800]
@@ -0,0 +1,73 @@
+import os
+import pytest
+import pandas as pd
+
+from utils.local_backend import run_local_query
+from utils.shard_utils import get_sku_shard, sku_shard_filter_sql, filter_sku_shard, write_shard_slice, read_shard_slices, merge_shard_slices
+
+
+SKUS = pd.Series([str(sku) for sku in range(1000, 1200)] + ['00123', 'ABC-1'])
+
+
+def test_every_sku_is_in_exactly_one_shard():
+
+    df = pd.DataFrame({'sku': SKUS})
+    shards = [filter_sku_shard(df, shard_index, 3) for shard_index in range(3)]
+
+    assert sorted(pd.concat(shards)['sku']) == sorted(SKUS)
+    assert all(len(shard) > 0 for shard in shards)
+    assert filter_sku_shard(df, 0, 1) is df
+
+
+def test_query_filter_matches_the_python_shard(tmp_path):
+
+    table_dir = tmp_path / 'athena' / 'prymal' / 'orders'
+    os.makedirs(table_dir)
+    pd.DataFrame({'sku': SKUS}).to_csv(table_dir / 'orders.csv', index=False)
+
+    for shard_index in range(3):
+        query = f'SELECT sku FROM "prymal"."orders" WHERE 1 = 1 {sku_shard_filter_sql("sku", shard_index, 3)}'
+        query_skus = run_local_query(query, database='prymal', root=str(tmp_path))['sku']
+
+        assert sorted(query_skus) == sorted(SKUS[get_sku_shard(SKUS, 3) == shard_index])
+
+    assert sku_shard_filter_sql('sku', 0, 1) == ''
+
+
+def _slices(shard_count):
+    df = pd.DataFrame({'sku': SKUS, 'upper_bound': range(len(SKUS))})
+    return [filter_sku_shard(df, shard_index, shard_count).iloc[::-1] for shard_index in range(shard_count)]
+
+
+def test_merge_is_sorted_by_sku():
+
+    merged_df = merge_shard_slices(_slices(3), 3)
+
+    assert merged_df['sku'].tolist() == sorted(SKUS)
+
+
+def test_merge_rejects_misplaced_and_duplicate_skus():
+
+    slices = _slices(3)
+
+    with pytest.raises(ValueError, match='belong to another shard'):
+        merge_shard_slices([slices[1], slices[0], slices[2]], 3)
+
+    with pytest.raises(ValueError, match='staged more than once'):
+        merge_shard_slices([pd.concat([slices[0], slices[0].head(1)]), slices[1], slices[2]], 3)
+
+
+def test_merge_requires_every_shard(tmp_path):
+
+    slices = _slices(3)
+
+    for shard_index in [0, 2]:
+        write_shard_slice(None, slices[shard_index], 'inventory_details', '2026-10-19', shard_index, 3, local_dir=str(tmp_path))
+
+    with pytest.raises(ValueError, match=r'Shards \[1\] of 3'):
+        read_shard_slices('inventory_details', '2026-10-19', 3, local_dir=str(tmp_path))
+
+    write_shard_slice(None, slices[1], 'inventory_details', '2026-10-19', 1, 3, local_dir=str(tmp_path))
+    merged_df = merge_shard_slices(read_shard_slices('inventory_details', '2026-10-19', 3, local_dir=str(tmp_path)), 3)
+
+    assert merged_df['sku'].tolist() == sorted(SKUS)
@@ -0,0 +1,38 @@
+import pandas as pd
+
+from utils.forecast_utils import build_weekly_rollup, get_week_id
+
+
+def test_week_ids_run_monday_to_sunday_across_the_new_year():
+
+    week_ids = get_week_id(pd.Series(['2025-12-28', '2025-12-29', '2026-01-01', '2026-01-04', '2026-01-05']))
+
+    new_year_week = week_ids[1]
+
+    # Sunday | Monday ... Sunday (one week spanning the new year) | Monday
+    assert week_ids.tolist() == [new_year_week - 1, new_year_week, new_year_week, new_year_week, new_year_week + 1]
+    assert get_week_id('2026-01-01') == new_year_week
+
+
+def test_weekly_rollup_splits_on_week_boundaries():
+
+    orders_df = pd.DataFrame({'order_date': ['2025-12-28', '2025-12-29', '2026-01-01', '2026-01-01', '2026-01-04'],
+                              'sku': ['1000', '1000', '1000', '2000', '1000'],
+                              'qty_sold': [5, 1, 2, 7, 3]})
+    orders_df['week'] = get_week_id(orders_df['order_date'])
+
+    inventory_df = pd.DataFrame({'partition_date': ['2025-12-28', '2025-12-29', '2025-12-30', '2026-01-04'],
+                                 'sku': '1000',
+                                 'inventory_on_hand': [50, 10, 20, 60]})
+
+    weekly_df = build_weekly_rollup(orders_df, inventory_df)
+
+    new_year_week = get_week_id('2026-01-01')
+
+    assert weekly_df.loc[('1000', new_year_week - 1), ['qty_sold','order_days','inventory_on_hand','days_in_stock']].tolist() == [5, 1, 50, 1]
+    assert weekly_df.loc[('1000', new_year_week), ['qty_sold','order_days','inventory_on_hand','days_in_stock']].tolist() == [6, 3, 20, 3]
+
+    # Weeks with orders but no inventory rows have 0 inventory on hand
+    assert weekly_df.loc[('2000', new_year_week), ['qty_sold','inventory_on_hand','days_in_stock']].tolist() == [7, 0, 0]
+
+    assert weekly_df['latest_order_week'].tolist() == [False, True, True]
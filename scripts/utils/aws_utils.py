@@ -0,0 +1,448 @@
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError, ParamValidationError, WaiterError
+import pandas as pd
+import numpy as np
+import datetime
+import os
+import io
+import threading
+from loguru import logger
+
+from utils.local_backend import LocalS3Client, run_local_query
+
+# -------------------------------------
+# Variables
+# -------------------------------------
+
+REGION = 'us-east-1'
+
+AWS_ACCESS_KEY_ID=os.environ.get('AWS_ACCESS_KEY')
+AWS_SECRET_ACCESS_KEY=os.environ.get('AWS_ACCESS_SECRET')
+
+# Storage / query backend: 's3' (S3 & Athena) or 'local' (directories for buckets & sqlite over csv / parquet tables, for offline runs & benchmarks)
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 's3').lower()
+LOCAL_STORAGE_DIR = os.environ.get('LOCAL_STORAGE_DIR', '.local_storage')
+
+if STORAGE_BACKEND not in ['s3', 'local']:
+    raise ValueError(f"STORAGE_BACKEND must be 's3' or 'local' (got {STORAGE_BACKEND})")
+
+# Connection pool size of the shared s3 client (concurrent uploads of the publish step)
+S3_MAX_POOL_CONNECTIONS = int(os.environ.get('S3_MAX_POOL_CONNECTIONS', 16))
+
+# Shared (thread safe) s3 client - created on first use
+_s3_client = None
+_s3_client_lock = threading.Lock()
+
+# -------------------------------------
+# Functions
+# -------------------------------------
+
+
+# Create S3 Client of the Storage Backend
+# -----------
+
+def get_s3_client():
+
+  global _s3_client
+
+  # One pooled client is shared by every helper & thread (instead of a new client & connection per call)
+  with _s3_client_lock:
+
+      if _s3_client is None:
+
+          if STORAGE_BACKEND == 'local':
+              _s3_client = LocalS3Client(root=LOCAL_STORAGE_DIR)
+          else:
+              _s3_client = boto3.client('s3', 
+                                        region_name = REGION,
+                                        aws_access_key_id=AWS_ACCESS_KEY_ID,
+                                        aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+                                        config=Config(max_pool_connections=S3_MAX_POOL_CONNECTIONS))
+
+  return _s3_client
+
+
+# FUNCTION TO EXECUTE ATHENA QUERY AND RETURN RESULTS
+# ----------
+
+def run_athena_query(query:str, database: str, region:str):
+
+    # Local backend - run the query against local tables
+    if STORAGE_BACKEND == 'local':
+        return run_local_query(query=query, database=database, root=LOCAL_STORAGE_DIR)
+        
+    # Initialize Athena client
+    athena_client = boto3.client('athena', 
+                                 region_name=region,
+                                 aws_access_key_id=AWS_ACCESS_KEY_ID,
+                                 aws_secret_access_key=AWS_SECRET_ACCESS_KEY)
+
+    # Execute the query
+    try:
+        response = athena_client.start_query_execution(
+            QueryString=query,
+            QueryExecutionContext={
+                'Database': database
+            },
+            ResultConfiguration={
+                'OutputLocation': 's3://prymal-ops/athena_query_results/'  # Specify your S3 bucket for query results
+            }
+        )
+
+        query_execution_id = response['QueryExecutionId']
+
+        # Wait for the query to complete
+        state = 'RUNNING'
+
+        logger.info("Running query...")
+
+
+        while (state in ['RUNNING', 'QUEUED']):
+            response = athena_client.get_query_execution(QueryExecutionId = query_execution_id)
+            if 'QueryExecution' in response and 'Status' in response['QueryExecution'] and 'State' in response['QueryExecution']['Status']:
+                # Get currentstate
+                state = response['QueryExecution']['Status']['State']
+
+                if state == 'FAILED':
+                    logger.error('Query Failed!')
+                elif state == 'SUCCEEDED':
+                    logger.info('Query Succeeded!')
+            
+
+        # OBTAIN DATA
+
+        # --------------
+
+
+
+        query_results = athena_client.get_query_results(QueryExecutionId=query_execution_id,
+                                                MaxResults= 1000)
+        
+
+
+        # Extract qury result column names into a list  
+
+        cols = query_results['ResultSet']['ResultSetMetadata']['ColumnInfo']
+        col_names = [col['Name'] for col in cols]
+
+
+
+        # Extract query result data rows
+        data_rows = query_results['ResultSet']['Rows'][1:]
+
+
+
+        # Convert data rows into a list of lists
+        query_results_data = [[r['VarCharValue'] if 'VarCharValue' in r else np.nan for r in row['Data']] for row in data_rows]
+
+
+
+        # Paginate Results if necessary
+        while 'NextToken' in query_results:
+                query_results = athena_client.get_query_results(QueryExecutionId=query_execution_id,
+                                                NextToken=query_results['NextToken'],
+                                                MaxResults= 1000)
+
+
+
+                # Extract quuery result data rows
+                data_rows = query_results['ResultSet']['Rows'][1:]
+
+
+                # Convert data rows into a list of lists
+                query_results_data.extend([[r['VarCharValue'] if 'VarCharValue' in r else np.nan for r in row['Data']] for row in data_rows])
+
+
+
+        results_df = pd.DataFrame(query_results_data, columns = col_names)
+        
+        return results_df
+
+
+    except ParamValidationError as e:
+        logger.error(f"Validation Error (potential SQL query issue): {e}")
+        # Handle invalid parameters in the request, such as an invalid SQL query
+
+    except WaiterError as e:
+        logger.error(f"Waiter Error: {e}")
+        # Handle errors related to waiting for query execution
+
+    except ClientError as e:
+        error_code = e.response['Error']['Code']
+        error_message = e.response['Error']['Message']
+        
+        if error_code == 'InvalidRequestException':
+            logger.error(f"Invalid Request Exception: {error_message}")
+            # Handle issues with the Athena request, such as invalid SQL syntax
+            
+        elif error_code == 'ResourceNotFoundException':
+            logger.error(f"Resource Not Found Exception: {error_message}")
+            # Handle cases where the database or query execution does not exist
+            
+        elif error_code == 'AccessDeniedException':
+            logger.error(f"Access Denied Exception: {error_message}")
+            # Handle cases where the IAM role does not have sufficient permissions
+            
+        else:
+            logger.error(f"Athena Error: {error_code} - {error_message}")
+            # Handle other Athena-related errors
+
+    except Exception as e:
+        logger.error(f"Other Exception: {str(e)}")
+        # Handle any other unexpected exceptions
+
+
+
+# Check S3 Path for Existing Data
+# -----------
+
+def check_path_for_objects(bucket: str, s3_prefix:str):
+
+  logger.info(f'Checking for existing data in {bucket}/{s3_prefix}')
+
+  # Create s3 client
+  s3_client = get_s3_client()
+
+  # List objects in s3_prefix
+  result = s3_client.list_objects_v2(Bucket=bucket, Prefix=s3_prefix )
+
+  # Instantiate objects_exist
+  objects_exist=False
+
+  # Set objects_exist to true if objects are in prefix
+  if 'Contents' in result:
+      objects_exist=True
+
+      logger.info('Data already exists!')
+
+  return objects_exist
+
+# Delete Existing Data from S3 Path
+# -----------
+
+def delete_s3_prefix_data(bucket:str, s3_prefix:str):
+
+
+  logger.info(f'Deleting existing data from {bucket}/{s3_prefix}')
+
+  # Create s3 client
+  s3_client = get_s3_client()
+
+  # Use list_objects_v2 to list all objects within the specified prefix
+  objects_to_delete = s3_client.list_objects_v2(Bucket=bucket, Prefix=s3_prefix)
+
+  # Extract the list of object keys
+  keys_to_delete = [obj['Key'] for obj in objects_to_delete.get('Contents', [])]
+
+  # Check if there are objects to delete
+  if keys_to_delete:
+      # Delete the objects using 'delete_objects'
+      response = s3_client.delete_objects(
+          Bucket=bucket,
+          Delete={'Objects': [{'Key': key} for key in keys_to_delete]}
+      )
+      logger.info(f"Deleted {len(keys_to_delete)} objects")
+  else:
+      logger.info("No objects to delete")
+
+
+
+# List Object Keys in S3 Prefix
+# -----------
+
+def list_s3_keys(bucket: str, s3_prefix: str):
+
+  # Create s3 client
+  s3_client = get_s3_client()
+
+  keys = []
+
+  # Paginate through all objects in s3_prefix
+  paginator = s3_client.get_paginator('list_objects_v2')
+
+  for page in paginator.paginate(Bucket=bucket, Prefix=s3_prefix):
+      keys.extend([obj['Key'] for obj in page.get('Contents', [])])
+
+  return keys
+
+
+# Read Object (bytes) from S3
+# -----------
+
+def get_object_from_s3(bucket: str, s3_key: str):
+
+  # Create s3 client
+  s3_client = get_s3_client()
+
+  response = s3_client.get_object(Bucket=bucket, Key=s3_key)
+
+  return response['Body'].read()
+
+
+# Read a Byte Range of an Object from S3
+# -----------
+
+def get_object_range_from_s3(bucket: str, s3_key: str, offset: int, length: int):
+
+  # Create s3 client
+  s3_client = get_s3_client()
+
+  response = s3_client.get_object(Bucket=bucket, Key=s3_key, Range=f'bytes={offset}-{offset + length - 1}')
+
+  return response['Body'].read()
+
+
+# Write DataFrame to S3 as CSV
+# -----------
+
+def put_df_to_s3(s3_client, df: pd.DataFrame, bucket: str, s3_key: str):
+
+  with io.StringIO() as csv_buffer:
+      df.to_csv(csv_buffer, index=False)
+
+      return put_object_to_s3(s3_client=s3_client, body=csv_buffer.getvalue(), bucket=bucket, s3_key=s3_key)
+
+
+# Write Object (str / bytes) to S3
+# -----------
+
+def put_object_to_s3(s3_client, body, bucket: str, s3_key: str):
+
+  logger.info(f'Writing to {s3_key}')
+
+  response = s3_client.put_object(
+      Bucket=bucket, 
+      Key=s3_key, 
+      Body=body
+  )
+
+  status = response['ResponseMetadata']['HTTPStatusCode']
+
+  if status == 200:
+      logger.info(f"Successful S3 put_object response for PUT ({s3_key}). Status - {status}")
+  else:
+      logger.error(f"Unsuccessful S3 put_object response for PUT ({s3_key}. Status - {status}")
+
+  return status
+
+
+# Build S3 Key of a Daily Report Partition
+# -----------
+
+def get_report_s3_key(report_name: str, report_date, extension: str = 'csv'):
+
+  partition_y = pd.to_datetime(report_date).strftime('%Y') 
+  partition_m = pd.to_datetime(report_date).strftime('%m') 
+  partition_d = pd.to_datetime(report_date).strftime('%d') 
+
+  return f"reports/{report_name}/year={partition_y}/month={partition_m}/day={partition_d}/{report_name}_{partition_y}{partition_m}{partition_d}.{extension}"
+
+
+# Read Report CSV (from local cache if present, else from S3)
+# -----------
+
+def read_report_csv(bucket: str, s3_key: str, cache_dir: str):
+
+  # Check local cache first
+  local_path = os.path.join(cache_dir, s3_key)
+
+  if os.path.exists(local_path):
+      logger.info(f'Reading {s3_key} from local cache')
+      return pd.read_csv(local_path)
+
+  logger.info(f'Reading {bucket}/{s3_key}')
+
+  # Create s3 client
+  s3_client = get_s3_client()
+
+  try:
+      response = s3_client.get_object(Bucket=bucket, Key=s3_key)
+  except ClientError as e:
+      logger.warning(f"Unable to read {s3_key}: {e.response['Error']['Code']}")
+      return None
+
+  return pd.read_csv(io.BytesIO(response['Body'].read()))
+
+
+# Write Report CSV to Local Cache
+# -----------
+
+def cache_report_csv(df: pd.DataFrame, s3_key: str, cache_dir: str, retention_days: int = 14):
+
+  local_path = os.path.join(cache_dir, s3_key)
+  os.makedirs(os.path.dirname(local_path), exist_ok=True)
+
+  df.to_csv(local_path, index=False)
+
+  logger.info(f'Cached {s3_key} locally')
+
+  # Remove cached reports older than the retention period
+  cutoff = datetime.datetime.now().timestamp() - retention_days * 86400
+
+  for root, dirs, files in os.walk(os.path.join(cache_dir, 'reports')):
+      for file in files:
+          if os.path.getmtime(os.path.join(root, file)) < cutoff:
+              os.remove(os.path.join(root, file))
+
+
+
+def send_sns_alert_email(topic_arn: str, email_subject:str, email_body: str):
+    """
+    Function to invoke an SNS topic to send an email alert
+
+    Params:
+        topic_arn: ARN of the SNS topic to invoke
+        email_subject: subject of the email to send
+        email_body: body of the email to send 
+
+
+    """
+
+    # Local backend - alerts are only logged
+    if STORAGE_BACKEND == 'local':
+        logger.warning(f'SNS alert ({topic_arn}): {email_subject} - {email_body}')
+        return
+
+    try:
+
+        # Initialize a boto3 client for SNS
+        sns_client = boto3.client('sns', 
+                                        region_name='us-east-1',
+                                        aws_access_key_id=AWS_ACCESS_KEY_ID,
+                                        aws_secret_access_key=AWS_SECRET_ACCESS_KEY)  
+
+        
+
+        logger.info(f'Sending SNS alert to {topic_arn}')
+
+        # Publish a message to the SNS topic
+        response = sns_client.publish(
+            TopicArn=topic_arn,
+            Message=email_body,
+            Subject=email_subject
+        )
+
+        logger.info(f'SNS Response: {response}')
+
+    except ClientError as e:
+        logger.error(f'Error publishing to SNS topic ({topic_arn}): {e}')
+
+
+def send_sns_alert_email_in_background(topic_arn: str, email_subject: str, email_body: str):
+    """
+    Send an SNS email alert from a background thread so the caller is not blocked (the process waits for the alert before exiting)
+
+    Params:
+        topic_arn: ARN of the SNS topic to invoke
+        email_subject: subject of the email to send
+        email_body: body of the email to send
+
+    """
+
+    thread = threading.Thread(target=send_sns_alert_email,
+                              kwargs={'topic_arn': topic_arn, 'email_subject': email_subject, 'email_body': email_body},
+                              name='sns_alert')
+    thread.start()
+
+    return thread
@@ -0,0 +1,136 @@
+import hashlib
+import io
+import os
+import shutil
+import datetime
+import pandas as pd
+import pyarrow.feather as feather
+from botocore.exceptions import ClientError
+from loguru import logger
+
+from utils.aws_utils import list_s3_keys, get_object_from_s3, put_object_to_s3, delete_s3_prefix_data
+
+
+# Checkpoint layout (local cache, mirrored to S3 so a retry on a fresh runner can resume):
+#   checkpoints/shopify_demand_forecasting/run_date=YYYY-MM-DD/shard_count=N/shard=I/<stage>-<input fingerprint>.arrow
+# (each shard of a sharded run only lists, resumes & clears its own checkpoints)
+CHECKPOINT_PREFIX = 'checkpoints/shopify_demand_forecasting'
+
+
+# FUNCTION TO FINGERPRINT THE INPUTS OF A STAGE
+# ----------
+
+def fingerprint_stage_inputs(*inputs):
+    """
+    Fingerprint the inputs of a stage (run parameters & the fingerprints of the stages it depends on)
+    so a checkpoint is only reused if the stage would be run on the same inputs
+    """
+
+    return hashlib.sha1(repr(inputs).encode('utf-8')).hexdigest()[:16]
+
+
+
+class StageCheckpoints:
+    """
+    Checkpoints of the dataframes produced by each stage of a run (Arrow IPC / feather, zstd compressed),
+    keyed by run date, stage & a fingerprint of the stage inputs.
+
+    A rerun of the same day loads the checkpoint of each stage that already completed instead of re-running it.
+
+    Params:
+        run_date: date of the run
+        cache_dir: local cache directory
+        shard_index: index of the shard of the run (0 if not sharded)
+        shard_count: number of shards of the run (1 if not sharded)
+        bucket: S3 bucket checkpoints are mirrored to (local only if None)
+        s3_client: boto3 s3 client
+        enabled: set False to always run every stage (checkpoints are still written locally, but not mirrored to S3)
+
+    """
+
+    def __init__(self, run_date, cache_dir: str, bucket: str = None, s3_client=None, enabled: bool = True, shard_index: int = 0, shard_count: int = 1):
+
+        self.run_prefix = f"{CHECKPOINT_PREFIX}/run_date={pd.to_datetime(run_date).strftime('%Y-%m-%d')}/shard_count={shard_count}/shard={shard_index}/"
+        self.cache_dir = cache_dir
+        self.bucket = bucket
+        self.s3_client = s3_client
+        self.enabled = enabled
+
+        # Checkpoints already in s3 for this run (listed once)
+        self._s3_keys = set(list_s3_keys(bucket=bucket, s3_prefix=self.run_prefix)) if (bucket and enabled) else set()
+
+
+    def _key(self, stage: str, fingerprint: str):
+
+        return f'{self.run_prefix}{stage}-{fingerprint}.arrow'
+
+
+    def load(self, stage: str, fingerprint: str):
+        """
+        Return the checkpointed dataframe of a stage (None if the stage has not completed with these inputs)
+        """
+
+        if not self.enabled:
+            return None
+
+        s3_key = self._key(stage, fingerprint)
+        local_path = os.path.join(self.cache_dir, s3_key)
+
+        if os.path.exists(local_path):
+            df = feather.read_feather(local_path)
+        elif s3_key in self._s3_keys:
+            try:
+                df = feather.read_feather(io.BytesIO(get_object_from_s3(bucket=self.bucket, s3_key=s3_key)))
+            except ClientError as e:
+                # Checkpoint deleted since it was listed - re-run the stage
+                logger.warning(f"Unable to read checkpoint {s3_key} ({e.response['Error']['Code']}) - re-running {stage}")
+                self._s3_keys.discard(s3_key)
+                return None
+        else:
+            return None
+
+        logger.info(f'Resuming {stage} from checkpoint {s3_key} ({len(df)} rows)')
+
+        return df
+
+
+    def save(self, stage: str, fingerprint: str, df: pd.DataFrame):
+        """
+        Checkpoint the dataframe produced by a stage
+        """
+
+        s3_key = self._key(stage, fingerprint)
+        local_path = os.path.join(self.cache_dir, s3_key)
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+
+        sink = io.BytesIO()
+        feather.write_feather(df.reset_index(drop=True), sink, compression='zstd')
+        body = sink.getvalue()
+
+        with open(local_path, 'wb') as f:
+            f.write(body)
+
+        # Disabled checkpoints are never resumed from S3, so they are only written locally
+        if self.bucket and self.enabled:
+            put_object_to_s3(s3_client=self.s3_client, body=body, bucket=self.bucket, s3_key=s3_key)
+
+        logger.info(f'Checkpointed {stage} ({len(df)} rows, {len(body)} bytes) to {s3_key}')
+
+
+    def clear(self, retention_days: int = 2):
+        """
+        Delete the checkpoints of the run (once it has been published) & local checkpoints older than the retention period
+        """
+
+        shutil.rmtree(os.path.join(self.cache_dir, self.run_prefix), ignore_errors=True)
+
+        if self.bucket:
+            delete_s3_prefix_data(bucket=self.bucket, s3_prefix=self.run_prefix)
+
+        cutoff = (datetime.datetime.now() - datetime.timedelta(days=retention_days)).strftime('%Y-%m-%d')
+        checkpoint_dir = os.path.join(self.cache_dir, CHECKPOINT_PREFIX)
+
+        if os.path.isdir(checkpoint_dir):
+            for run_dir in os.listdir(checkpoint_dir):
+                if run_dir.startswith('run_date=') and run_dir[len('run_date='):] < cutoff:
+                    shutil.rmtree(os.path.join(checkpoint_dir, run_dir), ignore_errors=True)
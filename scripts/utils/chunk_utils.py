@@ -0,0 +1,236 @@
+import io
+import math
+import os
+import resource
+import shutil
+import sys
+import pandas as pd
+import pyarrow.feather as feather
+from loguru import logger
+
+
+# Peak working set of a chunk as a multiple of the in-memory size of its extracted order & inventory frames
+# (typed frames + weekly rollup, fingerprints & per-sku intermediates of generate_daily_run_rate)
+WORKING_SET_FACTOR = 4
+
+# Orders of 1 / ROW_SIZE_SAMPLE_SHARDS of the skus are extracted to measure the in-memory size of an order row
+ROW_SIZE_SAMPLE_SHARDS = 32
+
+# Chunks which do not fit in the memory budget are split in two, up to this many chunks
+MAX_CHUNK_COUNT = 4096
+
+# Share of the memory budget left available to a chunk (rest is headroom for per-sku results & allocator slack)
+CHUNK_BUDGET_FRACTION = 0.6
+
+# S3 minimum part size (all parts but the last)
+MULTIPART_MIN_PART_BYTES = 5 * 1024 * 1024
+
+
+# FUNCTIONS TO MEASURE MEMORY
+# ----------
+
+def current_rss_mb():
+    """
+    Current resident set size of the process in MB (falls back to the peak where /proc is not available)
+    """
+
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of the process in MB
+    """
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # ru_maxrss is in bytes on macOS, KB on linux
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+
+# FUNCTION TO PLAN CHUNKS FROM A MEMORY BUDGET
+# ----------
+
+def estimate_chunk_mb(*dfs):
+    """
+    Estimated peak memory (MB) of forecasting a chunk from its extracted frames (memory_usage(deep=True) x WORKING_SET_FACTOR)
+    """
+
+    return sum(df.memory_usage(index=True, deep=True).sum() for df in dfs) * WORKING_SET_FACTOR / 1024 / 1024
+
+
+def plan_chunk_count(order_rows: int, memory_budget_mb: float, sample_df: pd.DataFrame):
+    """
+    Number of sku chunks needed for each chunk's order rows to fit in the memory budget
+
+    Params:
+        order_rows: number of order rows to forecast (count_orders())
+        memory_budget_mb: peak RSS budget of the process in MB
+        sample_df: sample of extracted order rows the in-memory size of a row is measured from
+
+    """
+
+    available_mb = (memory_budget_mb - current_rss_mb()) * CHUNK_BUDGET_FRACTION
+
+    if available_mb <= 0:
+        raise ValueError(f'Memory budget of {memory_budget_mb} MB is below the current RSS of {current_rss_mb():.0f} MB')
+
+    if len(sample_df) == 0:
+        logger.warning('No order rows in the sample - planning a single chunk (chunks are re-split if they do not fit)')
+        return 1
+
+    row_mb = estimate_chunk_mb(sample_df) / len(sample_df)
+
+    chunk_count = min(MAX_CHUNK_COUNT, max(1, math.ceil(order_rows * row_mb / available_mb)))
+
+    logger.info(f'{order_rows} order rows of ~{row_mb * 1024 * 1024 / WORKING_SET_FACTOR:.0f} bytes (measured on {len(sample_df)} rows), {available_mb:.0f} MB available per chunk - {chunk_count} chunks')
+
+    return chunk_count
+
+
+def split_chunk(chunk_index: int, chunk_count: int):
+    """
+    Split a sku hash chunk in two (skus of chunk i of N are exactly the skus of chunks i & i + N of 2N)
+    """
+
+    if chunk_count * 2 > MAX_CHUNK_COUNT:
+        raise ValueError(f'Chunk {chunk_index} of {chunk_count} does not fit in the memory budget & cannot be split further')
+
+    return [(chunk_index, chunk_count * 2), (chunk_index + chunk_count, chunk_count * 2)]
+
+
+
+class ChunkResultSpill:
+    """
+    Result frames of each chunk written to local Arrow IPC files as the chunk completes (instead of being kept in memory
+    across chunks) & read back once every chunk is done
+
+    Params:
+        spill_dir: local directory of the spilled frames (cleared on init)
+
+    """
+
+    def __init__(self, spill_dir: str):
+
+        self.spill_dir = spill_dir
+        self._paths = {}
+
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
+
+    def write(self, name: str, df: pd.DataFrame):
+        """
+        Spill the frame of one chunk (empty frames are skipped)
+        """
+
+        if df is None or len(df) == 0:
+            return
+
+        paths = self._paths.setdefault(name, [])
+        path = os.path.join(self.spill_dir, name, f'{len(paths):05d}.arrow')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        feather.write_feather(df.reset_index(drop=True), path, compression='zstd')
+        paths.append(path)
+
+
+    def read(self, name: str):
+        """
+        Frames of every chunk spilled under name, concatenated (empty if none)
+        """
+
+        paths = self._paths.get(name, [])
+
+        if len(paths) == 0:
+            return pd.DataFrame()
+
+        return pd.concat([feather.read_feather(path) for path in paths], ignore_index=True)
+
+
+    def clear(self):
+
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
+        self._paths = {}
+
+
+
+class MultipartCsvUpload:
+    """
+    Incremental CSV upload to S3 - dataframes are appended as they are produced & buffered into parts
+    of at least MULTIPART_MIN_PART_BYTES, so the full CSV is never held in memory.
+
+    The object only becomes visible when complete() is called (abort() discards the uploaded parts).
+
+    Params:
+        s3_client: boto3 s3 client
+        bucket: S3 bucket
+        s3_key: S3 key of the CSV
+
+    """
+
+    def __init__(self, s3_client, bucket: str, s3_key: str):
+
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.s3_key = s3_key
+        self.rows = 0
+
+        self._buffer = io.StringIO()
+        self._parts = []
+        self._header_written = False
+
+        self.upload_id = s3_client.create_multipart_upload(Bucket=bucket, Key=s3_key)['UploadId']
+
+        logger.info(f'Started multipart upload of {s3_key}')
+
+
+    def _upload_part(self):
+
+        body = self._buffer.getvalue().encode('utf-8')
+        part_number = len(self._parts) + 1
+
+        response = self.s3_client.upload_part(Bucket=self.bucket, Key=self.s3_key, UploadId=self.upload_id, PartNumber=part_number, Body=body)
+        self._parts.append({'PartNumber': part_number, 'ETag': response['ETag']})
+
+        self._buffer = io.StringIO()
+
+
+    def write(self, df: pd.DataFrame):
+        """
+        Append the rows of df to the CSV (header is written with the first rows)
+        """
+
+        df.to_csv(self._buffer, index=False, header=not self._header_written)
+        self._header_written = True
+        self.rows += len(df)
+
+        if self._buffer.tell() >= MULTIPART_MIN_PART_BYTES:
+            self._upload_part()
+
+
+    def complete(self):
+        """
+        Upload the remaining rows & make the object visible
+        """
+
+        if self._buffer.tell() > 0 or len(self._parts) == 0:
+            self._upload_part()
+
+        self.s3_client.complete_multipart_upload(Bucket=self.bucket, Key=self.s3_key, UploadId=self.upload_id, MultipartUpload={'Parts': self._parts})
+
+        logger.info(f'Completed multipart upload of {self.s3_key}: {self.rows} rows in {len(self._parts)} parts')
+
+
+    def abort(self):
+        """
+        Discard the uploaded parts (the object is left unchanged)
+        """
+
+        self.s3_client.abort_multipart_upload(Bucket=self.bucket, Key=self.s3_key, UploadId=self.upload_id)
+
+        logger.warning(f'Aborted multipart upload of {self.s3_key}')
@@ -0,0 +1,187 @@
+import numpy as np
+import pandas as pd
+from datetime import timedelta
+from loguru import logger
+
+
+# Action taken for the rows / skus failing each check:
+#   warn        logged only
+#   fix         rows are corrected / aggregated (logged)
+#   drop        rows are dropped (they cannot be attributed to a sku)
+#   quarantine  every row of the sku is removed before forecasting & alerted on (fails the run in 'fail' mode)
+#   fail        the run is stopped before forecasting
+DATA_QUALITY_CHECKS = {'null_key': 'drop',                          # orders with a null order_date or sku
+                       'sku_type_mismatch': 'fix',                  # sku keys which only match across tables once normalized (eg. 1000.0 vs 1000)
+                       'null_qty': 'quarantine',                    # orders with a null qty_sold
+                       'negative_qty': 'quarantine',                # orders with a negative qty_sold
+                       'duplicate_key': 'fix',                      # more than one order row per (order_date, sku) - summed into one row (the extract groups by sku_name, so a renamed sku has one row per name)
+                       'null_inventory': 'quarantine',              # inventory rows with a null inventory_on_hand
+                       'negative_inventory': 'quarantine',          # inventory rows with a negative inventory_on_hand
+                       'missing_inventory_partition': 'warn',       # days of the lookback without an inventory partition
+                       'missing_latest_inventory': 'fail',          # no inventory partition for yesterday (every sku would have 0 inventory on hand)
+                       'no_inventory': 'warn',                      # skus sold without any inventory rows
+                       'order_date_gap': 'warn'}                    # days without any orders between the first & last order date
+
+
+def _normalize_sku(skus: pd.Series):
+    """
+    Normalize sku keys to strings (ints read as floats lose their '.0', whitespace is stripped)
+    """
+
+    skus = skus.astype(object).where(skus.notna(), None)
+    normalized = skus.astype(str).str.strip().str.replace(r'^(\d+)\.0+$', r'\1', regex=True)
+
+    return normalized.where(skus.notna(), np.nan)
+
+
+
+# FUNCTION TO CHECK THE EXTRACTED ORDERS & INVENTORY BEFORE FORECASTING
+# ----------
+
+def run_data_quality_gate(daily_qty_sold_df: pd.DataFrame, inventory_df: pd.DataFrame, lookback_cutoff_date: str, mode: str = 'quarantine'):
+    """
+    Vectorized data quality checks of the extracted orders & inventory (DATA_QUALITY_CHECKS) - run before any forecasting so bad
+    data fails fast or only removes the affected skus
+
+    Params:
+        daily_qty_sold_df: dataframe of qty sold per sku per day (extract_orders())
+        inventory_df: dataframe of inventory on hand per sku per day (extract_inventory())
+        lookback_cutoff_date: earliest partition_date of the extracts (YYYY-MM-DD)
+        mode: 'quarantine' removes the skus failing quarantine checks, 'fail' stops the run instead
+
+    Returns:
+        daily_qty_sold_df: orders without dropped / quarantined rows
+        inventory_df: inventory without quarantined skus
+        issues_df: one row per check & sku (sku is null for run level checks) with the number of rows & the action taken
+
+    """
+
+    if mode not in ['quarantine', 'fail']:
+        raise ValueError(f"Data quality mode must be 'quarantine' or 'fail' (got {mode})")
+
+    orders = daily_qty_sold_df.copy()
+    inventory = inventory_df.copy()
+
+    issues = []
+
+    def add_issues(check: str, rows: pd.Series):
+        # rows: number of rows failing the check per sku (index = sku, None for run level checks)
+        for sku, n_rows in rows.items():
+            issues.append({'check': check, 'sku': sku, 'rows': int(n_rows), 'action': DATA_QUALITY_CHECKS[check]})
+
+    # Sku keys (orders are joined to inventory on the sku string)
+    # ----
+
+    orders_sku = _normalize_sku(orders['sku'])
+    inventory_sku = _normalize_sku(inventory['sku'])
+
+    mismatched = (orders_sku != orders['sku'].astype(str)) & orders_sku.notna()
+    mismatched_inventory = (inventory_sku != inventory['sku'].astype(str)) & inventory_sku.notna()
+
+    if mismatched.any() or mismatched_inventory.any():
+        add_issues('sku_type_mismatch', pd.concat([orders_sku[mismatched], inventory_sku[mismatched_inventory]]).value_counts())
+
+    orders['sku'] = orders_sku
+    inventory['sku'] = inventory_sku
+
+    # Order rows which cannot be attributed to a sku & day
+    # ----
+
+    null_key = orders['order_date'].isna() | orders['sku'].isna()
+
+    if null_key.any():
+        add_issues('null_key', pd.Series({None: null_key.sum()}))
+
+    orders = orders.loc[~null_key]
+    inventory = inventory.loc[inventory['sku'].notna()]
+
+    # Row level checks (per sku)
+    # ----
+
+    qty_sold = pd.to_numeric(orders['qty_sold'], errors='coerce')
+    inventory_on_hand = pd.to_numeric(inventory['inventory_on_hand'], errors='coerce')
+
+    row_checks = {'null_qty': (orders, qty_sold.isna()),
+                  'negative_qty': (orders, qty_sold < 0),
+                  'duplicate_key': (orders, orders.duplicated(['order_date','sku'], keep=False)),
+                  'null_inventory': (inventory, inventory_on_hand.isna()),
+                  'negative_inventory': (inventory, inventory_on_hand < 0)}
+
+    for check, (df, failed) in row_checks.items():
+        if failed.any():
+            add_issues(check, df.loc[failed, 'sku'].value_counts())
+
+    # Inventory partitions & order date gaps
+    # ----
+
+    yesterday = pd.to_datetime(pd.to_datetime('today') - timedelta(1)).strftime('%Y-%m-%d')
+
+    expected_dates = pd.date_range(lookback_cutoff_date, yesterday).strftime('%Y-%m-%d')
+    inventory_dates = pd.Index(inventory['partition_date'].astype(str).unique())
+
+    missing_dates = expected_dates.difference(inventory_dates)
+
+    if yesterday in missing_dates:
+        add_issues('missing_latest_inventory', pd.Series({None: 1}))
+        missing_dates = missing_dates.drop(yesterday)
+
+    if len(missing_dates) > 0:
+        logger.warning(f'Missing inventory partitions: {missing_dates.tolist()}')
+        add_issues('missing_inventory_partition', pd.Series({None: len(missing_dates)}))
+
+    no_inventory = pd.Index(orders['sku'].unique()).difference(inventory['sku'].unique())
+
+    if len(no_inventory) > 0:
+        add_issues('no_inventory', orders.loc[orders['sku'].isin(no_inventory), 'sku'].value_counts())
+
+    if len(orders) > 0:
+        order_dates = pd.to_datetime(orders['order_date'].unique())
+        gap_dates = pd.date_range(order_dates.min(), order_dates.max()).difference(order_dates)
+
+        if len(gap_dates) > 0:
+            logger.warning(f"Days without orders: {gap_dates.strftime('%Y-%m-%d').tolist()}")
+            add_issues('order_date_gap', pd.Series({None: len(gap_dates)}))
+
+    issues_df = pd.DataFrame(issues, columns=['check','sku','rows','action'])
+
+    # Apply actions
+    # ----
+
+    for check, summary in issues_df.groupby('check', sort=False).agg(rows=('rows','sum'), skus=('sku','nunique')).iterrows():
+        logger.warning(f"Data quality - {check}: {summary['rows']} rows ({summary['skus']} skus) - {DATA_QUALITY_CHECKS[check]}")
+
+    quarantined_skus = issues_df.loc[issues_df['action']=='quarantine', 'sku'].unique()
+    failed_checks = issues_df.loc[issues_df['action']=='fail', 'check'].unique().tolist()
+
+    if mode == 'fail' and len(quarantined_skus) > 0:
+        failed_checks += issues_df.loc[issues_df['action']=='quarantine', 'check'].unique().tolist()
+
+    if len(failed_checks) > 0:
+        raise ValueError(f'Data quality checks failed: {failed_checks}')
+
+    if len(quarantined_skus) > 0:
+        logger.warning(f'Quarantined {len(quarantined_skus)} skus: {quarantined_skus.tolist()}')
+
+        orders = orders.loc[~orders['sku'].isin(quarantined_skus)]
+        inventory = inventory.loc[~inventory['sku'].isin(quarantined_skus)]
+
+    # Remaining quantities are complete (null / negative rows are quarantined)
+    orders['qty_sold'] = pd.to_numeric(orders['qty_sold']).astype(int)
+
+    # Sum duplicate (order_date, sku) rows into one row (other columns from the first row)
+    if orders.duplicated(['order_date','sku']).any():
+        other_cols = [col for col in orders.columns if col not in ['order_date','sku','qty_sold']]
+        orders = orders.groupby(['order_date','sku'], as_index=False, sort=False).agg({'qty_sold': 'sum', **{col: 'first' for col in other_cols}})[orders.columns]
+    inventory['inventory_on_hand'] = pd.to_numeric(inventory['inventory_on_hand']).astype(int)
+
+    logger.info(f'Data quality gate passed: {len(orders)} order rows, {len(inventory)} inventory rows ({len(quarantined_skus)} skus quarantined)')
+
+    return orders.reset_index(drop=True), inventory.reset_index(drop=True), issues_df
+
+
+def get_quarantined_skus(issues_df: pd.DataFrame):
+    """
+    Skus removed by the data quality gate (issues_df from run_data_quality_gate())
+    """
+
+    return issues_df.loc[issues_df['action']=='quarantine', 'sku'].dropna().unique().tolist()
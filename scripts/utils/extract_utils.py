@@ -0,0 +1,183 @@
+import pandas as pd
+from loguru import logger
+
+from utils.aws_utils import run_athena_query, REGION
+from utils.shard_utils import sku_shard_filter_sql
+from utils.forecast_utils import get_week_id
+
+# -------------------------------------
+# Variables
+# -------------------------------------
+
+DATABASE = 'prymal-analytics'
+
+# -------------------------------------
+# Functions
+# -------------------------------------
+
+
+# FUNCTION TO QUERY ORDER DATA (JOINED WITH NORMALIZED SKU DATA)
+# ----------
+
+def extract_orders(lookback_cutoff_date: str, shard_index: int = 0, shard_count: int = 1):
+    """
+    Query qty sold per sku per day since lookback_cutoff_date & format datatypes
+
+    Params:
+        lookback_cutoff_date: earliest partition_date to include (YYYY-MM-DD)
+        shard_index: index of the sku shard to query (sharded runs)
+        shard_count: number of sku shards (1 queries every sku)
+
+    """
+
+    # Construct query to pull data by product
+    # ----
+
+    QUERY = f"""SELECT a.partition_date
+                , a.order_date
+                , a.sku
+                , a.sku_name
+                , b.product_category
+                , b.product_type
+                , SUM(a.qty_sold) as qty_sold 
+                FROM "prymal-analytics"."shopify_qty_sold_by_sku_daily" a
+                LEFT JOIN (SELECT * 
+                            FROM "prymal"."skus_shopify" 
+                            WHERE load_date = (SELECT MAX(load_date) 
+                                                FROM "prymal"."skus_shopify")
+                                                ) b            
+                ON a.sku = b.sku 
+                
+                WHERE a.partition_date >= DATE('{lookback_cutoff_date}')
+                {sku_shard_filter_sql('a.sku', shard_index, shard_count)}
+                GROUP BY a.partition_date
+                , a.order_date
+                , a.sku
+                , a.sku_name
+                , b.product_category
+                , b.product_type
+                ORDER BY a.order_date ASC
+
+                """
+
+    # Query datalake to get quantiy sold per sku for the last 120 days
+    # ----
+
+    result_df = run_athena_query(query=QUERY, database=DATABASE, region=REGION)
+    result_df.columns = ['partition_date','order_date','sku','sku_name','product_category','product_type','qty_sold']
+
+    return format_orders(result_df)
+
+
+# FUNCTION TO QUERY INVENTORY ON HAND DATA
+# ----------
+
+def extract_inventory(lookback_cutoff_date: str, shard_index: int = 0, shard_count: int = 1):
+    """
+    Query inventory on hand per sku per day since lookback_cutoff_date & format datatypes
+
+    Params:
+        lookback_cutoff_date: earliest partition_date to include (YYYY-MM-DD)
+        shard_index: index of the sku shard to query (sharded runs)
+        shard_count: number of sku shards (1 queries every sku)
+
+    """
+
+    # Construct query to pull latest (as of yesterday) inventory details 
+    # ----
+
+    QUERY =f"""
+
+            SELECT partition_date
+            , CAST(sku AS VARCHAR) as sku
+            , MAX(total_fulfillable_quantity)
+            FROM "prymal"."shipbob_inventory"  
+            WHERE partition_date >= '{lookback_cutoff_date}'
+            {sku_shard_filter_sql('sku', shard_index, shard_count)}
+            GROUP BY partition_date
+            , CAST(sku AS VARCHAR)
+
+                        """
+
+    # Query datalake to get current inventory details for skus sold in the last 120 days
+    # ----
+
+    inventory_df = run_athena_query(query=QUERY, database='prymal', region=REGION)
+
+    inventory_df.columns = ['partition_date','sku','inventory_on_hand']
+
+    return format_inventory(inventory_df)
+
+
+# FUNCTION TO COUNT ORDER ROWS (SIZES CHUNKS OF THE CHUNKED PIPELINE)
+# ----------
+
+def count_orders(lookback_cutoff_date: str, shard_index: int = 0, shard_count: int = 1):
+    """
+    Count rows of qty sold per sku per day since lookback_cutoff_date (upper bound of the rows extract_orders() returns)
+
+    Params:
+        lookback_cutoff_date: earliest partition_date to include (YYYY-MM-DD)
+        shard_index: index of the sku shard to count (sharded runs)
+        shard_count: number of sku shards (1 counts every sku)
+
+    """
+
+    QUERY = f"""SELECT COUNT(*) as order_rows
+                FROM "prymal-analytics"."shopify_qty_sold_by_sku_daily" a
+                WHERE a.partition_date >= DATE('{lookback_cutoff_date}')
+                {sku_shard_filter_sql('a.sku', shard_index, shard_count)}
+                """
+
+    count_df = run_athena_query(query=QUERY, database=DATABASE, region=REGION)
+
+    return int(count_df.iloc[0, 0])
+
+
+# FUNCTION TO FORMAT QUANTITIES (NULLS ARE KEPT FOR THE DATA QUALITY GATE)
+# ----------
+
+def _to_int_if_complete(values: pd.Series):
+
+    values = pd.to_numeric(values, errors='coerce')
+
+    return values.astype(int) if values.notna().all() else values
+
+
+# FUNCTION TO FORMAT ORDER DATA
+# ----------
+
+def format_orders(result_df: pd.DataFrame):
+    """
+    Format datatypes of order data (from Athena or a local csv) & add 'week' column (integer week id)
+    """
+
+    logger.info(result_df.head(3))
+    logger.info(result_df.info())
+    logger.info(f"Count of NULL RECORDS: {len(result_df.loc[result_df['order_date'].isna()])}")
+    # Format datatypes & new columns
+    result_df['order_date'] = pd.to_datetime(result_df['order_date']).dt.strftime('%Y-%m-%d')
+    result_df['qty_sold'] = _to_int_if_complete(result_df['qty_sold'])
+    result_df['week'] = get_week_id(result_df['order_date'])
+
+    logger.info(f"MIN DATE: {result_df['order_date'].min()}")
+    logger.info(f"MAX DATE: {result_df['order_date'].max()}")
+
+    return result_df
+
+
+# FUNCTION TO FORMAT INVENTORY ON HAND DATA
+# ----------
+
+def format_inventory(inventory_df: pd.DataFrame):
+    """
+    Format datatypes of inventory on hand data (from Athena or a local csv)
+    """
+
+    logger.info('inventory_df')
+    logger.info(inventory_df.head(3))
+
+    # Format datatypes & new columns
+    inventory_df['inventory_on_hand'] = _to_int_if_complete(inventory_df['inventory_on_hand'])
+
+    return inventory_df
@@ -0,0 +1,193 @@
+import os
+import re
+import numpy as np
+import pandas as pd
+from datetime import timedelta
+from loguru import logger
+
+from utils.aws_utils import get_report_s3_key, list_s3_keys, read_report_csv
+
+
+# Running per-sku accumulators (additive, so each matured day is folded in with constant work per sku)
+ACCUMULATOR_COLS = ['days_evaluated','sum_actual','sum_forecast','sum_error','sum_abs_error','sum_squared_error','days_covered']
+
+# Metrics derived from the accumulators
+METRIC_COLS = ['mae','rmse','bias','wape','coverage']
+
+
+# FUNCTION TO FIND THE LATEST PUBLISHED PARTITION OF A REPORT
+# ----------
+
+def _latest_report_date(bucket: str, report_name: str, before_date, cache_dir: str):
+    """
+    Date of the latest partition of a report published before before_date (listed from S3 & the local cache, None if there is none)
+    """
+
+    s3_prefix = f'reports/{report_name}/'
+    keys = list_s3_keys(bucket=bucket, s3_prefix=s3_prefix) if bucket else []
+
+    for root, _, files in os.walk(os.path.join(cache_dir, s3_prefix)):
+        keys.extend(os.path.relpath(os.path.join(root, f), cache_dir).replace(os.sep, '/') for f in files)
+
+    before = pd.to_datetime(before_date).strftime('%Y-%m-%d')
+    dates = [f'{m.group(1)}-{m.group(2)}-{m.group(3)}' for m in (re.search(r'year=(\d{4})/month=(\d{2})/day=(\d{2})/', key) for key in keys) if m is not None]
+    dates = [date for date in dates if date < before]
+
+    return max(dates) if len(dates) > 0 else None
+
+
+
+# FUNCTION TO READ THE PREVIOUS ACCUMULATORS & THE FORECASTS OF THE NEWLY MATURED DAYS
+# ----------
+
+def read_accuracy_inputs(bucket: str, current_date, cache_dir: str, lookback_days: int = 7, max_missed_days: int = 90):
+    """
+    Read the latest published accuracy accumulators & the reports published on every day matured since (normally only yesterday)
+
+    Yesterday's accumulators are normally found within lookback_days. After a longer gap (eg. the pipeline was down) the latest
+    accumulators are found by listing the published partitions & carried forward, and every day missed since is rolled in (up to
+    max_missed_days, which must stay within the order lookback so the actuals of each day are still extracted).
+
+    Params:
+        bucket: S3 bucket of the reports
+        current_date: date of the run
+        cache_dir: local cache directory
+        lookback_days: number of days to probe for the latest published accumulators before listing the published partitions
+        max_missed_days: maximum number of matured days to roll in after a gap
+
+    Returns:
+        previous_accuracy_df: latest accumulators (empty if none were found)
+        matured_forecast_df: reports published on the matured days, with a matured_date column (None if none were published)
+        matured_date: latest matured day (YYYY-MM-DD)
+
+    """
+
+    current_date = pd.to_datetime(current_date)
+    matured_date = (current_date - timedelta(days=1)).strftime('%Y-%m-%d')
+
+    # Latest published accumulators (normally yesterday's partition)
+    previous_accuracy_df, previous_date = None, None
+
+    for days_back in range(1, lookback_days + 1):
+        previous_accuracy_df = read_report_csv(bucket=bucket, s3_key=get_report_s3_key('shopify_demand_forecasting_accuracy', current_date - timedelta(days=days_back)), cache_dir=cache_dir)
+        if previous_accuracy_df is not None:
+            previous_date = current_date - timedelta(days=days_back)
+            break
+
+    if previous_accuracy_df is None:
+        latest_date = _latest_report_date(bucket=bucket, report_name='shopify_demand_forecasting_accuracy', before_date=current_date, cache_dir=cache_dir)
+        if latest_date is not None:
+            logger.warning(f'No accuracy accumulators published in the last {lookback_days} days - carrying forward the accumulators of {latest_date}')
+            previous_accuracy_df = read_report_csv(bucket=bucket, s3_key=get_report_s3_key('shopify_demand_forecasting_accuracy', latest_date), cache_dir=cache_dir)
+            previous_date = pd.to_datetime(latest_date)
+
+    if previous_accuracy_df is None:
+        logger.warning('No accuracy accumulators found - starting new accumulators')
+        previous_accuracy_df, previous_date = pd.DataFrame(), current_date - timedelta(days=1)
+
+    # Days matured since the latest accumulators (the accumulators published on a day include the day before)
+    missed_days = (current_date - previous_date).days
+
+    if missed_days > max_missed_days:
+        logger.warning(f'{missed_days} days matured since the latest accuracy accumulators - only the last {max_missed_days} days are rolled in')
+        previous_date = current_date - timedelta(days=max_missed_days)
+
+    matured_dates = pd.date_range(previous_date, current_date - timedelta(days=1)).strftime('%Y-%m-%d').tolist()
+
+    # Forecasts published on the matured days
+    matured_forecast_dfs = []
+
+    for date in matured_dates:
+        forecast_df = read_report_csv(bucket=bucket, s3_key=get_report_s3_key('shopify_demand_forecasting', date), cache_dir=cache_dir)
+        if forecast_df is None:
+            logger.warning(f'No forecast published for {date} - carrying forward accuracy accumulators')
+        else:
+            matured_forecast_dfs.append(forecast_df.assign(matured_date=date))
+
+    matured_forecast_df = pd.concat(matured_forecast_dfs, ignore_index=True) if len(matured_forecast_dfs) > 0 else None
+
+    return previous_accuracy_df, matured_forecast_df, matured_date
+
+
+
+# FUNCTION TO UPDATE FORECAST ACCURACY ACCUMULATORS WITH A NEWLY MATURED DAY OF ACTUALS
+# ----------
+
+def update_accuracy_accumulators(previous_accuracy_df: pd.DataFrame, forecast_df: pd.DataFrame, daily_qty_sold_df: pd.DataFrame, matured_date: str):
+    """
+    Join one newly matured day of actuals against the forecast that covered it & fold the errors into the running accumulators
+
+    The forecast of a day is the daily run rate published on that day (upper_bound is the point forecast, lower_bound - upper_bound the range).
+    Skus which were forecasted but had no orders on the matured day have an actual of 0.
+
+    Params:
+        previous_accuracy_df: accumulators as of the previous matured day (empty if none)
+        forecast_df: report published on matured_date (one row per sku) - or the reports of several matured days with a matured_date column (read_accuracy_inputs()), folded in day by day
+        daily_qty_sold_df: dataframe of qty sold per sku per day
+        matured_date: day of actuals to evaluate (YYYY-MM-DD)
+
+    Returns:
+        accuracy_df: one row per sku with the updated accumulators & derived metrics
+
+    """
+
+    if 'matured_date' in forecast_df.columns:
+        accuracy_df = previous_accuracy_df
+        for day, day_forecast_df in forecast_df.groupby('matured_date', sort=True):
+            accuracy_df = update_accuracy_accumulators(previous_accuracy_df=accuracy_df, forecast_df=day_forecast_df.drop(columns='matured_date'), daily_qty_sold_df=daily_qty_sold_df, matured_date=day)
+        return accuracy_df
+
+    accumulators = previous_accuracy_df.copy()
+
+    if len(accumulators) == 0:
+        accumulators = pd.DataFrame(columns=['sku','last_matured_date'] + ACCUMULATOR_COLS)
+
+    accumulators['sku'] = accumulators['sku'].astype(str)
+
+    # Skip if this day has already been folded in (reruns)
+    already_evaluated = accumulators['last_matured_date'].fillna('').astype(str) >= matured_date
+    if already_evaluated.any():
+        logger.info(f'{already_evaluated.sum()} skus already evaluated for {matured_date}')
+
+    # Actuals of the matured day (only the day's partition is touched)
+    actuals_df = daily_qty_sold_df.loc[daily_qty_sold_df['order_date']==matured_date].groupby('sku',as_index=False)['qty_sold'].sum()
+    actuals_df['sku'] = actuals_df['sku'].astype(str)
+
+    day_df = forecast_df[['sku','lower_bound','upper_bound']].copy()
+    day_df['sku'] = day_df['sku'].astype(str)
+    day_df = day_df.merge(actuals_df, on='sku', how='left')
+    day_df['qty_sold'] = day_df['qty_sold'].fillna(0)
+
+    # Exclude skus whose accumulators already include this day
+    day_df = day_df.loc[~day_df['sku'].isin(accumulators.loc[already_evaluated,'sku'])]
+
+    error = day_df['upper_bound'] - day_df['qty_sold']
+
+    day_accumulators = pd.DataFrame({'sku': day_df['sku'],
+                                     'days_evaluated': 1,
+                                     'sum_actual': day_df['qty_sold'],
+                                     'sum_forecast': day_df['upper_bound'],
+                                     'sum_error': error,
+                                     'sum_abs_error': error.abs(),
+                                     'sum_squared_error': error ** 2,
+                                     'days_covered': ((day_df['qty_sold'] >= day_df['lower_bound']) & (day_df['qty_sold'] <= day_df['upper_bound'])).astype(int)})
+
+    # Fold the day into the running accumulators
+    accuracy_df = pd.concat([accumulators[['sku'] + ACCUMULATOR_COLS], day_accumulators], ignore_index=True)
+    accuracy_df[ACCUMULATOR_COLS] = accuracy_df[ACCUMULATOR_COLS].astype(float)
+    accuracy_df = accuracy_df.groupby('sku', as_index=False)[ACCUMULATOR_COLS].sum()
+
+    accuracy_df = accuracy_df.merge(accumulators[['sku','last_matured_date']], on='sku', how='left')
+    accuracy_df.loc[accuracy_df['sku'].isin(day_accumulators['sku']),'last_matured_date'] = matured_date
+
+    # Derived metrics
+    days = accuracy_df['days_evaluated'].replace(0, np.nan)
+    accuracy_df['mae'] = accuracy_df['sum_abs_error'] / days
+    accuracy_df['rmse'] = np.sqrt(accuracy_df['sum_squared_error'] / days)
+    accuracy_df['bias'] = accuracy_df['sum_error'] / days
+    accuracy_df['wape'] = accuracy_df['sum_abs_error'] / accuracy_df['sum_actual'].replace(0, np.nan)
+    accuracy_df['coverage'] = accuracy_df['days_covered'] / days
+
+    logger.info(f"Evaluated {len(day_accumulators)} skus for {matured_date} - coverage: {day_accumulators['days_covered'].mean() if len(day_accumulators) > 0 else np.nan}")
+
+    return accuracy_df[['sku','last_matured_date'] + ACCUMULATOR_COLS + METRIC_COLS]
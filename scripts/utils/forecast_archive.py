@@ -0,0 +1,311 @@
+import base64
+import bisect
+import datetime
+import json
+import os
+import re
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from loguru import logger
+
+from utils.aws_utils import list_s3_keys, get_object_from_s3, get_object_range_from_s3, put_object_to_s3, delete_s3_prefix_data
+
+
+# Archive layout (S3, mirrored in the local cache):
+#   archive/shopify_demand_forecasting/month=YYYY-MM/run_date=YYYY-MM-DD.arrow   (one Arrow IPC segment appended per run)
+#   archive/shopify_demand_forecasting/month=YYYY-MM/compacted.arrow             (month compacted & sorted by sku, run_date)
+#   archive/shopify_demand_forecasting/month=YYYY-MM/index.json                  (sku -> [start row, end row) of compacted.arrow,
+#                                                                                  schema & [byte offset, byte length, first row] of each record batch)
+ARCHIVE_PREFIX = 'archive/shopify_demand_forecasting'
+
+# Rows per record batch of a compacted segment (a sku lookup fetches only the batches holding its rows)
+COMPACTED_BATCH_ROWS = 4096
+
+# Days segments are kept in the local cache after they were last written / downloaded
+ARCHIVE_CACHE_RETENTION_DAYS = 14
+
+
+def _month_prefix(month: str):
+    return f'{ARCHIVE_PREFIX}/month={month}/'
+
+
+def _to_ipc_bytes(table: pa.Table):
+
+    sink = pa.BufferOutputStream()
+
+    with pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table, max_chunksize=65536)
+
+    return sink.getvalue().to_pybytes()
+
+
+def _to_batched_ipc_bytes(table: pa.Table, batch_rows: int):
+
+    # Arrow IPC file with the byte range & first row of each record batch (a batch can be read on its own with a range request)
+    sink = pa.BufferOutputStream()
+    batches = []
+
+    with pa.ipc.new_file(sink, table.schema) as writer:
+
+        # The schema is written with the first batch - an empty batch first, so every batch offset is the start of its own message
+        writer.write_batch(pa.RecordBatch.from_pylist([], schema=table.schema))
+
+        start_row = 0
+        for batch in table.to_batches(max_chunksize=batch_rows):
+            offset = sink.tell()
+            writer.write_batch(batch)
+            batches.append([offset, sink.tell() - offset, start_row])
+            start_row += batch.num_rows
+
+    return sink.getvalue().to_pybytes(), batches
+
+
+def _write_local(cache_dir: str, s3_key: str, body: bytes):
+
+    local_path = os.path.join(cache_dir, s3_key)
+    os.makedirs(os.path.dirname(local_path), exist_ok=True)
+
+    with open(local_path, 'wb') as f:
+        f.write(body)
+
+    return local_path
+
+
+def _read_ipc(bucket: str, s3_key: str, cache_dir: str):
+
+    # Read from the local cache if present, else download (& cache) from s3
+    local_path = os.path.join(cache_dir, s3_key)
+
+    if not os.path.exists(local_path):
+        _write_local(cache_dir, s3_key, get_object_from_s3(bucket=bucket, s3_key=s3_key))
+
+    # Memory map the segment (slices only touch the pages they read)
+    return pa.ipc.open_file(pa.memory_map(local_path, 'r')).read_all()
+
+
+
+# FUNCTION TO APPEND A RUN TO THE FORECAST ARCHIVE
+# ----------
+
+def archive_forecast_run(s3_client, valid_df: pd.DataFrame, run_date, bucket: str, cache_dir: str):
+    """
+    Append the validated forecast of a run to the archive as an Arrow IPC segment & compact any previous month
+    which still has daily segments (so each closed month is a single compacted segment + index)
+
+    Params:
+        s3_client: boto3 s3 client
+        valid_df: dataframe of validated ShopifyDemandForecast rows
+        run_date: date of the run
+        bucket: S3 bucket of the archive
+        cache_dir: local cache directory
+
+    """
+
+    run_date = pd.to_datetime(run_date).strftime('%Y-%m-%d')
+    month = run_date[:7]
+
+    archive_df = valid_df.copy()
+    archive_df['sku'] = archive_df['sku'].astype(str)
+    archive_df['run_date'] = pd.to_datetime(run_date).date()
+
+    s3_key = f'{_month_prefix(month)}run_date={run_date}.arrow'
+    body = _to_ipc_bytes(pa.Table.from_pandas(archive_df, preserve_index=False))
+
+    # Reruns of the same day replace that day's segment
+    put_object_to_s3(s3_client=s3_client, body=body, bucket=bucket, s3_key=s3_key)
+    _write_local(cache_dir, s3_key, body)
+
+    logger.info(f'Archived {len(archive_df)} rows to {s3_key}')
+
+    prune_archive_cache(cache_dir=cache_dir)
+
+    # Compact previous months with daily segments (month rollover)
+    months_to_compact = set()
+
+    for key in list_s3_keys(bucket=bucket, s3_prefix=f'{ARCHIVE_PREFIX}/'):
+        match = re.search(r'month=(\d{4}-\d{2})/run_date=', key)
+        if match and match.group(1) < month:
+            months_to_compact.add(match.group(1))
+
+    for previous_month in sorted(months_to_compact):
+        compact_archive_month(s3_client=s3_client, month=previous_month, bucket=bucket, cache_dir=cache_dir)
+
+
+
+# FUNCTION TO COMPACT A MONTH OF THE FORECAST ARCHIVE
+# ----------
+
+def compact_archive_month(s3_client, month: str, bucket: str, cache_dir: str):
+    """
+    Merge the daily segments of a month (& any existing compacted segment) into one segment sorted by sku & run_date,
+    write the sku -> row range index & delete the daily segments
+
+    Params:
+        s3_client: boto3 s3 client
+        month: month to compact (YYYY-MM)
+        bucket: S3 bucket of the archive
+        cache_dir: local cache directory
+
+    """
+
+    prefix = _month_prefix(month)
+    keys = list_s3_keys(bucket=bucket, s3_prefix=prefix)
+
+    daily_keys = sorted(key for key in keys if '/run_date=' in key)
+    segment_keys = [key for key in keys if key.endswith('compacted.arrow')] + daily_keys
+
+    if len(daily_keys) == 0:
+        logger.info(f'No daily segments to compact for {month}')
+        return
+
+    logger.info(f'Compacting {len(daily_keys)} daily segments of {month}')
+
+    tables = [_read_ipc(bucket, key, cache_dir) for key in segment_keys]
+    month_df = pa.concat_tables(tables, promote_options='default').to_pandas()
+
+    # Latest run of a day wins (reruns), then sort so each sku's history is a contiguous row range
+    month_df = month_df.drop_duplicates(['sku','run_date'], keep='last').sort_values(['sku','run_date'], kind='stable').reset_index(drop=True)
+
+    # sku -> [start row, end row)
+    bounds = month_df.groupby('sku', sort=False).indices
+    index = {sku: [int(rows[0]), int(rows[-1]) + 1] for sku, rows in bounds.items()}
+
+    compacted_key = f'{prefix}compacted.arrow'
+    index_key = f'{prefix}index.json'
+
+    month_table = pa.Table.from_pandas(month_df, preserve_index=False)
+    compacted_body, batches = _to_batched_ipc_bytes(month_table, COMPACTED_BATCH_ROWS)
+    index_body = json.dumps({'rows': len(month_df),
+                             'skus': index,
+                             'schema': base64.b64encode(month_table.schema.serialize().to_pybytes()).decode('ascii'),
+                             'batches': batches}).encode('utf-8')
+
+    # Write compacted segment & index before deleting daily segments (a failed compaction never loses rows)
+    put_object_to_s3(s3_client=s3_client, body=compacted_body, bucket=bucket, s3_key=compacted_key)
+    put_object_to_s3(s3_client=s3_client, body=index_body, bucket=bucket, s3_key=index_key)
+    _write_local(cache_dir, compacted_key, compacted_body)
+    _write_local(cache_dir, index_key, index_body)
+
+    for key in daily_keys:
+        delete_s3_prefix_data(bucket=bucket, s3_prefix=key)
+        if os.path.exists(os.path.join(cache_dir, key)):
+            os.remove(os.path.join(cache_dir, key))
+
+    logger.info(f'Compacted {month}: {len(month_df)} rows, {len(index)} skus, {len(batches)} batches')
+
+
+
+# FUNCTION TO PRUNE THE LOCAL ARCHIVE CACHE
+# ----------
+
+def prune_archive_cache(cache_dir: str, retention_days: int = ARCHIVE_CACHE_RETENTION_DAYS):
+    """
+    Remove archive segments & indexes not written / downloaded in the last retention_days from the local cache
+    (they are downloaded again from s3 if needed)
+    """
+
+    cutoff = datetime.datetime.now().timestamp() - retention_days * 86400
+    removed = 0
+
+    for root, dirs, files in os.walk(os.path.join(cache_dir, ARCHIVE_PREFIX)):
+        for file in files:
+            if os.path.getmtime(os.path.join(root, file)) < cutoff:
+                os.remove(os.path.join(root, file))
+                removed += 1
+
+    if removed > 0:
+        logger.info(f'Removed {removed} archive files older than {retention_days} days from the local cache')
+
+
+
+class ForecastArchive:
+    """
+    Reader of the forecast archive - returns the forecast history of a sku across months.
+
+    Compacted months are read with a single range request of the record batches holding the sku's rows (using the sku index)
+    or a row range slice of the memory mapped segment if it is in the local cache, the current (not yet compacted) month is
+    read from its daily segments.
+
+    Params:
+        bucket: S3 bucket of the archive
+        cache_dir: local cache directory (segments are downloaded once & memory mapped from here)
+
+    """
+
+    def __init__(self, bucket: str, cache_dir: str):
+
+        self.bucket = bucket
+        self.cache_dir = cache_dir
+        self._indexes = {}
+
+
+    def _index(self, month: str):
+
+        if month not in self._indexes:
+            index_key = f'{_month_prefix(month)}index.json'
+            local_path = os.path.join(self.cache_dir, index_key)
+
+            if not os.path.exists(local_path):
+                _write_local(self.cache_dir, index_key, get_object_from_s3(bucket=self.bucket, s3_key=index_key))
+
+            with open(local_path, 'r') as f:
+                self._indexes[month] = json.load(f)
+
+        return self._indexes[month]
+
+
+    def _compacted_rows(self, month: str, start_row: int, end_row: int):
+
+        compacted_key = f'{_month_prefix(month)}compacted.arrow'
+        index = self._index(month)
+
+        # Segment in the local cache (or indexed without batch offsets) - slice the memory mapped segment
+        if os.path.exists(os.path.join(self.cache_dir, compacted_key)) or 'batches' not in index:
+            return _read_ipc(self.bucket, compacted_key, self.cache_dir).slice(start_row, end_row - start_row).to_pandas()
+
+        # Else fetch only the (contiguous) batches holding the rows with one range request
+        first_rows = [batch[2] for batch in index['batches']]
+        batches = index['batches'][bisect.bisect_right(first_rows, start_row) - 1:bisect.bisect_left(first_rows, end_row)]
+
+        offset = batches[0][0]
+        body = get_object_range_from_s3(bucket=self.bucket, s3_key=compacted_key, offset=offset, length=batches[-1][0] + batches[-1][1] - offset)
+
+        schema = pa.ipc.read_schema(pa.py_buffer(base64.b64decode(index['schema'])))
+        table = pa.Table.from_batches([pa.ipc.read_record_batch(pa.py_buffer(body[batch_offset - offset:batch_offset - offset + length]), schema)
+                                       for batch_offset, length, _ in batches], schema=schema)
+
+        return table.slice(start_row - batches[0][2], end_row - start_row).to_pandas()
+
+
+    def sku_history(self, sku, start_month: str, end_month: str):
+        """
+        Return the archived forecasts of a sku between start_month & end_month (YYYY-MM, inclusive), one row per run
+        """
+
+        sku = str(sku)
+        months = pd.period_range(start_month, end_month, freq='M').strftime('%Y-%m')
+
+        keys = list_s3_keys(bucket=self.bucket, s3_prefix=f'{ARCHIVE_PREFIX}/')
+
+        history = []
+
+        for month in months:
+
+            month_keys = [key for key in keys if key.startswith(_month_prefix(month))]
+
+            # Compacted segment - one row range read
+            if f'{_month_prefix(month)}compacted.arrow' in month_keys:
+                bounds = self._index(month)['skus'].get(sku)
+                if bounds is not None:
+                    history.append(self._compacted_rows(month, bounds[0], bounds[1]))
+
+            # Daily segments (current month)
+            for key in sorted(key for key in month_keys if '/run_date=' in key):
+                table = _read_ipc(self.bucket, key, self.cache_dir)
+                history.append(table.filter(pc.equal(table['sku'], sku)).to_pandas())
+
+        if len(history) == 0:
+            return pd.DataFrame()
+
+        return pd.concat(history, ignore_index=True).drop_duplicates(['sku','run_date'], keep='last').sort_values('run_date').reset_index(drop=True)
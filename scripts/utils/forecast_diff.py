@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+
+# Columns which define whether a sku's forecast changed (days_of_stock_on_hand rather than forecasted_stockout_date,
+# which is today + days of stock & moves every day)
+COMPARE_COLS = ['lower_bound','upper_bound','inventory_on_hand',
+                'forecast_90_days','forecast_120_days','forecast_150_days',
+                'production_next_90_days','production_next_120_days','production_next_150_days',
+                'days_of_stock_on_hand']
+
+# Columns reported (current, previous & delta) in the changeset
+DELTA_COLS = ['upper_bound','production_next_90_days','production_next_120_days','production_next_150_days']
+
+KEY_COLS = ['sku','sku_name','product_type','product_category']
+
+
+def generate_forecast_changeset(current_df: pd.DataFrame, previous_df: pd.DataFrame):
+    """
+    Compare the current forecast report with the previous report & return the skus that are new, changed or dropped
+
+    Params:
+        current_df: current inventory report (one row per sku)
+        previous_df: previous inventory report (one row per sku)
+
+    Returns:
+        changeset_df: one row per new / changed / dropped sku with the current, previous & delta values of
+                      upper_bound, production_next_* & forecasted_stockout_date (unchanged skus are excluded)
+
+    """
+
+    value_cols = [col for col in COMPARE_COLS if col in current_df.columns]
+
+    current = current_df[KEY_COLS + value_cols + ['forecasted_stockout_date']].copy()
+    previous = previous_df[[col for col in KEY_COLS + value_cols + ['forecasted_stockout_date'] if col in previous_df.columns]].copy()
+
+    # Normalize sku (csv round trips can turn the sku into an int)
+    current['sku'] = current['sku'].astype(str)
+    previous['sku'] = previous['sku'].astype(str)
+
+    # One row per sku (duplicates would fan out the merge)
+    if current['sku'].duplicated().any():
+        raise ValueError(f"Report has more than one row for skus: {current.loc[current['sku'].duplicated(), 'sku'].unique().tolist()}")
+
+    if previous['sku'].duplicated().any():
+        logger.warning(f"Previous report has more than one row for skus {previous.loc[previous['sku'].duplicated(), 'sku'].unique().tolist()} - comparing against the last row")
+        previous = previous.drop_duplicates('sku', keep='last')
+
+    merged_df = current.merge(previous, on='sku', how='outer', suffixes=('','_prev'), indicator=True)
+
+    # Carry forward product details for dropped skus
+    for col in ['sku_name','product_type','product_category']:
+        if f'{col}_prev' in merged_df.columns:
+            merged_df[col] = merged_df[col].fillna(merged_df[f'{col}_prev'])
+
+    # Stockout dates are compared as dates (delta in days)
+    for col in ['forecasted_stockout_date','forecasted_stockout_date_prev']:
+        merged_df[col] = pd.to_datetime(merged_df[col])
+
+    # Flag changed skus (any compared value differs between reports)
+    changed = pd.Series(False, index=merged_df.index)
+    for col in value_cols:
+        changed |= ~np.isclose(merged_df[col].astype(float), merged_df[f'{col}_prev'].astype(float), equal_nan=True)
+
+    merged_df['change_type'] = np.select([merged_df['_merge']=='left_only',
+                                          merged_df['_merge']=='right_only',
+                                          changed],
+                                         ['new','dropped','changed'],
+                                         default='unchanged')
+
+    # Deltas (current - previous)
+    for col in DELTA_COLS:
+        merged_df[f'{col}_delta'] = merged_df[col].fillna(0) - merged_df[f'{col}_prev'].fillna(0)
+
+    merged_df['forecasted_stockout_date_delta_days'] = (merged_df['forecasted_stockout_date'] - merged_df['forecasted_stockout_date_prev']).dt.days
+
+    for col in ['forecasted_stockout_date','forecasted_stockout_date_prev']:
+        merged_df[col] = merged_df[col].dt.strftime('%Y-%m-%d')
+
+    changeset_df = merged_df.loc[merged_df['change_type']!='unchanged'].sort_values(['change_type','sku']).reset_index(drop=True)
+
+    logger.info(f"Forecast changeset: {changeset_df['change_type'].value_counts().to_dict()} ({len(merged_df) - len(changeset_df)} unchanged)")
+
+    output_cols = KEY_COLS + ['change_type']
+    for col in DELTA_COLS + ['forecasted_stockout_date']:
+        output_cols += [col, f'{col}_prev']
+    output_cols += [f'{col}_delta' for col in DELTA_COLS] + ['forecasted_stockout_date_delta_days']
+
+    return changeset_df[output_cols]
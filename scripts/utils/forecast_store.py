@@ -0,0 +1,223 @@
+import json
+import mmap
+import os
+import datetime
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+
+# File layout: MAGIC | header length (uint64) | json header | 8 byte aligned blocks (columns, indexes, string table)
+MAGIC = b'PRYFCST1'
+
+EPOCH = datetime.date(1970, 1, 1)
+
+# Fixed width columns of the store (ShopifyDemandForecast fields)
+NUMERIC_COLS = {'sku': '<i8',
+                'lower_bound': '<f8',
+                'upper_bound': '<f8',
+                'last_7_actual': '<i8',
+                'last_90_actual': '<i8',
+                'inventory_on_hand': '<i8',
+                'forecast_90_days': '<i8',
+                'production_next_90_days': '<i8',
+                'forecast_120_days': '<i8',
+                'production_next_120_days': '<i8',
+                'forecast_150_days': '<i8',
+                'production_next_150_days': '<i8',
+                'days_of_stock_on_hand': '<i8'}
+
+# String columns (stored as ids into the string table)
+STRING_COLS = ['sku_name','forecast','product_type','product_category']
+
+# Dates (stored as days since 1970-01-01)
+DATE_COLS = ['forecasted_stockout_date']
+
+
+# FUNCTION TO COMPILE VALIDATED FORECAST ROWS INTO A SKU INDEXED BINARY STORE
+# ----------
+
+def compile_forecast_store(valid_df: pd.DataFrame):
+    """
+    Compile validated ShopifyDemandForecast rows into a sku indexed binary store (returned as bytes)
+
+    Rows are sorted by sku (point lookups are a binary search), with additional row permutations sorted by
+    product_type & forecasted_stockout_date so those lookups are a binary search + slice as well.
+
+    Params:
+        valid_df: dataframe of validated ShopifyDemandForecast rows
+
+    """
+
+    df = valid_df.sort_values('sku', kind='stable').reset_index(drop=True)
+    n_rows = len(df)
+
+    blocks = {}
+
+    # Fixed width columns
+    for col, dtype in NUMERIC_COLS.items():
+        blocks[col] = df[col].to_numpy().astype(dtype)
+
+    for col in DATE_COLS:
+        blocks[col] = (pd.to_datetime(df[col]) - pd.Timestamp(EPOCH)).dt.days.to_numpy().astype('<i4')
+
+    # String table (deduplicated) & string id columns
+    strings = pd.unique(pd.concat([df[col].fillna('').astype(str) for col in STRING_COLS], ignore_index=True))
+    string_ids = {value: i for i, value in enumerate(strings)}
+
+    for col in STRING_COLS:
+        blocks[col] = df[col].fillna('').astype(str).map(string_ids).to_numpy().astype('<i4')
+
+    encoded = [value.encode('utf-8') for value in strings]
+    blocks['_string_offsets'] = np.concatenate([[0], np.cumsum([len(value) for value in encoded])]).astype('<i8')
+    blocks['_string_blob'] = np.frombuffer(b''.join(encoded), dtype='u1')
+
+    # Indexes (row permutations & sorted keys)
+    blocks['_product_type_rows'] = np.argsort(blocks['product_type'], kind='stable').astype('<i8')
+    blocks['_product_type_keys'] = blocks['product_type'][blocks['_product_type_rows']]
+
+    blocks['_stockout_rows'] = np.argsort(blocks['forecasted_stockout_date'], kind='stable').astype('<i8')
+    blocks['_stockout_keys'] = blocks['forecasted_stockout_date'][blocks['_stockout_rows']]
+
+    # Header (block offsets are relative to the start of the data section)
+    header = {'rows': n_rows,
+              'created_at': datetime.datetime.now().isoformat(),
+              'blocks': {},
+              'product_types': {value: string_ids[value] for value in df['product_type'].fillna('').astype(str).unique()}}
+
+    offset = 0
+    for name, array in blocks.items():
+        header['blocks'][name] = {'dtype': array.dtype.str, 'offset': offset, 'length': len(array)}
+        offset += -(-array.nbytes // 8) * 8     # 8 byte alignment
+
+    header_bytes = json.dumps(header).encode('utf-8')
+    header_bytes += b' ' * (-(len(MAGIC) + 8 + len(header_bytes)) % 8)
+
+    parts = [MAGIC, np.uint64(len(header_bytes)).tobytes(), header_bytes]
+    for array in blocks.values():
+        data = array.tobytes()
+        parts.append(data + b'\0' * (-len(data) % 8))
+
+    store_bytes = b''.join(parts)
+
+    logger.info(f'Compiled forecast store: {n_rows} rows, {len(strings)} strings, {len(store_bytes)} bytes')
+
+    return store_bytes
+
+
+
+class ForecastStore:
+    """
+    Read only, memory mapped forecast store compiled by compile_forecast_store().
+
+    Opening the store only parses the header - columns are numpy views over the memory map, so
+    lookups only touch the pages of the rows they return.
+
+    Params:
+        path: path of the compiled store
+
+    """
+
+    def __init__(self, path: str):
+
+        self.path = path
+
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f'{path} is not a forecast store')
+
+        header_len = int(np.frombuffer(self._mmap, dtype='<u8', count=1, offset=len(MAGIC))[0])
+        data_start = len(MAGIC) + 8 + header_len
+
+        self.header = json.loads(self._mmap[len(MAGIC) + 8:data_start])
+        self.rows = self.header['rows']
+        self.product_types = self.header['product_types']
+
+        self._blocks = {name: np.frombuffer(self._mmap, dtype=spec['dtype'], count=spec['length'], offset=data_start + spec['offset'])
+                        for name, spec in self.header['blocks'].items()}
+
+
+    def _string(self, string_id: int):
+
+        offsets = self._blocks['_string_offsets']
+
+        return bytes(self._blocks['_string_blob'][offsets[string_id]:offsets[string_id + 1]]).decode('utf-8')
+
+
+    def _records(self, rows):
+
+        records = []
+
+        for row in rows:
+            record = {col: self._blocks[col][row].item() for col in NUMERIC_COLS}
+            for col in STRING_COLS:
+                record[col] = self._string(self._blocks[col][row])
+            for col in DATE_COLS:
+                record[col] = (EPOCH + datetime.timedelta(days=int(self._blocks[col][row]))).isoformat()
+            records.append(record)
+
+        return records
+
+
+    def get_sku(self, sku: int):
+        """
+        Return the forecast of a sku (None if the sku is not in the store)
+        """
+
+        skus = self._blocks['sku']
+        row = np.searchsorted(skus, int(sku))
+
+        if row < self.rows and skus[row] == int(sku):
+            return self._records([row])[0]
+
+        return None
+
+
+    def get_skus(self, skus: list):
+        """
+        Return the forecasts of a batch of skus (skus not in the store are omitted)
+        """
+
+        keys = np.asarray([int(sku) for sku in skus], dtype='<i8')
+        rows = np.searchsorted(self._blocks['sku'], keys)
+        found = (rows < self.rows) & (self._blocks['sku'][np.minimum(rows, self.rows - 1)] == keys) if self.rows > 0 else np.zeros(len(keys), dtype=bool)
+
+        return self._records(rows[found])
+
+
+    def get_product_type(self, product_type: str):
+        """
+        Return the forecasts of all skus of a product type
+        """
+
+        if product_type not in self.product_types:
+            return []
+
+        string_id = self.product_types[product_type]
+        keys = self._blocks['_product_type_keys']
+
+        start, end = np.searchsorted(keys, string_id, side='left'), np.searchsorted(keys, string_id, side='right')
+
+        return self._records(self._blocks['_product_type_rows'][start:end])
+
+
+    def get_stockout_range(self, start_date: str, end_date: str):
+        """
+        Return the forecasts of skus with a forecasted stockout date between start_date & end_date (inclusive)
+        """
+
+        start_day = (pd.to_datetime(start_date).date() - EPOCH).days
+        end_day = (pd.to_datetime(end_date).date() - EPOCH).days
+        keys = self._blocks['_stockout_keys']
+
+        start, end = np.searchsorted(keys, start_day, side='left'), np.searchsorted(keys, end_day, side='right')
+
+        return self._records(self._blocks['_stockout_rows'][start:end])
+
+
+    def close(self):
+
+        self._blocks = {}
+        self._mmap.close()
@@ -0,0 +1,711 @@
+import pandas as pd
+import numpy as np
+import statistics
+import hashlib
+from datetime import timedelta
+from loguru import logger
+
+# -------------------------------------
+# Variables
+# -------------------------------------
+
+# Version of the run rate logic - bump when generate_daily_run_rate changes to invalidate memoized run rates
+FORECAST_VERSION = '2'
+
+# Monday that week ids are counted from (weeks run Monday to Sunday, like '%Y-%W')
+WEEK_ORIGIN = pd.Timestamp('1970-01-05')
+
+# -------------------------------------
+# Functions
+# -------------------------------------
+
+
+# FUNCTION TO GET THE WEEK ID OF DATES
+# ----------
+
+def get_week_id(dates):
+    """
+    Integer id of the (Monday to Sunday) week of a date or series of dates - consecutive weeks have consecutive ids,
+    so the week spanning the new year is one week (unlike '%Y-%W', which splits it into week 52/53 & week 00)
+    """
+
+    days = pd.to_datetime(dates) - WEEK_ORIGIN
+
+    return (days.dt.days if isinstance(days, pd.Series) else days.days) // 7
+
+
+
+# FUNCTION TO BUILD THE WEEKLY ROLLUP OF ORDERS & INVENTORY
+# ----------
+
+def build_weekly_rollup(daily_qty_sold_df: pd.DataFrame, inventory_df: pd.DataFrame):
+    """
+    Aggregate orders & inventory of every sku by week once (instead of per sku & weekly window)
+
+    Params:
+        daily_qty_sold_df: dataframe of qty sold per sku per day (with 'week' column)
+        inventory_df: dataframe of inventory on hand per sku per day
+
+    Returns:
+        weekly_df: one row per sku & week (sorted (sku, week) index, so each weekly window of a sku is a slice) with qty_sold,
+                   order_days, inventory_on_hand (median), days_in_stock & latest_order_week (most recent week with orders of the sku)
+
+    """
+
+    orders_weekly = daily_qty_sold_df.groupby(['sku','week']).agg(qty_sold=('qty_sold','sum'),
+                                                                  order_days=('order_date','nunique'))
+
+    inventory = inventory_df[['partition_date','sku','inventory_on_hand']]
+    inventory_weekly = inventory.assign(week=get_week_id(inventory['partition_date'])).groupby(['sku','week']).agg(inventory_on_hand=('inventory_on_hand','median'),
+                                                                                                                   days_in_stock=('partition_date','nunique'))
+
+    # Weeks without orders / inventory are 0 (as if nothing was sold / on hand)
+    weekly_df = orders_weekly.join(inventory_weekly, how='outer').fillna(0).sort_index()
+    weekly_df['order_days'] = weekly_df['order_days'].astype(int)
+    weekly_df['days_in_stock'] = weekly_df['days_in_stock'].astype(int)
+
+    # Most recent week with orders of each sku (excluded from the weekly windows in case it is not complete)
+    order_weeks = weekly_df.index.get_level_values('week').to_series(index=weekly_df.index).where(weekly_df['order_days'] > 0)
+    weekly_df['latest_order_week'] = order_weeks == order_weeks.groupby(level='sku').transform('max')
+
+    return weekly_df
+
+
+
+# FUNCTION TO GENERATE THE DAILY RUN RATE OF A SKU
+# ----------
+
+def generate_daily_run_rate(daily_qty_sold_df: pd.DataFrame, inventory_df: pd.DataFrame, sku_value:str, weekly_df: pd.DataFrame = None):
+
+    logger.info(f'UPDATING FORECAST TABLE - {sku_value}')
+
+    # Create date lists of recent dates to include to report on recent sales 
+    # -----------
+
+    daily_list = []
+
+    for i in range(0,60):   # today through 60 days ago
+        day = pd.to_datetime(pd.to_datetime('today') - timedelta(i)).strftime('%Y-%m-%d')
+        daily_list.append(day)
+
+    # Last week (last full week) is current_week - 1
+    current_week = get_week_id(pd.to_datetime('today'))
+
+    # DAILY QTY SOLD
+    # -----
+
+    # Calculate daily dataframe
+    daily_df = daily_qty_sold_df.loc[daily_qty_sold_df['sku']==sku_value].sort_values('order_date',ascending=False)
+    sku_name = daily_df['sku_name'].unique().tolist()[0]
+
+    # Subset inventory_df to get inventory details for the current SKU
+    current_sku_inventory = inventory_df.loc[inventory_df['sku']==sku_value].copy()
+
+    # Rename column to join with order data
+    current_sku_inventory.rename(columns={'partition_date':'order_date'},inplace=True)
+
+    # Subset / select specific columns
+    current_sku_inventory = current_sku_inventory[['order_date', 'sku','inventory_on_hand']]
+
+    # Calculate daily statistics for past 7, 14, 30 & 60 days (if no records, then set to 0)
+
+    if len(daily_df.loc[daily_df['order_date'].isin(daily_list[:7]),'qty_sold']) > 0:
+
+
+        date_df = pd.DataFrame(daily_list[:7],columns=['order_date'])
+        # Join Series of dates to asses with order date & inventory on hand data
+        daily_sales = date_df.merge(daily_df,on='order_date',how='left').fillna(0)
+        daily_df_subset = daily_sales.merge(current_sku_inventory[['order_date','inventory_on_hand']],on=['order_date'],how='left').fillna(0)
+        # Excude days when there was no inventory to sell 
+        daily_df_subset = daily_df_subset.loc[(daily_df_subset['inventory_on_hand']>0)&(daily_df_subset['qty_sold']>0)]
+
+        
+
+        # Calculate inventory demand ration (% of available days where inventory was available that a sale occured) (to weight percentiles)
+        days_ordered = len(daily_df.loc[daily_df['order_date'].isin(daily_list[:7]),'qty_sold'])
+        days_available = len(daily_df_subset)
+        # If inventory days_available = 0 and sales occured , then set inventory_demand_ratio to 1 to avoid divide by 0 error
+        if days_available == 0:
+            inventory_demand_ratio = 1
+        else:
+            inventory_demand_ratio = min(1,days_ordered / days_available)    # for cases where inventory was sold on more days than inventory was available, only allow a max of 1 for this ratio
+
+        
+
+        if len(daily_df_subset) > 0:
+            last_7_median =  daily_df_subset['qty_sold'].median() * inventory_demand_ratio
+            last_7_p25 = np.percentile(daily_df_subset['qty_sold'],25) * inventory_demand_ratio
+            last_7_p75 = np.percentile(daily_df_subset['qty_sold'],75) * inventory_demand_ratio
+
+        
+
+        else:
+            last_7_median = 0
+            last_7_p25 = 0
+            last_7_p75 = 0
+
+    else:
+        last_7_median = 0
+        last_7_p25 = 0
+        last_7_p75 = 0
+
+
+    if len(daily_df.loc[daily_df['order_date'].isin(daily_list[:14]),'qty_sold']) > 0:
+
+
+        date_df = pd.DataFrame(daily_list[:14],columns=['order_date'])
+        # Join Series of dates to asses with order date & inventory on hand data
+        daily_sales = date_df.merge(daily_df,on='order_date',how='left').fillna(0)
+        daily_df_subset = daily_sales.merge(current_sku_inventory[['order_date','inventory_on_hand']],on=['order_date'],how='left').fillna(0)
+        # Excude days when there was no inventory to sell 
+        daily_df_subset = daily_df_subset.loc[(daily_df_subset['inventory_on_hand']>0)&(daily_df_subset['qty_sold']>0)]
+
+
+        # Calculate inventory demand ration (% of available days where inventory was available that a sale occured) (to weight percentiles)
+        days_ordered = len(daily_df.loc[daily_df['order_date'].isin(daily_list[:14]),'qty_sold'])
+        days_available = len(daily_df_subset)
+        # If inventory days_available = 0 and sales occured , then set inventory_demand_ratio to 1 to avoid divide by 0 error
+        if days_available == 0:
+            inventory_demand_ratio = 1
+        else:
+            inventory_demand_ratio = min(1,days_ordered / days_available)    # for cases where inventory was sold on more days than inventory was available, only allow a max of 1 for this ratio
+
+        if len(daily_df_subset) > 0:
+            last_14_median =  daily_df_subset['qty_sold'].median() * inventory_demand_ratio
+            last_14_p25 = np.percentile(daily_df_subset['qty_sold'],25) * inventory_demand_ratio
+            last_14_p75 = np.percentile(daily_df_subset['qty_sold'],75) * inventory_demand_ratio
+
+        else:
+            last_14_median = 0
+            last_14_p25 = 0
+            last_14_p75 = 0
+
+    else:
+        last_14_median = 0
+        last_14_p25 = 0
+        last_14_p75 = 0
+
+    if len(daily_df.loc[daily_df['order_date'].isin(daily_list[:30]),'qty_sold']) > 0:
+
+        date_df = pd.DataFrame(daily_list[:30],columns=['order_date'])
+        # Join Series of dates to asses with order date & inventory on hand data
+        daily_sales = date_df.merge(daily_df,on='order_date',how='left').fillna(0)
+        daily_df_subset = daily_sales.merge(current_sku_inventory[['order_date','inventory_on_hand']],on=['order_date'],how='left').fillna(0)
+        # Excude days when there was no inventory to sell 
+        daily_df_subset = daily_df_subset.loc[(daily_df_subset['inventory_on_hand']>0)&(daily_df_subset['qty_sold']>0)]
+
+
+        # Calculate inventory demand ration (% of available days where inventory was available that a sale occured) (to weight percentiles)
+        days_ordered = len(daily_df.loc[daily_df['order_date'].isin(daily_list[:30]),'qty_sold'])
+        days_available = len(daily_df_subset)
+        # If inventory days_available = 0 and sales occured , then set inventory_demand_ratio to 1 to avoid divide by 0 error
+        if days_available == 0:
+            inventory_demand_ratio = 1
+        else:
+            inventory_demand_ratio = min(1,days_ordered / days_available)    # for cases where inventory was sold on more days than inventory was available, only allow a max of 1 for this ratio
+
+        if len(daily_df_subset) > 0:
+            last_30_median =  daily_df_subset['qty_sold'].median() * inventory_demand_ratio
+            last_30_p25 = np.percentile(daily_df_subset['qty_sold'],25) * inventory_demand_ratio
+            last_30_p75 = np.percentile(daily_df_subset['qty_sold'],75) * inventory_demand_ratio
+
+        else:
+            last_30_median = 0
+            last_30_p25 = 0
+            last_30_p75 = 0
+
+    else:
+        last_30_median = 0
+        last_30_p25 = 0
+        last_30_p75 = 0
+
+    if len(daily_df.loc[daily_df['order_date'].isin(daily_list[:60]),'qty_sold']) > 0:
+
+        date_df = pd.DataFrame(daily_list[:60],columns=['order_date'])
+        # Join Series of dates to asses with order date & inventory on hand data
+        daily_sales = date_df.merge(daily_df,on='order_date',how='left').fillna(0)
+        daily_df_subset = daily_sales.merge(current_sku_inventory[['order_date','inventory_on_hand']],on=['order_date'],how='left').fillna(0)
+        # Excude days when there was no inventory to sell 
+        daily_df_subset = daily_df_subset.loc[(daily_df_subset['inventory_on_hand']>0)&(daily_df_subset['qty_sold']>0)]
+
+        # Calculate inventory demand ration (% of available days where inventory was available that a sale occured) (to weight percentiles)
+        days_ordered = len(daily_sales.loc[daily_sales['qty_sold']>0])
+        days_available = len(daily_df_subset)
+        # If inventory days_available = 0 and sales occured , then set inventory_demand_ratio to 1 to avoid divide by 0 error
+        if days_available == 0:
+            inventory_demand_ratio = 1
+        else:
+            inventory_demand_ratio = min(1,days_ordered / days_available)    # for cases where inventory was sold on more days than inventory was available, only allow a max of 1 for this ratio
+
+            
+
+        if len(daily_df_subset) > 0:
+
+            last_60_median = daily_df_subset['qty_sold'].median()  * inventory_demand_ratio
+            last_60_p25 = np.percentile(daily_df_subset['qty_sold'],25) * inventory_demand_ratio
+            last_60_p75 =np.percentile(daily_df_subset['qty_sold'],75) * inventory_demand_ratio
+
+        else:
+            last_60_median = 0
+            last_60_p25 = 0
+            last_60_p75 = 0
+
+
+    else:
+        last_60_median = 0
+        last_60_p25 = 0
+        last_60_p75 = 0
+
+
+    # WEEKLY QTY SOLD
+    # -----
+
+    # Weekly orders & inventory of the sku (weekly_df is built once for all skus by generate_run_rates())
+    if weekly_df is None:
+        weekly_df = build_weekly_rollup(daily_qty_sold_df=daily_df, inventory_df=inventory_df.loc[inventory_df['sku']==sku_value])
+
+    sku_weekly_df = weekly_df.loc[sku_value].copy()
+
+    # Drop most recent week (in case not complete)
+    sku_weekly_df.loc[sku_weekly_df['latest_order_week'], ['qty_sold','order_days']] = 0
+
+    # Calculate weekly statistics for past 2, 3, 4 & 5 weeks (if no records, then set to 0)
+    weekly_stats = {}
+
+    for n_weeks in range(2,6):
+
+        # Weeks of the window (sorted week index - window is a slice)
+        window_df = sku_weekly_df.loc[current_week - n_weeks:current_week - 1]
+        ordered_df = window_df.loc[window_df['order_days'] > 0]
+
+        if len(ordered_df) == 0:
+            weekly_stats[n_weeks] = [0, 0, 0]
+            continue
+
+        # Excude weeks when there was no inventory to sell
+        weekly_df_subset = ordered_df.loc[(ordered_df['inventory_on_hand']>0)&(ordered_df['qty_sold']>0)]
+
+        # Calculate inventory demand ration (% of available days where inventory was available that a sale occured) (to weight percentiles)
+        days_ordered = ordered_df['order_days'].sum()
+        days_available = weekly_df_subset['days_in_stock'].sum()
+        # If inventory days_available = 0 and sales occured , then set inventory_demand_ratio to 1 to avoid divide by 0 error
+        if days_available == 0:
+            inventory_demand_ratio = 1
+        else:
+            inventory_demand_ratio = min(1,days_ordered / days_available)    # for cases where inventory was sold on more days than inventory was available, only allow a max of 1 for this ratio
+
+        if len(weekly_df_subset) > 0:
+            weekly_stats[n_weeks] = [np.percentile(weekly_df_subset['qty_sold'],25) * inventory_demand_ratio,
+                                     weekly_df_subset['qty_sold'].median() * inventory_demand_ratio,
+                                     np.percentile(weekly_df_subset['qty_sold'],75) * inventory_demand_ratio]
+        else:
+            weekly_stats[n_weeks] = [0, 0, 0]
+
+
+
+    # Consolidate stats
+    recent_stats_df = pd.DataFrame([[last_7_p25, last_7_median, last_7_p75] + weekly_stats[2],
+                [last_14_p25, last_14_median, last_14_p75] + weekly_stats[3],
+                [last_30_p25, last_30_median, last_30_p75] + weekly_stats[4],
+                [last_60_p25, last_60_median, last_60_p75] + weekly_stats[5]],
+                columns=['percentile_25','median','percentile_75','percentile_25_weekly','median_weekly','percentile_75_weekly'])
+
+
+    # Calculate median of lower bound (median) and upper bound (75th percentile) , excluding days / weeks with 0 sold
+    lower_bound_daily = recent_stats_df.loc[recent_stats_df['median']>0,'median'].median()
+    upper_bound_daily = recent_stats_df.loc[recent_stats_df['percentile_75']>0,'percentile_75'].median()
+    lower_bound_weekly = recent_stats_df.loc[recent_stats_df['median_weekly']>0,'median_weekly'].median()
+    upper_bound_weekly = recent_stats_df.loc[recent_stats_df['percentile_75_weekly']>0,'percentile_75_weekly'].median()
+
+
+    lower_bound_final = statistics.median([lower_bound_daily, lower_bound_weekly/7])
+    upper_bound_final = statistics.median([upper_bound_daily, upper_bound_weekly/7])
+
+
+    # Extrapolate out 30, 60, 90 days
+    run_rate = ['forecast_daily',lower_bound_final,upper_bound_final]
+    
+    # Consolidate into dataframe
+    df = pd.DataFrame([run_rate],
+                columns=['forecast','lower_bound','upper_bound'])
+    
+    # Append product name & sku
+    df['sku'] = sku_value
+    df['sku_name'] = sku_name
+
+    # Last week's actuals
+    last_7_actual = daily_df.loc[pd.to_datetime(daily_df['order_date']) >= (pd.to_datetime('today') - timedelta(7))].groupby('sku',as_index=False)['qty_sold'].sum()
+    last_7_actual.columns = ['sku','last_7_actual']
+    # Fill na with 0 (if no units were sold in last 7 days)
+    last_7_actual['last_7_actual'] =  last_7_actual['last_7_actual'].fillna(0)
+
+    # Last 90 days actual 
+    last_90_actual = daily_df.loc[pd.to_datetime(daily_df['order_date']) >= (pd.to_datetime('today') - timedelta(90))].groupby('sku',as_index=False)['qty_sold'].sum()
+    last_90_actual.columns = ['sku','last_90_actual']
+    # Fill na with 0 (if no units were sold in last 7 days)
+    last_90_actual['last_90_actual'] =  last_90_actual['last_90_actual'].fillna(0)
+
+
+
+
+    # Merge
+    df = df.merge(last_7_actual, on='sku',how='left').merge(last_90_actual, on='sku',how='left').copy()
+
+
+    # Set partition date to yesterday (data as of yesterday)
+    df['partition_date'] = pd.to_datetime(pd.to_datetime('today') - timedelta(1)).strftime('%Y-%m-%d')
+
+
+    return df[['sku','sku_name','forecast','lower_bound','upper_bound','last_7_actual','last_90_actual','partition_date']]
+
+
+
+# FUNCTION TO FINGERPRINT THE WINDOWED INPUTS OF EACH SKU
+# ----------
+
+def fingerprint_sku_inputs(daily_qty_sold_df: pd.DataFrame, inventory_df: pd.DataFrame, weekly_df: pd.DataFrame = None):
+    """
+    Hash the inputs generate_daily_run_rate actually uses for each sku, relative to the current as-of date, in one pass over all skus.
+
+    Sales are encoded by the window they fall into (7 / 14 / 30 / 60 / 90 days) and weeks by their position in the weekly windows,
+    so a sku's fingerprint only changes when a sale (or the inventory on a day / week with sales) enters, leaves or moves between windows.
+
+    Params:
+        daily_qty_sold_df: dataframe of qty sold per sku per day (with 'week' column)
+        inventory_df: dataframe of inventory on hand per sku per day
+        weekly_df: weekly rollup of orders & inventory (build_weekly_rollup()) - built if not provided
+
+    Returns:
+        dict of sku -> fingerprint
+
+    """
+
+    today = pd.to_datetime('today')
+
+    inventory = inventory_df[['partition_date','sku','inventory_on_hand']].rename(columns={'partition_date':'order_date'})
+
+    # DAILY WINDOWS
+    # -----
+
+    sales_df = daily_qty_sold_df[['sku','sku_name','order_date','qty_sold']].merge(inventory[['order_date','sku','inventory_on_hand']],
+                                                                              on=['order_date','sku'],
+                                                                              how='left')
+
+    days_ago = (today.normalize() - pd.to_datetime(sales_df['order_date'])).dt.days
+    sales_df['window'] = pd.cut(days_ago, bins=[-np.inf,-1,6,13,29,59,89,np.inf], labels=['future','7','14','30','60','90','past']).astype(str)
+    sales_df['in_stock'] = sales_df['inventory_on_hand'].fillna(0) > 0
+
+    daily_fp_df = sales_df.loc[sales_df['window']!='past',['sku','window','qty_sold','in_stock']].copy()
+    daily_fp_df['kind'] = 'daily'
+
+    # WEEKLY WINDOWS
+    # -----
+
+    if weekly_df is None:
+        weekly_df = build_weekly_rollup(daily_qty_sold_df=daily_qty_sold_df, inventory_df=inventory_df)
+
+    # Weeks with orders included in the weekly windows (1 - 5 weeks ago, same as generate_daily_run_rate)
+    weekly_fp_df = weekly_df.reset_index()
+    weekly_fp_df['window'] = get_week_id(today) - weekly_fp_df['week']
+    weekly_fp_df = weekly_fp_df.loc[weekly_fp_df['window'].between(1,5) & (weekly_fp_df['order_days'] > 0),
+                                    ['sku','window','qty_sold','order_days','latest_order_week','inventory_on_hand','days_in_stock']]
+    weekly_fp_df['kind'] = 'weekly'
+
+    # SKU NAME (name of the most recent order)
+    # -----
+
+    name_fp_df = daily_qty_sold_df.sort_values('order_date',ascending=False).drop_duplicates('sku')[['sku','sku_name']].copy()
+    name_fp_df['kind'] = 'name'
+
+    # HASH
+    # -----
+
+    fp_df = pd.concat([daily_fp_df, weekly_fp_df, name_fp_df], ignore_index=True)
+    fp_cols = ['kind','window','qty_sold','in_stock','order_days','latest_order_week','inventory_on_hand','days_in_stock','sku_name']
+    fp_df[fp_cols] = fp_df[fp_cols].astype(str)
+
+    # Hash each row, then combine the (sorted) row hashes of each sku so the fingerprint does not depend on row order
+    fp_df['row_hash'] = pd.util.hash_pandas_object(fp_df[['sku'] + fp_cols], index=False).values
+
+    sku_fingerprints = fp_df.groupby('sku')['row_hash'].agg(lambda x: hashlib.sha1(np.sort(x.values).tobytes()).hexdigest()).to_dict()
+
+    return sku_fingerprints
+
+
+
+# FUNCTION TO EXTEND FORECAST & CALCULATE PRODUCTION NEEDS
+# ----------
+
+def calculate_production_needs(df: pd.DataFrame, horizons: list = [90, 120, 150]):
+    """
+    Extend the upper bound of the daily forecast over each horizon and subtract inventory on hand to determine production needs
+
+    Params:
+        df: dataframe with upper_bound & inventory_on_hand columns (one row per sku)
+        horizons: list of horizons (in days) to forecast
+
+    """
+
+    df = df.copy()
+
+    # Extend upper bound of forecast for 90, 120, 150 days to determine upcoming quarter inventory needs
+    for horizon in horizons:
+        df[f'forecast_{horizon}_days'] = round(df['upper_bound'] * horizon,0)
+
+    # Subtract inventory on hand from forecasted qty to determine production needs
+    # (replace negative with 0 for any instances where there is sufficient inventory for the quarter)
+    for horizon in horizons:
+        df[f'production_next_{horizon}_days'] = (df[f'forecast_{horizon}_days'] - df['inventory_on_hand']).clip(lower=0)
+
+    return df
+
+
+
+# FUNCTION TO GENERATE HIERARCHICAL ROLLUPS
+# ----------
+
+# Levels of the product hierarchy to roll up to (most granular first)
+ROLLUP_LEVELS = {'sku': ['product_category','product_type','sku','sku_name'],
+                 'product_type': ['product_category','product_type'],
+                 'product_category': ['product_category'],
+                 'total': []}
+
+# Additive measures which are summed at every level of the hierarchy
+ROLLUP_MEASURES = ['lower_bound','upper_bound','last_7_actual','last_90_actual','inventory_on_hand',
+                   'forecast_90_days','forecast_120_days','forecast_150_days',
+                   'production_next_90_days','production_next_120_days','production_next_150_days']
+
+def generate_hierarchical_rollups(inventory_details_df: pd.DataFrame):
+    """
+    Roll up forecasts, production needs & inventory from sku level to product_type, product_category & total levels.
+
+    Every level is summed from the same sku level aggregation, so the totals of each level are consistent with each other
+    (ie. production needs of a product_type = sum of the production needs of its skus, not recalculated from the summed forecast)
+
+    Params:
+        inventory_details_df: dataframe of run rates, inventory & production needs (one row per sku)
+
+    Returns:
+        rollup_df: dataframe with one row per node of the hierarchy, identified by rollup_level + the key columns
+
+    """
+
+    key_cols = ROLLUP_LEVELS['sku']
+
+    # Single aggregation over the sku level data (missing categories / types are kept as 'Unknown' so they are not dropped from totals)
+    sku_df = inventory_details_df[key_cols + ROLLUP_MEASURES].copy()
+    sku_df[['product_category','product_type']] = sku_df[['product_category','product_type']].fillna('Unknown')
+    sku_df = sku_df.groupby(key_cols, as_index=False, dropna=False)[ROLLUP_MEASURES].sum()
+    sku_df['sku_count'] = 1
+
+    rollup_dfs = []
+
+    # Roll each level up from the sku level aggregate
+    for level, group_cols in ROLLUP_LEVELS.items():
+
+        if level == 'sku':
+            level_df = sku_df.copy()
+        elif len(group_cols) > 0:
+            level_df = sku_df.groupby(group_cols, as_index=False)[ROLLUP_MEASURES + ['sku_count']].sum()
+        else:
+            level_df = sku_df[ROLLUP_MEASURES + ['sku_count']].sum().to_frame().T
+
+        level_df['rollup_level'] = level
+
+        rollup_dfs.append(level_df)
+
+    rollup_df = pd.concat(rollup_dfs, ignore_index=True)
+
+    # Set partition date to yesterday (data as of yesterday)
+    rollup_df['partition_date'] = pd.to_datetime(pd.to_datetime('today') - timedelta(1)).strftime('%Y-%m-%d')
+
+    return rollup_df[['rollup_level'] + key_cols + ['sku_count'] + ROLLUP_MEASURES + ['partition_date']]
+
+
+
+# FUNCTION TO GENERATE DAILY RUN RATES FOR ALL SKUS
+# ----------
+
+def generate_run_rates(daily_qty_sold_df: pd.DataFrame, inventory_df: pd.DataFrame, memo_store=None):
+    """
+    Generate the daily run rate of every sku sold in daily_qty_sold_df & carry forward its product details
+
+    Params:
+        daily_qty_sold_df: dataframe of qty sold per sku per day (with 'week' column)
+        inventory_df: dataframe of inventory on hand per sku per day
+        memo_store: optional SkuMemoStore - skus whose windowed inputs have not changed reuse the memoized run rate
+
+    """
+
+    # Blank list to store results
+    run_rate_dfs = []
+
+    # Weekly orders & inventory of every sku (each sku's weekly windows are slices of it)
+    weekly_df = build_weekly_rollup(daily_qty_sold_df=daily_qty_sold_df, inventory_df=inventory_df)
+
+    # Fingerprint the windowed inputs of every sku
+    if memo_store is not None:
+        sku_fingerprints = fingerprint_sku_inputs(daily_qty_sold_df=daily_qty_sold_df, inventory_df=inventory_df, weekly_df=weekly_df)
+
+    # Product details of each sku (first record)
+    product_details = daily_qty_sold_df.drop_duplicates('sku').set_index('sku')[['product_type','product_category']]
+
+    # For each sku in products list, generate forecast using recent sales data
+    for sku in daily_qty_sold_df['sku'].unique():
+
+        # Reuse the memoized run rate if the sku's inputs have not changed since it was calculated
+        df = memo_store.get(sku, sku_fingerprints[sku]) if memo_store is not None else None
+
+        if df is None:
+            # Generate daily run rates for the product
+            df = generate_daily_run_rate(daily_qty_sold_df=daily_qty_sold_df, inventory_df=inventory_df,sku_value=sku, weekly_df=weekly_df)
+
+            if memo_store is not None:
+                memo_store.put(sku, sku_fingerprints[sku], df)
+        else:
+            # Set partition date to yesterday (data as of yesterday)
+            df['partition_date'] = pd.to_datetime(pd.to_datetime('today') - timedelta(1)).strftime('%Y-%m-%d')
+
+        # Extract product details to carry forward
+        df['product_type'] = product_details.loc[sku,'product_type']
+        df['product_category'] = product_details.loc[sku,'product_category']
+
+        # Append to run rate list
+        run_rate_dfs.append(df)
+
+    if len(run_rate_dfs) == 0:
+        return pd.DataFrame(columns=['sku','sku_name','forecast','lower_bound','upper_bound','last_7_actual','last_90_actual','partition_date','product_type','product_category'])
+
+    # Consolidate & reset index
+    product_run_rate_df = pd.concat(run_rate_dfs, ignore_index=True)
+
+    #  Replace nlls with 0
+    product_run_rate_df['last_7_actual'] =  product_run_rate_df['last_7_actual'].fillna(0)
+
+    return product_run_rate_df
+
+
+
+# FUNCTION TO JOIN RUN RATES WITH INVENTORY ON HAND
+# ----------
+
+def build_inventory_details(product_run_rate_df: pd.DataFrame, inventory_df: pd.DataFrame):
+    """
+    Merge run rates with yesterday's partition of inventory on hand & calculate production needs for all skus
+
+    Params:
+        product_run_rate_df: dataframe of run rates (one row per sku)
+        inventory_df: dataframe of inventory on hand per sku per day
+
+    """
+
+    # Merge run rate df with yesterday's partition of inventory df 
+    inventory_details_df = product_run_rate_df.merge(inventory_df,
+                    how='left',
+                    on=['partition_date', 'sku'])
+
+    # Fill NaN inventory_on_hand records with 0
+    inventory_details_df['inventory_on_hand'] = inventory_details_df['inventory_on_hand'].fillna(0)
+
+    # Fill NA with 0
+    logger.info(f'NAN count: {inventory_details_df.isna().sum()}')
+    inventory_details_df[['lower_bound','upper_bound','last_7_actual','last_90_actual']] = inventory_details_df[['lower_bound','upper_bound','last_7_actual','last_90_actual']].fillna(0).copy()
+    logger.info(f'NAN count: {inventory_details_df.isna().sum()}')
+
+    # Extend forecast & calculate production needs for all skus (so rollups & report share the same values)
+    inventory_details_df = calculate_production_needs(inventory_details_df)
+
+    return inventory_details_df
+
+
+
+# FUNCTION TO CALCULATE DAYS OF STOCK ON HAND & FORECASTED STOCKOUT DATE
+# ----------
+
+def calculate_stockout_dates(df: pd.DataFrame):
+    """
+    Calculate days of stock on hand (inventory on hand / upper bound of the daily run rate) & the forecasted stockout date
+
+    If the daily run rate is 0 (forecasting zero demand) or there is no inventory on hand, days of stock on hand is set to 0
+
+    Params:
+        df: dataframe with upper_bound & inventory_on_hand columns
+
+    """
+
+    df = df.copy()
+
+    # Only calculate days of stock on hand where there is demand & existing inventory on hand (since it is the denominator)
+    in_stock = (df['upper_bound'] > 0) & (df['inventory_on_hand'] > 0)
+
+    df['days_of_stock_on_hand'] = np.where(in_stock, np.trunc(df['inventory_on_hand'] / df['upper_bound'].where(in_stock, 1)), 0).astype(float)
+
+    # Calculate forecasted stockout date
+    df['forecasted_stockout_date'] = (pd.to_datetime('today') + pd.to_timedelta(df['days_of_stock_on_hand'].clip(lower=0), unit='D')).dt.strftime('%Y-%m-%d')
+
+    return df
+
+
+
+# FUNCTION TO SUBSET SKUS INCLUDED IN THE REPORT
+# ----------
+
+def build_inventory_report(inventory_details_df: pd.DataFrame):
+    """
+    Subset the product types included in the report & calculate days of stock on hand / forecasted stockout date
+
+    Rows are ordered by section, then sku (or inventory on hand), independent of the order of inventory_details_df - so single node,
+    sharded (merged) & chunked runs order the skus of each section the same way, as long as the report is built once over the details
+    of every sku (sections & the top skus of a section are not additive across partial catalogs)
+
+    Params:
+        inventory_details_df: dataframe of run rates, inventory & production needs (one row per sku)
+
+    """
+
+    inventory_details_df = inventory_details_df.sort_values('sku', kind='stable')
+
+    # Classic Flavor - 320 g 
+    # ---
+
+    # Subset df to only include Classic Flavor 320 g
+    classic_320g_df = inventory_details_df.loc[inventory_details_df['product_type']=='Classic Creamer - Large Bag'].copy()
+
+    # Limited Edition Flavor - 320 g 
+    # ---
+
+    lmtd_320g_df = inventory_details_df.loc[(inventory_details_df['product_type']=='Limited Edition Creamer - Large Bag')&(inventory_details_df['upper_bound']>0)].sort_values('inventory_on_hand',ascending=False,kind='stable')
+
+    # Coffee Beans (whole, ground, kcup)
+    # ---
+
+    coffee_df = inventory_details_df.loc[(inventory_details_df['product_category']=='Coffee Beans')&(inventory_details_df['upper_bound']>0)]
+
+    # Classic Flavor - Bulk Bag
+    # ---
+
+    bulk_bag_df = inventory_details_df.loc[(inventory_details_df['product_type']=='Classic Creamer - Bulk Bag')&(inventory_details_df['upper_bound']>0)].sort_values('inventory_on_hand',ascending=False,kind='stable').head(20)
+
+
+    # Sachets
+    # ---
+
+    sachet_df = inventory_details_df.loc[inventory_details_df['product_type'].str.contains('Sachet', na=False)].sort_values('inventory_on_hand',ascending=False,kind='stable').copy()
+
+
+    # Variety Pack - Kickstart 
+    # ---
+
+    vp_kickstart_df = inventory_details_df.loc[inventory_details_df['product_type']=='Variety Pack - Kickstart'].copy()
+
+
+    # Concat df of all product types which will be included in the report
+    inventory_report_df = pd.concat([classic_320g_df,bulk_bag_df, sachet_df,coffee_df,vp_kickstart_df])
+
+    # reset index
+    inventory_report_df.reset_index(inplace=True,drop=True)
+
+    # Calculate days of stock on hand & forecasted stockout date
+    inventory_report_df = calculate_stockout_dates(inventory_report_df)
+
+    return inventory_report_df
@@ -0,0 +1,269 @@
+import glob
+import io
+import os
+import re
+import shutil
+import sqlite3
+import uuid
+import zlib
+import datetime
+import pandas as pd
+from botocore.exceptions import ClientError
+from loguru import logger
+
+
+# Local stand-in for S3 & Athena (STORAGE_BACKEND=local):
+#   <root>/s3/<bucket>/<key>                                   one directory per bucket, objects stored under their key
+#   <root>/athena/<database>/<table>/**/*.csv|*.parquet        one directory per table (hive style key=value directories are added as columns)
+
+
+# Athena functions used by the extraction queries (registered with sqlite)
+SQL_FUNCTIONS = {'crc32': (1, lambda b: None if b is None else zlib.crc32(b if isinstance(b, bytes) else str(b).encode('utf-8'))),
+                 'to_utf8': (1, lambda s: None if s is None else str(s).encode('utf-8'))}
+
+# Columns kept as text when reading tables from csv (ids with leading zeros)
+TEXT_COLS = ['sku']
+
+
+# LOCAL S3 CLIENT
+# ----------
+
+class _ListObjectsPaginator:
+
+    def __init__(self, client):
+        self.client = client
+
+    def paginate(self, Bucket: str, Prefix: str = ''):
+        yield self.client.list_objects_v2(Bucket=Bucket, Prefix=Prefix)
+
+
+class LocalS3Client:
+    """
+    Directory backed stand-in for the subset of the boto3 S3 client used by the pipeline (list, get, put & delete
+    objects + multipart uploads). Each bucket is a directory under <root>/s3 & each object a file at its key.
+
+    Params:
+        root: root directory of the local backend
+
+    """
+
+    def __init__(self, root: str):
+
+        self.root = os.path.join(root, 's3')
+        self._uploads_dir = os.path.join(root, 'multipart_uploads')
+
+
+    def _path(self, bucket: str, key: str):
+        return os.path.join(self.root, bucket, *key.split('/'))
+
+
+    def _write(self, path: str, body):
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temporary file & rename (readers never see a partial object, like S3)
+        tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(body.encode('utf-8') if isinstance(body, str) else body)
+        os.replace(tmp_path, path)
+
+
+    def list_objects_v2(self, Bucket: str, Prefix: str = '', **kwargs):
+
+        bucket_dir = os.path.join(self.root, Bucket)
+
+        # Only walk the deepest directory covered by the prefix
+        prefix_dir = os.path.join(bucket_dir, *Prefix.split('/')[:-1])
+
+        contents = []
+
+        for dirpath, dirnames, filenames in os.walk(prefix_dir):
+            for filename in filenames:
+                if filename.endswith('.tmp'):
+                    continue
+                path = os.path.join(dirpath, filename)
+                key = os.path.relpath(path, bucket_dir).replace(os.sep, '/')
+                if key.startswith(Prefix):
+                    contents.append({'Key': key,
+                                     'Size': os.path.getsize(path),
+                                     'LastModified': datetime.datetime.fromtimestamp(os.path.getmtime(path), tz=datetime.timezone.utc)})
+
+        response = {'KeyCount': len(contents), 'IsTruncated': False, 'ResponseMetadata': {'HTTPStatusCode': 200}}
+
+        if len(contents) > 0:
+            response['Contents'] = sorted(contents, key=lambda obj: obj['Key'])
+
+        return response
+
+
+    def get_paginator(self, operation_name: str):
+
+        if operation_name != 'list_objects_v2':
+            raise NotImplementedError(f'{operation_name} is not supported by the local backend')
+
+        return _ListObjectsPaginator(self)
+
+
+    def get_object(self, Bucket: str, Key: str, **kwargs):
+
+        path = self._path(Bucket, Key)
+
+        if not os.path.isfile(path):
+            raise ClientError({'Error': {'Code': 'NoSuchKey', 'Message': f'{Bucket}/{Key} does not exist'}}, 'GetObject')
+
+        with open(path, 'rb') as f:
+
+            # Byte range reads (Range='bytes=<first>-<last>', inclusive)
+            if kwargs.get('Range'):
+                first, last = (int(value) for value in kwargs['Range'][len('bytes='):].split('-'))
+                f.seek(first)
+                return {'Body': io.BytesIO(f.read(last - first + 1)), 'ResponseMetadata': {'HTTPStatusCode': 206}}
+
+            return {'Body': io.BytesIO(f.read()), 'ResponseMetadata': {'HTTPStatusCode': 200}}
+
+
+    def put_object(self, Bucket: str, Key: str, Body, **kwargs):
+
+        self._write(self._path(Bucket, Key), Body)
+
+        return {'ResponseMetadata': {'HTTPStatusCode': 200}}
+
+
+    def delete_objects(self, Bucket: str, Delete: dict, **kwargs):
+
+        deleted = []
+
+        for obj in Delete['Objects']:
+            path = self._path(Bucket, obj['Key'])
+            if os.path.isfile(path):
+                os.remove(path)
+            deleted.append({'Key': obj['Key']})
+
+        return {'Deleted': deleted, 'ResponseMetadata': {'HTTPStatusCode': 200}}
+
+
+    def create_multipart_upload(self, Bucket: str, Key: str, **kwargs):
+
+        upload_id = uuid.uuid4().hex
+        os.makedirs(os.path.join(self._uploads_dir, upload_id))
+
+        return {'Bucket': Bucket, 'Key': Key, 'UploadId': upload_id}
+
+
+    def upload_part(self, Bucket: str, Key: str, UploadId: str, PartNumber: int, Body, **kwargs):
+
+        self._write(os.path.join(self._uploads_dir, UploadId, f'{PartNumber:05d}'), Body)
+
+        return {'ETag': f'"{UploadId}-{PartNumber}"'}
+
+
+    def complete_multipart_upload(self, Bucket: str, Key: str, UploadId: str, MultipartUpload: dict, **kwargs):
+
+        upload_dir = os.path.join(self._uploads_dir, UploadId)
+
+        body = b''
+        for part in sorted(MultipartUpload['Parts'], key=lambda part: part['PartNumber']):
+            with open(os.path.join(upload_dir, f"{part['PartNumber']:05d}"), 'rb') as f:
+                body += f.read()
+
+        self._write(self._path(Bucket, Key), body)
+        shutil.rmtree(upload_dir)
+
+        return {'Bucket': Bucket, 'Key': Key}
+
+
+    def abort_multipart_upload(self, Bucket: str, Key: str, UploadId: str, **kwargs):
+
+        shutil.rmtree(os.path.join(self._uploads_dir, UploadId), ignore_errors=True)
+
+        return {'ResponseMetadata': {'HTTPStatusCode': 204}}
+
+
+
+# LOCAL QUERY ENGINE (SQLITE OVER CSV / PARQUET TABLES)
+# ----------
+
+# One connection per root directory (tables are loaded once per process)
+_connections = {}
+
+
+def _read_table(table_dir: str):
+    """
+    Read every csv / parquet file of a table directory into one dataframe (hive style key=value directories are added as columns)
+    """
+
+    table_dfs = []
+
+    for path in sorted(glob.glob(os.path.join(table_dir, '**', '*'), recursive=True)):
+
+        if path.endswith('.csv'):
+            df = pd.read_csv(path, dtype={col: str for col in TEXT_COLS})
+        elif path.endswith('.parquet'):
+            df = pd.read_parquet(path)
+        else:
+            continue
+
+        for part in os.path.relpath(os.path.dirname(path), table_dir).split(os.sep):
+            if '=' in part:
+                col, value = part.split('=', 1)
+                if col not in df.columns:
+                    df[col] = value
+
+        table_dfs.append(df)
+
+    if len(table_dfs) == 0:
+        raise FileNotFoundError(f'No csv or parquet files found for table {table_dir}')
+
+    return pd.concat(table_dfs, ignore_index=True)
+
+
+def _get_connection(root: str):
+
+    if root not in _connections:
+
+        connection = sqlite3.connect(':memory:')
+
+        for name, (n_args, func) in SQL_FUNCTIONS.items():
+            connection.create_function(name, n_args, func, deterministic=True)
+
+        # Each Athena database is attached as its own schema ("database"."table" resolves as in Athena)
+        for database in sorted(os.listdir(os.path.join(root, 'athena'))):
+            connection.execute(f"ATTACH DATABASE ':memory:' AS \"{database}\"")
+
+        _connections[root] = {'connection': connection, 'tables': set()}
+
+    return _connections[root]
+
+
+def run_local_query(query: str, database: str, root: str):
+    """
+    Run an Athena query against local csv / parquet tables with sqlite & return the results as strings (like Athena results)
+
+    Tables referenced as "database"."table" are loaded on first use.
+
+    Params:
+        query: SQL query
+        database: default database of the query
+        root: root directory of the local backend
+
+    """
+
+    state = _get_connection(root)
+    connection = state['connection']
+
+    # Load the tables referenced by the query
+    for table_database, table in set(re.findall(r'"([^"]+)"\."([^"]+)"', query)):
+        if (table_database, table) not in state['tables']:
+            table_df = _read_table(os.path.join(root, 'athena', table_database, table))
+            # Create the table in its database's schema & insert the rows (nulls as NULL)
+            create_sql = pd.io.sql.get_schema(table_df, table, con=connection).replace(f'"{table}"', f'"{table_database}"."{table}"', 1)
+            connection.execute(create_sql)
+            connection.executemany(f'INSERT INTO "{table_database}"."{table}" VALUES ({",".join(["?"] * len(table_df.columns))})',
+                                   table_df.astype(object).where(table_df.notna(), None).itertuples(index=False, name=None))
+            state['tables'].add((table_database, table))
+            logger.info(f'Loaded {len(table_df)} rows of {table_database}.{table} into the local query engine')
+
+    results_df = pd.read_sql_query(query, connection)
+
+    # Athena returns every value as a string (nulls as NaN)
+    return results_df.astype(object).where(results_df.isna(), results_df.astype(str))
@@ -0,0 +1,126 @@
+import json
+import os
+import datetime
+import pandas as pd
+from loguru import logger
+
+
+class SkuMemoStore:
+    """
+    Persisted memo store of per-sku run rate outputs, keyed by a fingerprint of each sku's windowed inputs.
+
+    Skus whose fingerprint matches the stored entry reuse the stored output instead of re-running the forecast.
+    Entries are evicted when they are older than ttl_days (TTL) and, if the store grows beyond max_entries,
+    the least recently used entries are evicted first (LRU).
+
+    Params:
+        path: path of the json file the store is persisted to
+        version: version of the forecast logic (entries written by a different version are discarded)
+        max_entries: maximum number of skus to keep in the store
+        ttl_days: number of days an entry can be reused before it is recomputed
+        force_recompute: if True, ignore stored entries (every sku is recomputed & the store is refreshed)
+
+    """
+
+    def __init__(self, path: str, version: str, max_entries: int = 20000, ttl_days: int = 7, force_recompute: bool = False):
+
+        self.path = path
+        self.version = version
+        self.max_entries = max_entries
+        self.ttl_days = ttl_days
+        self.force_recompute = force_recompute
+
+        self.hits = 0
+        self.misses = 0
+
+        self.entries = self._load()
+
+
+    def _load(self):
+
+        if self.force_recompute:
+            logger.info('Force recompute enabled - ignoring memo store')
+            return {}
+
+        if not os.path.exists(self.path):
+            logger.info(f'No memo store found at {self.path}')
+            return {}
+
+        try:
+            with open(self.path, 'r') as f:
+                store = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f'Unable to read memo store at {self.path} - starting with an empty store: {e}')
+            return {}
+
+        if store.get('version') != self.version:
+            logger.info(f"Memo store version changed ({store.get('version')} -> {self.version}) - starting with an empty store")
+            return {}
+
+        entries = store.get('entries', {})
+
+        # Evict expired entries (TTL)
+        cutoff = (datetime.datetime.now() - datetime.timedelta(days=self.ttl_days)).isoformat()
+        expired = [sku for sku, entry in entries.items() if entry['created_at'] < cutoff]
+        for sku in expired:
+            del entries[sku]
+
+        logger.info(f'Loaded {len(entries)} entries from memo store ({len(expired)} expired)')
+
+        return entries
+
+
+    def get(self, sku: str, fingerprint: str):
+        """
+        Return the stored output (as a dataframe) for the sku if its fingerprint matches, else None
+        """
+
+        entry = self.entries.get(sku)
+
+        if entry is None or entry['fingerprint'] != fingerprint:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        entry['last_used_at'] = datetime.datetime.now().isoformat()
+
+        return pd.DataFrame(entry['output']['records']).astype(entry['output']['dtypes'])
+
+
+    def put(self, sku: str, fingerprint: str, df: pd.DataFrame):
+        """
+        Store the output of the run rate calculation for the sku
+        """
+
+        now = datetime.datetime.now().isoformat()
+
+        # Records of python values (to_json rounds floats to 10 digits, memoized run rates must match recomputed ones exactly)
+        records = df.astype(object).where(df.notna(), None).to_dict('records')
+
+        self.entries[sku] = {'fingerprint': fingerprint,
+                             'created_at': now,
+                             'last_used_at': now,
+                             'output': {'records': records,
+                                        'dtypes': {col: str(dtype) for col, dtype in df.dtypes.items()}}}
+
+
+    def save(self):
+        """
+        Evict least recently used entries beyond max_entries & persist the store
+        """
+
+        if len(self.entries) > self.max_entries:
+            lru_skus = sorted(self.entries, key=lambda sku: self.entries[sku]['last_used_at'])[:len(self.entries) - self.max_entries]
+            for sku in lru_skus:
+                del self.entries[sku]
+            logger.info(f'Evicted {len(lru_skus)} least recently used entries from memo store')
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+
+        # Write to a temp file & rename so a failed run never leaves a partially written store
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': self.version, 'entries': self.entries}, f)
+        os.replace(tmp_path, self.path)
+
+        logger.info(f'Saved {len(self.entries)} entries to memo store ({self.hits} hits, {self.misses} misses)')
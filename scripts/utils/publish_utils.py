@@ -0,0 +1,252 @@
+import io
+import os
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from loguru import logger
+
+from models.pydantic_models import ShopifyDemandForecast
+from utils.aws_utils import check_path_for_objects, delete_s3_prefix_data, put_df_to_s3, put_object_to_s3, get_report_s3_key, read_report_csv, cache_report_csv
+from utils.forecast_diff import generate_forecast_changeset
+from utils.forecast_store import compile_forecast_store
+from utils.forecast_archive import archive_forecast_run
+
+
+# Number of concurrent uploads of the publish step (uploads share the pooled s3 client - see S3_MAX_POOL_CONNECTIONS)
+PUBLISH_WORKERS = int(os.environ.get('PUBLISH_WORKERS', 8))
+
+# Reads & uploads of the publish step run on this pool (threads are only started when used)
+_executor = ThreadPoolExecutor(max_workers=PUBLISH_WORKERS, thread_name_prefix='publish')
+
+
+# FUNCTION TO VALIDATE REPORT ROWS
+# ----------
+
+def validate_forecast(inventory_report_df: pd.DataFrame):
+    """
+    Validate each row of the report against the ShopifyDemandForecast model
+
+    Params:
+        inventory_report_df: dataframe of the report
+
+    Returns:
+        valid_df: dataframe of validated rows
+        invalid_df: dataframe of rows which failed validation
+
+    """
+
+    valid_data = []
+    invalid_data = []
+
+    # Iterate through each row, convert to dict, validate against Pydantic model
+    for idx, row in inventory_report_df.iterrows():
+        try:
+            # Validate row with Pydantic Model
+            validated_data = ShopifyDemandForecast(**row.to_dict())
+            valid_data.append(validated_data.__dict__)
+        except Exception as e:
+            logger.error(f"Data validation failed: {e}")
+            logger.error(row.to_dict())
+            invalid_data.append(row.to_dict())
+
+    # Convert back to df
+    valid_df = pd.DataFrame(valid_data)
+    invalid_df = pd.DataFrame(invalid_data)
+
+    return valid_df, invalid_df
+
+
+
+# FUNCTION TO PREFETCH THE PUBLISHED REPORTS THE PUBLISH STEP DIFFS AGAINST
+# ----------
+
+def prefetch_published_reports(current_date, bucket: str, cache_dir: str):
+    """
+    Start reading the previous day's report & any report already published for current_date in the background
+    (so the reads overlap with validation) - pass the result to publish_forecast()
+
+    Params:
+        current_date: date of the report partition
+        bucket: S3 bucket
+        cache_dir: local cache directory
+
+    Returns:
+        dict of 'previous' & 'published' futures (each resolves to a dataframe, or None if the report does not exist)
+
+    """
+
+    return {'previous': _executor.submit(read_report_csv, bucket=bucket, s3_key=get_report_s3_key('shopify_demand_forecasting', current_date - timedelta(days=1)), cache_dir=cache_dir),
+            'published': _executor.submit(_read_published_report, bucket=bucket, s3_key=get_report_s3_key('shopify_demand_forecasting', current_date), cache_dir=cache_dir)}
+
+
+def _read_published_report(bucket: str, s3_key: str, cache_dir: str):
+    """
+    Report of a partition if it is published in S3 (a locally cached copy is only used if the partition exists)
+    """
+
+    if check_path_for_objects(bucket=bucket, s3_prefix=s3_key) == False:
+        return None
+
+    return read_report_csv(bucket=bucket, s3_key=s3_key, cache_dir=cache_dir)
+
+
+def _report_unchanged(report_df: pd.DataFrame, published_df: pd.DataFrame):
+    """
+    True if a report has the same rows (in any order) & columns as the published report (compared after a csv round trip,
+    like the published copy, so dtypes & float formatting match)
+    """
+
+    current_df = pd.read_csv(io.StringIO(report_df.to_csv(index=False)))
+
+    if list(current_df.columns) != list(published_df.columns) or len(current_df) != len(published_df):
+        return False
+
+    def sort_rows(df):
+        df = df.copy()
+        df['sku'] = df['sku'].astype(str)
+        return df.sort_values(list(df.columns)).reset_index(drop=True)
+
+    return sort_rows(current_df).equals(sort_rows(published_df))
+
+
+def _replace_s3_object(s3_client, bucket: str, s3_key: str, df: pd.DataFrame = None, body=None):
+    """
+    Replace the object(s) of a partition with a dataframe (csv) or body (idempotent reruns)
+    """
+
+    if check_path_for_objects(bucket=bucket, s3_prefix=s3_key) == True:
+        delete_s3_prefix_data(bucket=bucket, s3_prefix=s3_key)
+
+    if df is not None:
+        put_df_to_s3(s3_client=s3_client, df=df, bucket=bucket, s3_key=s3_key)
+    else:
+        put_object_to_s3(s3_client=s3_client, body=body, bucket=bucket, s3_key=s3_key)
+
+
+
+# FUNCTION TO PUBLISH THE REPORT & ITS ARTIFACTS
+# ----------
+
+def publish_forecast(s3_client, inventory_report_df: pd.DataFrame, valid_df: pd.DataFrame, rollup_df: pd.DataFrame, accuracy_df: pd.DataFrame, current_date, bucket: str, cache_dir: str, report_upload=None, replenishment_df: pd.DataFrame = None, published_reports: dict = None):
+    """
+    Publish a validated report: changeset vs the previous day, rollups, replenishment plan, accuracy accumulators,
+    compiled lookup store & archive segment are uploaded concurrently, then the report (only rewritten if changed).
+
+    The report partition is written last, so it only becomes visible once every artifact has been published
+    (if any upload fails the exception is raised & the report is not written).
+
+    Params:
+        s3_client: boto3 s3 client (shared by the upload threads)
+        inventory_report_df: dataframe of the report
+        valid_df: dataframe of validated report rows
+        rollup_df: dataframe of hierarchical rollups
+        accuracy_df: dataframe of forecast accuracy accumulators (not written if empty)
+        current_date: date of the report partition
+        bucket: S3 bucket
+        cache_dir: local cache directory
+        report_upload: MultipartCsvUpload of the report (chunked runs stream the report - the upload is completed instead of writing the report)
+        replenishment_df: dataframe of planned replenishment orders (not written if None)
+        published_reports: futures of prefetch_published_reports() (started here if None)
+
+    """
+
+    if published_reports is None:
+        published_reports = prefetch_published_reports(current_date=current_date, bucket=bucket, cache_dir=cache_dir)
+
+    # Configure S3 Prefix
+    S3_PREFIX_PATH = get_report_s3_key('shopify_demand_forecasting', current_date)
+
+
+    # DIFF AGAINST PREVIOUS DAY'S REPORT =======================================
+
+    def publish_changeset():
+
+        previous_report_df = published_reports['previous'].result()
+
+        if previous_report_df is None:
+            logger.warning("No report found for the previous day - all skus will be reported as new")
+            previous_report_df = inventory_report_df.iloc[0:0]
+
+        changeset_df = generate_forecast_changeset(current_df=inventory_report_df, previous_df=previous_report_df)
+
+        # Write changeset to s3
+        _replace_s3_object(s3_client, bucket, get_report_s3_key('shopify_demand_forecasting_changes', current_date), df=changeset_df)
+
+
+    # ROLLUPS, REPLENISHMENT & ACCURACY =======================================
+
+    def publish_accuracy():
+
+        # Write forecast accuracy accumulators to s3 (& local cache, read back by the next run)
+        S3_ACCURACY_PREFIX_PATH = get_report_s3_key('shopify_demand_forecasting_accuracy', current_date)
+
+        _replace_s3_object(s3_client, bucket, S3_ACCURACY_PREFIX_PATH, df=accuracy_df)
+        cache_report_csv(df=accuracy_df, s3_key=S3_ACCURACY_PREFIX_PATH, cache_dir=cache_dir)
+
+
+    # LOOKUP STORE =======================================
+
+    def publish_store():
+
+        # Compile validated rows into the sku indexed lookup store
+        S3_STORE_PREFIX_PATH = get_report_s3_key('shopify_demand_forecasting_store', current_date, extension='bin')
+
+        store_bytes = compile_forecast_store(valid_df)
+
+        # Write store to the local cache (served by forecast_lookup_api.py) & s3
+        os.makedirs(os.path.dirname(os.path.join(cache_dir, S3_STORE_PREFIX_PATH)), exist_ok=True)
+        with open(os.path.join(cache_dir, S3_STORE_PREFIX_PATH), 'wb') as f:
+            f.write(store_bytes)
+
+        _replace_s3_object(s3_client, bucket, S3_STORE_PREFIX_PATH, body=store_bytes)
+
+
+    # UPLOAD ARTIFACTS CONCURRENTLY =======================================
+
+    uploads = {'changeset': _executor.submit(publish_changeset),
+               # Rollups (product_type, product_category & total levels)
+               'rollups': _executor.submit(_replace_s3_object, s3_client, bucket, get_report_s3_key('shopify_demand_forecasting_rollups', current_date), df=rollup_df),
+               'store': _executor.submit(publish_store),
+               # Append validated rows to the historical forecast archive (compacting previous months)
+               'archive': _executor.submit(archive_forecast_run, s3_client=s3_client, valid_df=valid_df, run_date=current_date, bucket=bucket, cache_dir=cache_dir)}
+
+    # Replenishment plan (reorder points, order dates & quantities of every sku)
+    if replenishment_df is not None:
+        uploads['replenishment'] = _executor.submit(_replace_s3_object, s3_client, bucket, get_report_s3_key('shopify_demand_forecasting_replenishment', current_date), df=replenishment_df)
+
+    if len(accuracy_df) > 0:
+        uploads['accuracy'] = _executor.submit(publish_accuracy)
+
+    # Wait for every upload (the first failure is raised - the report is not published)
+    failed = []
+
+    for name, upload in uploads.items():
+        if upload.exception() is not None:
+            logger.error(f'Failed to publish {name}: {upload.exception()}')
+            failed.append(name)
+
+    if len(failed) > 0:
+        if report_upload is not None:
+            report_upload.abort()
+        raise uploads[failed[0]].exception()
+
+
+    # WRITE REPORT (LAST - THE PARTITION BECOMES VISIBLE) =======================================
+
+    if report_upload is not None:
+
+        # Chunked runs streamed the report with a multipart upload - completing it replaces the partition
+        report_upload.complete()
+
+    else:
+
+        # Only republish an existing partition if the report changed since it was published (rerun of the same day)
+        published_report_df = published_reports['published'].result()
+
+        if published_report_df is not None and _report_unchanged(inventory_report_df, published_report_df):
+            logger.info(f'No changes since {S3_PREFIX_PATH} was published - skipping republish')
+        else:
+            _replace_s3_object(s3_client, bucket, S3_PREFIX_PATH, df=inventory_report_df)
+
+    # Cache report locally (to diff against on the next run)
+    cache_report_csv(df=inventory_report_df, s3_key=S3_PREFIX_PATH, cache_dir=cache_dir)
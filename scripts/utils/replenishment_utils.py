@@ -0,0 +1,172 @@
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from utils.forecast_utils import calculate_stockout_dates
+from utils.scenario_utils import resolve_scoped_params
+
+
+# Replenishment parameter table columns (rows scoped to a sku, a product_type or neither - sku rows override product_type rows, which override unscoped rows):
+#   product_type, sku           scope of the row (blank = every sku)
+#   lead_time_days              days from placing an order to the stock being on hand
+#   safety_stock_days           days of demand kept on hand on top of lead time demand
+#   coverage_days               days of demand each order covers once it arrives
+#   moq                         minimum order quantity (units)
+#   pack_size                   orders are rounded up to a multiple of the pack size (units)
+#   production_line             production line the sku is made on (lines share the capacity in the capacity table)
+REPLENISHMENT_PARAMS = {'lead_time_days': 0.0,
+                        'safety_stock_days': 0.0,
+                        'coverage_days': 90.0,
+                        'moq': 0.0,
+                        'pack_size': 1.0,
+                        'production_line': 'default'}
+
+# Orders due further out than the planning horizon are not planned (longest forecast horizon)
+PLANNING_HORIZON_DAYS = 150
+
+# Columns of the inventory details carried into the replenishment report
+KEY_COLS = ['sku','sku_name','product_type','product_category','upper_bound','inventory_on_hand','days_of_stock_on_hand','forecasted_stockout_date']
+
+
+# FUNCTION TO READ REPLENISHMENT PARAMETERS & LINE CAPACITY
+# ----------
+
+def read_replenishment_params(params_path: str = None, capacity_path: str = None):
+    """
+    Read the replenishment parameter table & the capacity of each production line (csv) - blank parameters are left blank, so they fall
+    through to the next scope (defaults are only applied by resolve_scoped_params())
+
+    Params:
+        params_path: path of the parameter csv (product_type, sku, lead_time_days, safety_stock_days, coverage_days, moq, pack_size, production_line) - defaults for every sku if not set
+        capacity_path: path of the capacity csv (production_line, daily_capacity) - lines without a capacity are unconstrained
+
+    Returns:
+        params_df: one row per scope
+        capacity_df: one row per production line
+
+    """
+
+    params_df = pd.read_csv(params_path, dtype={'product_type': str, 'sku': str, 'production_line': str}) if params_path else pd.DataFrame()
+
+    for col in ['product_type','sku']:
+        if col not in params_df.columns:
+            params_df[col] = pd.Series(dtype=object)
+
+    for col in REPLENISHMENT_PARAMS:
+        if col not in params_df.columns:
+            params_df[col] = np.nan
+        if col != 'production_line':
+            params_df[col] = pd.to_numeric(params_df[col])
+
+    # Only the parameters a row sets are checked
+    if (params_df['pack_size'].dropna() <= 0).any():
+        raise ValueError('pack_size must be positive')
+
+    if (params_df[['lead_time_days','safety_stock_days','coverage_days','moq']].stack() < 0).any():
+        raise ValueError('lead_time_days, safety_stock_days, coverage_days & moq must not be negative')
+
+    duplicated = params_df.duplicated(['product_type','sku'])
+    if duplicated.any():
+        raise ValueError(f"Replenishment parameter rows with the same scope: {params_df.loc[duplicated, ['product_type','sku']].values.tolist()}")
+
+    capacity_df = pd.read_csv(capacity_path, dtype={'production_line': str}) if capacity_path else pd.DataFrame(columns=['production_line','daily_capacity'])
+
+    if capacity_df['production_line'].duplicated().any():
+        raise ValueError('Production lines with more than one capacity')
+
+    if (pd.to_numeric(capacity_df['daily_capacity']) <= 0).any():
+        raise ValueError('daily_capacity must be positive')
+
+    logger.info(f'Read {len(params_df)} replenishment parameter rows & {len(capacity_df)} production line capacities')
+
+    return params_df, capacity_df
+
+
+
+# FUNCTION TO PLAN REPLENISHMENT ORDERS
+# ----------
+
+def plan_replenishment(inventory_details_df: pd.DataFrame, params_df: pd.DataFrame, capacity_df: pd.DataFrame):
+    """
+    Plan the next replenishment order of every sku (reorder point, order date & quantity) from the upper bound of its daily
+    run rate, lead time, safety stock, MOQ & pack size, then schedule the orders of each production line against its capacity.
+
+    Orders are sized to bring stock back up to (lead time + safety stock + coverage) days of demand when they are placed,
+    rounded up to the pack size & MOQ. Each line produces an order at its daily capacity from the day the order is placed (orders placed
+    the same day earliest need date first, later orders never use capacity before they are placed), so orders which cannot be produced
+    by the day they are needed are flagged with the capacity delay (greedy heuristic - no re-sequencing).
+
+    Params:
+        inventory_details_df: dataframe of run rates & inventory on hand (one row per sku)
+        params_df: replenishment parameter table (read_replenishment_params())
+        capacity_df: daily capacity of each production line (read_replenishment_params())
+
+    Returns:
+        replenishment_df: one row per sku with its parameters, reorder_point, order_up_to_level, order_qty, order_date,
+                          planned_arrival_date, capacity_delay_days & stockout_risk
+
+    """
+
+    df = inventory_details_df.copy()
+    df['sku'] = df['sku'].astype(str)
+
+    # Days of stock on hand & forecasted stockout date of every sku (sorted by sku, so single node & merged runs plan in the same order)
+    df = calculate_stockout_dates(df)[KEY_COLS].sort_values('sku', kind='stable').reset_index(drop=True)
+
+    # Parameters of each sku (sku rows > product_type rows > unscoped rows > defaults)
+    df = pd.concat([df, resolve_scoped_params(df, params_df, REPLENISHMENT_PARAMS)], axis=1)
+
+    demand = df['upper_bound'].clip(lower=0)
+    inventory = df['inventory_on_hand'].clip(lower=0)
+
+    # Reorder point (lead time demand + safety stock) & order up to level
+    safety_stock = np.ceil(demand * df['safety_stock_days'])
+    df['reorder_point'] = (np.ceil(demand * df['lead_time_days']) + safety_stock).astype(int)
+    df['order_up_to_level'] = (np.ceil(demand * (df['lead_time_days'] + df['coverage_days'])) + safety_stock).astype(int)
+
+    # Days until inventory reaches the reorder point (orders are only planned for skus with demand, within the planning horizon)
+    has_demand = demand > 0
+    days_until_order = np.floor((inventory - df['reorder_point']).clip(lower=0) / demand.where(has_demand, 1))
+    planned = has_demand & (days_until_order <= PLANNING_HORIZON_DAYS)
+
+    # Order qty = order up to level - projected inventory on the order date, rounded up to the pack size & MOQ
+    projected_inventory = inventory - demand * days_until_order
+    order_qty = np.ceil((df['order_up_to_level'] - projected_inventory).clip(lower=0) / df['pack_size']) * df['pack_size']
+    order_qty = np.where(order_qty > 0, np.maximum(order_qty, np.ceil(df['moq'] / df['pack_size']) * df['pack_size']), 0)
+
+    df['order_qty'] = np.where(planned, order_qty, 0).astype(int)
+    planned &= df['order_qty'] > 0
+
+    df['reorder_now'] = planned & (days_until_order == 0)
+
+    # Schedule each line's orders from the day they are placed (orders placed the same day by the day they are needed)
+    need_by_days = (days_until_order + df['lead_time_days']).where(planned)
+
+    capacity = df['production_line'].map(capacity_df.set_index('production_line')['daily_capacity'].astype(float))
+
+    order = np.lexsort((df['sku'].values, need_by_days.fillna(np.inf).values, days_until_order.where(planned).fillna(np.inf).values))
+    scheduled_df = pd.DataFrame({'production_line': df['production_line'],
+                                 'qty': df['order_qty'].where(planned, 0),
+                                 'release_qty': days_until_order.where(planned, 0) * capacity}).iloc[order]
+
+    # Completion in units of line capacity since today: an order starts once it is placed (order day x daily capacity) or once
+    # the line's previous order is done, whichever is later - completion_k = cumulative qty_k + max over j <= k of (release_j - cumulative qty_j-1)
+    cumulative_qty = scheduled_df.groupby('production_line')['qty'].cumsum()
+    completion_qty = cumulative_qty + (scheduled_df['release_qty'] - (cumulative_qty - scheduled_df['qty'])).groupby(scheduled_df['production_line']).cummax()
+
+    completion_days = np.ceil(completion_qty.reindex(df.index) / capacity).fillna(0)
+    df['capacity_delay_days'] = (completion_days - need_by_days).clip(lower=0).where(planned, 0).astype(int)
+
+    # Order & arrival dates
+    today = pd.to_datetime('today').normalize()
+    arrival_days = need_by_days + df['capacity_delay_days']
+
+    df['order_date'] = (today + pd.to_timedelta(days_until_order.where(planned), unit='D')).dt.strftime('%Y-%m-%d')
+    df['planned_arrival_date'] = (today + pd.to_timedelta(arrival_days, unit='D')).dt.strftime('%Y-%m-%d')
+
+    # Stock runs out before the order arrives
+    df['stockout_risk'] = planned & (arrival_days > df['days_of_stock_on_hand'])
+
+    logger.info(f"Planned {int(planned.sum())} replenishment orders ({int(df['reorder_now'].sum())} due now, {int((df['capacity_delay_days'] > 0).sum())} delayed by capacity)")
+
+    return df
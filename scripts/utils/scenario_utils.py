@@ -0,0 +1,183 @@
+import re
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from utils.forecast_utils import calculate_production_needs, calculate_stockout_dates
+
+
+# Scenario table columns (one or more rows per scenario):
+#   scenario                    name of the scenario
+#   product_type, sku           scope of the row (blank = every sku) - sku rows override product_type rows, which override global rows
+#   demand_multiplier           multiplier of the daily run rate (lower & upper bound)
+#   inventory_adjustment_days   days of (scenario) demand added to inventory on hand (negative = stock lost)
+#   inventory_adjustment_units  units added to inventory on hand (negative = stock lost)
+#   horizons                    forecast horizons in days, separated by ';' (blank = 90;120;150)
+SCENARIO_PARAMS = {'demand_multiplier': 1.0,
+                   'inventory_adjustment_days': 0.0,
+                   'inventory_adjustment_units': 0.0}
+
+DEFAULT_HORIZONS = [90, 120, 150]
+
+# Columns of the run rate / inventory details that scenarios are applied to
+BASE_COLS = ['sku','sku_name','forecast','lower_bound','upper_bound','last_7_actual','last_90_actual','partition_date','product_type','product_category','inventory_on_hand']
+
+
+# FUNCTION TO READ A SCENARIO TABLE
+# ----------
+
+def read_scenarios(path: str):
+    """
+    Read & validate a scenario table (csv) - blank parameters are left blank, so they fall through to the next scope
+    (defaults are only applied by resolve_scoped_params())
+
+    Params:
+        path: path of the scenario csv
+
+    Returns:
+        scenarios_df: one row per scenario & scope
+        horizons: dict of scenario -> list of horizons
+
+    """
+
+    scenarios_df = pd.read_csv(path, dtype={'scenario': str, 'product_type': str, 'sku': str, 'horizons': str})
+
+    if 'scenario' not in scenarios_df.columns or scenarios_df['scenario'].isna().any():
+        raise ValueError(f'Every row of {path} needs a scenario name')
+
+    for col in ['product_type','sku','horizons']:
+        if col not in scenarios_df.columns:
+            scenarios_df[col] = np.nan
+
+    for col in SCENARIO_PARAMS:
+        if col not in scenarios_df.columns:
+            scenarios_df[col] = np.nan
+        scenarios_df[col] = pd.to_numeric(scenarios_df[col])
+
+    if (scenarios_df['demand_multiplier'] < 0).any():
+        raise ValueError('demand_multiplier must not be negative')
+
+    duplicated = scenarios_df.duplicated(['scenario','product_type','sku'])
+    if duplicated.any():
+        raise ValueError(f"Scenario rows with the same scope: {scenarios_df.loc[duplicated, 'scenario'].unique()}")
+
+    # Horizons of each scenario (first non blank value)
+    horizons = {}
+    for scenario, values in scenarios_df.groupby('scenario', sort=False)['horizons']:
+        values = values.dropna()
+        horizons[scenario] = sorted({int(h) for h in values.iloc[0].split(';') if h.strip()}) if len(values) > 0 else DEFAULT_HORIZONS
+
+    logger.info(f'Read {len(horizons)} scenarios ({len(scenarios_df)} rows) from {path}')
+
+    return scenarios_df, horizons
+
+
+
+# FUNCTION TO RESOLVE SKU / PRODUCT_TYPE SCOPED PARAMETERS
+# ----------
+
+def resolve_scoped_params(df: pd.DataFrame, params_table: pd.DataFrame, defaults: dict, key_cols: list = []):
+    """
+    Resolve the parameters of each row of df from a table of rows scoped to a sku, a product_type or neither
+    (sku rows > product_type rows > unscoped rows > defaults)
+
+    Params:
+        df: dataframe with sku & product_type columns (+ key_cols)
+        params_table: parameter table with key_cols, product_type, sku & one column per parameter (blank scope = every sku)
+        defaults: dict of parameter -> default value
+        key_cols: additional columns both tables are matched on (eg. scenario)
+
+    Returns:
+        params_df: one row per row of df (same index) with one column per parameter
+
+    """
+
+    param_cols = list(defaults.keys())
+
+    scopes = [(params_table['sku'].notna(), key_cols + ['sku']),
+              (params_table['sku'].isna() & params_table['product_type'].notna(), key_cols + ['product_type']),
+              (params_table['sku'].isna() & params_table['product_type'].isna(), key_cols)]
+
+    params_df = pd.DataFrame(index=df.index, columns=param_cols, dtype=object)
+
+    for mask, keys in scopes:
+        scope_df = params_table.loc[mask, keys + param_cols]
+        if len(scope_df) == 0:
+            continue
+        if len(keys) == 0:
+            matched = pd.DataFrame([scope_df.iloc[0].values] * len(df), index=df.index, columns=param_cols)
+        else:
+            matched = df[keys].reset_index(drop=True).merge(scope_df, on=keys, how='left')[param_cols].set_axis(df.index)
+        params_df = params_df.combine_first(matched)
+
+    return params_df.fillna(defaults).infer_objects()[param_cols]
+
+
+
+# FUNCTION TO EVALUATE A BATCH OF SCENARIOS
+# ----------
+
+def evaluate_scenarios(inventory_details_df: pd.DataFrame, scenarios_df: pd.DataFrame, horizons: dict):
+    """
+    Apply every scenario to the run rates & inventory of every sku as one vectorized batch
+    (one row per scenario & sku) & recalculate production needs & forecasted stockout dates
+
+    Params:
+        inventory_details_df: dataframe of run rates & inventory on hand (one row per sku)
+        scenarios_df: scenario table (read_scenarios())
+        horizons: dict of scenario -> list of horizons (read_scenarios())
+
+    Returns:
+        scenario_df: one row per scenario & sku, with forecast / production columns for the union of all horizons
+
+    """
+
+    base_df = inventory_details_df[BASE_COLS].copy()
+    base_df['sku'] = base_df['sku'].astype(str)
+
+    scenario_names = list(horizons.keys())
+
+    # Cross join skus & scenarios
+    scenario_df = base_df.loc[np.tile(np.arange(len(base_df)), len(scenario_names))].reset_index(drop=True)
+    scenario_df.insert(0, 'scenario', np.repeat(scenario_names, len(base_df)))
+
+    # Resolve the parameters of each scenario & sku (sku rows > product_type rows > global rows > defaults)
+    params_df = resolve_scoped_params(scenario_df, scenarios_df, SCENARIO_PARAMS, key_cols=['scenario'])
+
+    # Apply demand multipliers & inventory adjustments
+    scenario_df['lower_bound'] = scenario_df['lower_bound'] * params_df['demand_multiplier']
+    scenario_df['upper_bound'] = scenario_df['upper_bound'] * params_df['demand_multiplier']
+
+    adjusted_inventory = scenario_df['inventory_on_hand'] + params_df['inventory_adjustment_units'] + params_df['inventory_adjustment_days'] * scenario_df['upper_bound']
+    scenario_df['inventory_on_hand'] = np.round(adjusted_inventory.clip(lower=0)).astype(int)
+
+    # Production needs over every horizon used by any scenario & stockout dates
+    all_horizons = sorted({h for scenario_horizons in horizons.values() for h in scenario_horizons})
+
+    scenario_df = calculate_production_needs(scenario_df, horizons=all_horizons)
+    scenario_df = calculate_stockout_dates(scenario_df)
+
+    logger.info(f'Evaluated {len(scenario_names)} scenarios x {len(base_df)} skus')
+
+    return scenario_df
+
+
+def format_scenario_report(scenario_report_df: pd.DataFrame, horizons: list):
+    """
+    Report of one scenario (rows of the scenario from evaluate_scenarios(), with only the forecast / production columns of its horizons)
+    """
+
+    horizon_cols = [f'{kind}_{h}_days' for h in horizons for kind in ['forecast','production_next']]
+
+    return scenario_report_df[['scenario'] + BASE_COLS + horizon_cols + ['days_of_stock_on_hand','forecasted_stockout_date']]
+
+
+def get_scenario_s3_key(scenario: str, report_date):
+    """
+    S3 key of a scenario report (reports/shopify_demand_forecasting_scenarios/year=/month=/day=/scenario=<scenario>/)
+    """
+
+    report_date = pd.to_datetime(report_date)
+    scenario = re.sub(r'[^A-Za-z0-9_\-]+', '_', scenario)
+
+    return f"reports/shopify_demand_forecasting_scenarios/year={report_date.strftime('%Y')}/month={report_date.strftime('%m')}/day={report_date.strftime('%d')}/scenario={scenario}/shopify_demand_forecasting_scenarios_{report_date.strftime('%Y%m%d')}.csv"
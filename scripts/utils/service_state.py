@@ -0,0 +1,266 @@
+import threading
+import time
+import datetime
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from utils.forecast_utils import get_week_id, generate_daily_run_rate, generate_run_rates, build_inventory_details, calculate_production_needs, calculate_stockout_dates
+
+
+# Columns of the forecast kept per sku (same as the daily report)
+FORECAST_COLS = ['sku_name','forecast','lower_bound','upper_bound','last_7_actual','last_90_actual','partition_date',
+                 'product_type','product_category','inventory_on_hand',
+                 'forecast_90_days','forecast_120_days','forecast_150_days',
+                 'production_next_90_days','production_next_120_days','production_next_150_days',
+                 'days_of_stock_on_hand','forecasted_stockout_date']
+
+# Horizons of the production needs kept per sku (same as the daily report)
+PRODUCTION_HORIZONS = [90, 120, 150]
+
+
+class SkuForecastState:
+    """
+    In-memory per-sku forecast state, updated incrementally from order & inventory events.
+
+    Events only touch the affected sku: inventory on hand, production needs, days_of_stock_on_hand & forecasted_stockout_date
+    are updated immediately (constant work per event), while the sku is flagged so its run rate is recalculated on the next
+    refresh_run_rates() (which only re-runs generate_daily_run_rate for the flagged skus).
+
+    Orders placed after a sku's latest inventory partition are deducted from its inventory on hand, so intraday
+    stockout risk is visible before the next inventory snapshot lands.
+
+    Methods are thread safe, so refresh_run_rates() can run in a worker thread while events are applied: the state is only
+    locked while it is read / updated, not while run rates are calculated.
+
+    Params:
+        daily_qty_sold_df: dataframe of qty sold per sku per day (with 'week' column) to bootstrap the state from
+        inventory_df: dataframe of inventory on hand per sku per day to bootstrap the state from
+
+    """
+
+    def __init__(self, daily_qty_sold_df: pd.DataFrame, inventory_df: pd.DataFrame):
+
+        # Per-sku history & records appended by events since the last refresh (consolidated on refresh)
+        self.orders = {sku: df.reset_index(drop=True) for sku, df in daily_qty_sold_df.groupby('sku')}
+        self.inventory = {sku: df.reset_index(drop=True) for sku, df in inventory_df.groupby('sku')}
+        self.pending_orders = {}
+        self.pending_inventory = {}
+        self.latest_inventory_date = inventory_df.groupby('sku')['partition_date'].max().to_dict()
+
+        # Bootstrap forecast of every sku
+        product_run_rate_df = generate_run_rates(daily_qty_sold_df=daily_qty_sold_df, inventory_df=inventory_df)
+        inventory_details_df = build_inventory_details(product_run_rate_df=product_run_rate_df, inventory_df=inventory_df)
+        self.forecast = calculate_stockout_dates(inventory_details_df).set_index('sku')[FORECAST_COLS].to_dict('index')
+
+        self.dirty_skus = set()
+        self.event_latencies = []
+
+        # Guards the state (held briefly) & serializes refreshes
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+        logger.info(f'Bootstrapped forecast state for {len(self.forecast)} skus')
+
+
+    def _get_or_create_sku(self, sku: str, event: dict):
+
+        if sku not in self.forecast:
+
+            logger.info(f'New sku {sku} - adding to forecast state')
+
+            self.forecast[sku] = {'sku_name': event.get('sku_name'), 'forecast': 'forecast_daily',
+                                  'lower_bound': 0.0, 'upper_bound': 0.0, 'last_7_actual': 0, 'last_90_actual': 0,
+                                  'partition_date': pd.to_datetime(pd.to_datetime('today') - timedelta(1)).strftime('%Y-%m-%d'),
+                                  'product_type': event.get('product_type', 'Unknown'), 'product_category': event.get('product_category', 'Unknown'),
+                                  'inventory_on_hand': self._latest_inventory_on_hand(sku)}
+            self.forecast[sku].update(calculate_production_needs(pd.DataFrame([self.forecast[sku]])).iloc[0].to_dict())
+
+        return self.forecast[sku]
+
+
+    def _latest_inventory_on_hand(self, sku: str):
+
+        if sku not in self.inventory or len(self.inventory[sku]) == 0:
+            return 0
+
+        inventory_df = self.inventory[sku]
+
+        return int(inventory_df.loc[inventory_df['partition_date']==self.latest_inventory_date[sku],'inventory_on_hand'].iloc[-1])
+
+
+    def _update_production_needs(self, sku: str):
+
+        row = self.forecast[sku]
+
+        # Same as calculate_production_needs() for one sku (without building a dataframe per event)
+        for horizon in PRODUCTION_HORIZONS:
+            row[f'forecast_{horizon}_days'] = float(round(row['upper_bound'] * horizon, 0))
+            row[f'production_next_{horizon}_days'] = max(row[f'forecast_{horizon}_days'] - row['inventory_on_hand'], 0.0)
+
+
+    def _update_stockout(self, sku: str):
+
+        row = self.forecast[sku]
+
+        # If daily run rate is 0 (forecasting zero demand) or there is no inventory on hand, set days of stock on hand to 0
+        if row['upper_bound'] > 0 and row['inventory_on_hand'] > 0:
+            row['days_of_stock_on_hand'] = float(int(row['inventory_on_hand'] / row['upper_bound']))
+        else:
+            row['days_of_stock_on_hand'] = 0.0
+
+        row['forecasted_stockout_date'] = (pd.to_datetime('today') + timedelta(max(row['days_of_stock_on_hand'],0))).strftime('%Y-%m-%d')
+
+
+    def apply_event(self, event: dict):
+        """
+        Apply an order or inventory event to the state of the affected sku
+
+        Order event: {'type': 'order', 'sku', 'qty_sold', 'order_date' (default today), 'sku_name', 'product_type', 'product_category'}
+        Inventory event: {'type': 'inventory', 'sku', 'inventory_on_hand', 'partition_date' (default today)}
+
+        """
+
+        start = time.perf_counter()
+
+        with self._lock:
+
+            sku = str(event['sku'])
+            row = self._get_or_create_sku(sku, event)
+
+            if event['type'] == 'order':
+
+                order_date = pd.to_datetime(event.get('order_date', pd.to_datetime('today'))).strftime('%Y-%m-%d')
+                qty_sold = int(event['qty_sold'])
+
+                self.pending_orders.setdefault(sku, []).append({'partition_date': order_date, 'order_date': order_date, 'sku': sku,
+                                                        'sku_name': event.get('sku_name', row['sku_name']),
+                                                        'product_category': row['product_category'], 'product_type': row['product_type'],
+                                                        'qty_sold': qty_sold,
+                                                        'week': get_week_id(order_date)})
+
+                # Deduct orders placed after the latest inventory snapshot from inventory on hand
+                if order_date > self.latest_inventory_date.get(sku, ''):
+                    row['inventory_on_hand'] = max(row['inventory_on_hand'] - qty_sold, 0)
+
+                self.dirty_skus.add(sku)
+
+            elif event['type'] == 'inventory':
+
+                partition_date = pd.to_datetime(event.get('partition_date', pd.to_datetime('today'))).strftime('%Y-%m-%d')
+
+                self.pending_inventory.setdefault(sku, []).append({'partition_date': partition_date, 'sku': sku,
+                                                                   'inventory_on_hand': int(event['inventory_on_hand'])})
+
+                if partition_date >= self.latest_inventory_date.get(sku, ''):
+                    self.latest_inventory_date[sku] = partition_date
+                    row['inventory_on_hand'] = int(event['inventory_on_hand'])
+
+                self.dirty_skus.add(sku)
+
+            else:
+                logger.warning(f"Unknown event type: {event['type']}")
+                return
+
+            # Inventory on hand may have changed
+            self._update_production_needs(sku)
+            self._update_stockout(sku)
+
+            self.event_latencies.append(time.perf_counter() - start)
+
+
+    def _history_df(self, history: dict, pending: dict, sku: str, columns: list):
+
+        # Consolidate records appended by events into the sku's history
+        df = history.get(sku, pd.DataFrame(columns=columns))
+
+        if sku in pending:
+            df = pd.concat([df, pd.DataFrame(pending.pop(sku), columns=columns)], ignore_index=True)
+
+        return df
+
+
+    def refresh_run_rates(self):
+        """
+        Recalculate the run rate (& production needs / stockout date) of skus affected by events since the last refresh
+        """
+
+        with self._refresh_lock:
+
+            with self._lock:
+                dirty_skus = list(self.dirty_skus)
+                self.dirty_skus = set()
+
+            for sku in dirty_skus:
+
+                # Consolidate the events of the sku into its history
+                with self._lock:
+
+                    orders_df = self._history_df(self.orders, self.pending_orders, sku, ['partition_date','order_date','sku','sku_name','product_category','product_type','qty_sold','week'])
+                    inventory_df = self._history_df(self.inventory, self.pending_inventory, sku, ['partition_date','sku','inventory_on_hand'])
+
+                    # Skus without recent orders keep their current run rate (production needs follow their inventory)
+                    if len(orders_df) == 0:
+                        self.inventory[sku] = inventory_df.drop_duplicates(['partition_date','sku'],keep='last')
+                        self._update_production_needs(sku)
+                        self._update_stockout(sku)
+                        continue
+
+                    # Same day events are aggregated (as in the daily extract)
+                    orders_df = orders_df.groupby(['partition_date','order_date','sku','sku_name','product_category','product_type','week'],as_index=False,dropna=False)['qty_sold'].sum()
+                    inventory_df = inventory_df.drop_duplicates(['partition_date','sku'],keep='last')
+                    self.orders[sku] = orders_df
+                    self.inventory[sku] = inventory_df
+
+                # Run rate is calculated without holding the lock (events are applied meanwhile)
+                run_rate = generate_daily_run_rate(daily_qty_sold_df=orders_df, inventory_df=inventory_df, sku_value=sku).iloc[0].to_dict()
+
+                with self._lock:
+
+                    row = self.forecast[sku]
+                    for col in ['sku_name','lower_bound','upper_bound','last_7_actual','last_90_actual','partition_date']:
+                        row[col] = run_rate[col]
+                    for col in ['lower_bound','upper_bound','last_7_actual','last_90_actual']:
+                        row[col] = 0 if pd.isna(row[col]) else row[col]
+
+                    row.update(calculate_production_needs(pd.DataFrame([row])).iloc[0].to_dict())
+
+                    self._update_stockout(sku)
+
+        if len(dirty_skus) > 0:
+            logger.info(f'Refreshed run rates for {len(dirty_skus)} skus')
+
+        return len(dirty_skus)
+
+
+    def snapshot(self):
+        """
+        Return the current forecast of every sku as a dataframe (same columns as the daily report)
+        """
+
+        with self._lock:
+            snapshot_df = pd.DataFrame.from_dict(self.forecast, orient='index')
+        snapshot_df.index.name = 'sku'
+        snapshot_df = snapshot_df.reset_index()[['sku'] + FORECAST_COLS]
+        snapshot_df['snapshot_time'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+        return snapshot_df
+
+
+    def latency_summary(self):
+        """
+        Return p50 / p99 / max event latency (in milliseconds) since the last call
+        """
+
+        with self._lock:
+            latencies = np.array(self.event_latencies) * 1000
+            self.event_latencies = []
+
+        if len(latencies) == 0:
+            return {'events': 0}
+
+        return {'events': len(latencies),
+                'p50_ms': round(float(np.percentile(latencies, 50)), 3),
+                'p99_ms': round(float(np.percentile(latencies, 99)), 3),
+                'max_ms': round(float(latencies.max()), 3)}
@@ -0,0 +1,183 @@
+import os
+import io
+import zlib
+import pandas as pd
+from loguru import logger
+
+from utils.aws_utils import list_s3_keys, get_object_from_s3, put_df_to_s3, delete_s3_prefix_data
+
+
+# Staging layout of a sharded run (S3, or a local directory for testing):
+#   staging/shopify_demand_forecasting/run_date=YYYY-MM-DD/shard_count=N/shard=I/<slice>.csv
+STAGING_PREFIX = 'staging/shopify_demand_forecasting'
+
+# Slices written by each shard (merged by merge_forecast_shards.py)
+SHARD_SLICES = ['inventory_details', 'accuracy']
+
+
+# FUNCTION TO ASSIGN SKUS TO SHARDS
+# ----------
+
+def get_sku_shard(skus: pd.Series, shard_count: int):
+    """
+    Hash partition skus into shard_count shards (crc32 of the sku string, same hash as sku_shard_filter_sql())
+
+    Params:
+        skus: series of skus
+        shard_count: number of shards
+
+    """
+
+    return skus.astype(str).map(lambda sku: zlib.crc32(sku.encode('utf-8')) % shard_count).astype(int)
+
+
+def sku_shard_filter_sql(sku_column: str, shard_index: int, shard_count: int):
+    """
+    Athena WHERE clause keeping only the skus of a shard (empty string if the run is not sharded)
+    """
+
+    if shard_count <= 1:
+        return ''
+
+    return f"AND crc32(to_utf8(CAST({sku_column} AS VARCHAR))) % {shard_count} = {shard_index}"
+
+
+def filter_sku_shard(df: pd.DataFrame, shard_index: int, shard_count: int):
+    """
+    Keep only the rows of df whose sku belongs to the shard
+    """
+
+    if shard_count <= 1 or len(df) == 0:
+        return df
+
+    return df.loc[get_sku_shard(df['sku'], shard_count) == shard_index]
+
+
+
+# FUNCTIONS TO STAGE & MERGE SHARD SLICES
+# ----------
+
+def get_shard_prefix(run_date, shard_count: int, shard_index: int = None):
+
+    run_date = pd.to_datetime(run_date).strftime('%Y-%m-%d')
+    prefix = f'{STAGING_PREFIX}/run_date={run_date}/shard_count={shard_count}/'
+
+    if shard_index is None:
+        return prefix
+
+    return f'{prefix}shard={shard_index}/'
+
+
+def write_shard_slice(s3_client, df: pd.DataFrame, slice_name: str, run_date, shard_index: int, shard_count: int, bucket: str = None, local_dir: str = None):
+    """
+    Write a shard's slice to the staging prefix (to local_dir if set, else to S3)
+
+    Params:
+        s3_client: boto3 s3 client (unused when writing to local_dir)
+        df: slice of the shard
+        slice_name: name of the slice (one of SHARD_SLICES)
+        run_date: date of the run
+        shard_index: index of the shard
+        shard_count: number of shards
+        bucket: S3 bucket of the staging prefix
+        local_dir: local staging directory (for testing)
+
+    """
+
+    s3_key = f'{get_shard_prefix(run_date, shard_count, shard_index)}{slice_name}.csv'
+
+    if local_dir:
+        local_path = os.path.join(local_dir, s3_key)
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        df.to_csv(local_path, index=False)
+    else:
+        put_df_to_s3(s3_client=s3_client, df=df, bucket=bucket, s3_key=s3_key)
+
+    logger.info(f'Staged {len(df)} rows of {slice_name} for shard {shard_index + 1}/{shard_count}')
+
+
+def read_shard_slices(slice_name: str, run_date, shard_count: int, bucket: str = None, local_dir: str = None):
+    """
+    Read a slice of every shard of a run from the staging prefix, in shard order
+
+    Raises ValueError if a shard has not staged its slice (the run can not be merged)
+
+    """
+
+    slices = []
+    missing = []
+
+    if not local_dir:
+        staged_keys = set(list_s3_keys(bucket=bucket, s3_prefix=get_shard_prefix(run_date, shard_count)))
+
+    for shard_index in range(shard_count):
+
+        s3_key = f'{get_shard_prefix(run_date, shard_count, shard_index)}{slice_name}.csv'
+
+        if local_dir:
+            local_path = os.path.join(local_dir, s3_key)
+            if not os.path.exists(local_path):
+                missing.append(shard_index)
+                continue
+            body = local_path
+        else:
+            if s3_key not in staged_keys:
+                missing.append(shard_index)
+                continue
+            body = io.BytesIO(get_object_from_s3(bucket=bucket, s3_key=s3_key))
+
+        try:
+            slices.append(pd.read_csv(body, dtype={'sku': str}, float_precision='round_trip'))
+        except pd.errors.EmptyDataError:
+            slices.append(pd.DataFrame(columns=['sku']))
+
+    if len(missing) > 0:
+        raise ValueError(f'Shards {missing} of {shard_count} have not staged {slice_name} for {pd.to_datetime(run_date).strftime("%Y-%m-%d")}')
+
+    return slices
+
+
+def merge_shard_slices(slices: list, shard_count: int):
+    """
+    Merge the slices of every shard into one dataframe sorted by sku (independent of shard completion order)
+
+    Raises ValueError if a sku is in a shard it does not hash to or in more than one shard
+
+    Params:
+        slices: list of slices, in shard order (from read_shard_slices())
+        shard_count: number of shards
+
+    """
+
+    for shard_index, slice_df in enumerate(slices):
+        misplaced = slice_df.loc[get_sku_shard(slice_df['sku'], shard_count) != shard_index, 'sku']
+        if len(misplaced) > 0:
+            raise ValueError(f'{len(misplaced)} skus staged in shard {shard_index} belong to another shard: {misplaced.unique()[:10]}')
+
+    non_empty = [slice_df for slice_df in slices if len(slice_df) > 0]
+
+    if len(non_empty) == 0:
+        return pd.DataFrame(columns=slices[0].columns if len(slices) > 0 else ['sku'])
+
+    merged_df = pd.concat(non_empty, ignore_index=True)
+
+    duplicated = merged_df.loc[merged_df['sku'].duplicated(), 'sku']
+    if len(duplicated) > 0:
+        raise ValueError(f'{len(duplicated)} skus staged more than once: {duplicated.unique()[:10]}')
+
+    return merged_df.sort_values('sku', kind='stable').reset_index(drop=True)
+
+
+def delete_shard_staging(run_date, shard_count: int, bucket: str = None, local_dir: str = None, shard_index: int = None):
+    """
+    Delete the staged slices of a run (or of one shard of a run)
+    """
+
+    prefix = get_shard_prefix(run_date, shard_count, shard_index)
+
+    if local_dir:
+        for root, dirs, files in os.walk(os.path.join(local_dir, prefix)):
+            for file in files:
+                os.remove(os.path.join(root, file))
+    else:
+        delete_s3_prefix_data(bucket=bucket, s3_prefix=prefix)